@@ -0,0 +1,168 @@
+"""
+条件GET（ETag / Last-Modified）
+SPA切回来、刷新时手里已经有同样的数据，以前照样整篇content、media、整页列表重新查、重新序列化一遍。
+现在响应带上校验值，请求带 If-None-Match / If-Modified-Since 且没变过就直接回 304，不加载关联、不序列化：
+- 文章详情：按 id + updated_at 算（改文章时updated_at会刷新，浏览量写回不动它），校验就是一次主键/slug唯一索引查询
+- 列表类（文章列表、分类热门、分类、标签、热门标签）：按响应缓存的标签记版本号（cache_versions表），
+  文章增删改、新建分类在同一个事务里把受影响的标签加一；ETag = 路由参数 + 这几个标签的版本号，
+  Last-Modified = 这几个标签最近一次变的时间；校验就是一次主键IN查询
+- 浏览量不算在校验值里：304之后页面上的浏览量可能旧一点，和响应缓存一样
+- /api/stats 不带校验值（snapshot_age和浏览量一直在变）
+
+If-None-Match优先（弱比较，W/前缀不管），没有才看If-Modified-Since（精确到秒）。
+ETag里带着APP_VERSION，发版后响应结构变了客户端不会拿旧的凑合。
+Core直接写库的导入脚本自己调 bump_versions。
+"""
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from fastapi import Request, Response
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .hooks import ArticleChange, on_flush
+from .models import Article, CacheVersion
+from .response_cache import affected_tags
+
+ARTICLE_TAG_PREFIX = "article:"
+
+
+class Validator(NamedTuple):
+    """一个响应的校验值"""
+    etag: str
+    last_modified: Optional[datetime]  # UTC，不带时区
+
+    def headers(self) -> Dict[str, str]:
+        headers = {"ETag": self.etag}
+        if self.last_modified is not None:
+            headers["Last-Modified"] = format_datetime(self.last_modified.replace(tzinfo=timezone.utc), usegmt=True)
+        return headers
+
+
+def _etag(*parts: str) -> str:
+    digest = hashlib.sha1("|".join((settings.APP_VERSION,) + parts).encode("utf-8")).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+
+def article_validator(article_id: int, updated_at: Optional[datetime]) -> Validator:
+    return Validator(_etag("article", str(article_id), updated_at.isoformat() if updated_at else ""), updated_at)
+
+
+async def article_version(db: AsyncSession, id_or_slug: str):
+    """只查文章的id和updated_at（主键或slug唯一索引），没有返回None"""
+    if id_or_slug.isdigit():
+        condition = Article.id == int(id_or_slug)
+    else:
+        condition = Article.slug == id_or_slug
+    return (await db.execute(select(Article.id, Article.updated_at).where(condition))).one_or_none()
+
+
+async def collection_validator(db: AsyncSession, key: str, tags: Iterable[str]) -> Validator:
+    """列表类响应的校验值：路由参数 + 它挂的标签的版本号"""
+    tags = sorted(set(tags))
+    rows = (await db.execute(
+        select(CacheVersion.tag, CacheVersion.version, CacheVersion.updated_at).where(CacheVersion.tag.in_(tags))
+    )).all()
+    versions = {row.tag: row.version for row in rows}
+    last_modified = max((row.updated_at for row in rows if row.updated_at is not None), default=None)
+    return Validator(_etag(key, *(f"{tag}={versions.get(tag, 0)}" for tag in tags)), last_modified)
+
+
+def is_conditional(request: Request) -> bool:
+    return "if-none-match" in request.headers or "if-modified-since" in request.headers
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == opaque for candidate in header.split(","))
+
+
+def not_modified(request: Request, validator: Validator) -> bool:
+    """客户端手里的还是最新的吗"""
+    revalidation.checks += 1
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        fresh = _etag_matches(if_none_match, validator.etag)
+    else:
+        fresh = False
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_modified_since and validator.last_modified is not None:
+            try:
+                since = parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError):
+                since = None
+            if since is not None:
+                if since.tzinfo is None:
+                    since = since.replace(tzinfo=timezone.utc)
+                fresh = validator.last_modified.replace(microsecond=0, tzinfo=timezone.utc) <= since
+    if fresh:
+        revalidation.not_modified += 1
+    return fresh
+
+
+def not_modified_response(headers: Dict[str, str]) -> Response:
+    """304：只带校验值和缓存策略，没有响应体"""
+    return Response(status_code=304, headers=headers)
+
+
+def version_upsert():
+    """版本号加一的upsert，配合version_rows批量执行"""
+    table = CacheVersion.__table__
+    stmt = sqlite_insert(table)
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.tag],
+        set_={"version": table.c.version + 1, "updated_at": stmt.excluded.updated_at},
+    )
+
+
+def version_rows(tags: Iterable[str]) -> List[dict]:
+    """要加版本号的标签，文章详情的标签不用（详情按updated_at算）"""
+    now = datetime.utcnow()
+    return [
+        {"tag": tag, "version": 1, "updated_at": now}
+        for tag in dict.fromkeys(tags)
+        if not tag.startswith(ARTICLE_TAG_PREFIX)
+    ]
+
+
+async def bump_versions(db: AsyncSession, tags: Iterable[str]) -> None:
+    """在当前事务里给这些标签的版本号加一（新建分类、导入脚本用）"""
+    rows = version_rows(tags)
+    if rows:
+        await db.execute(version_upsert(), rows)
+
+
+@on_flush
+def _bump_article_versions(session: Session, changes: List[ArticleChange]) -> None:
+    """文章变更时，受影响的列表版本号在同一个事务里加一"""
+    rows = version_rows(affected_tags(session, changes))
+    if rows:
+        session.connection().execute(version_upsert(), rows)
+
+
+class Revalidation:
+    """条件请求的统计"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        self.checks = 0
+        self.not_modified = 0
+
+    def stats(self) -> dict:
+        return {
+            "checks": self.checks,
+            "not_modified": self.not_modified,
+            "not_modified_ratio": round(self.not_modified / self.checks, 4) if self.checks else 0.0,
+        }
+
+
+revalidation = Revalidation()
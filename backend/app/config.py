@@ -17,6 +17,85 @@ class Settings(BaseSettings):
     # 数据库配置
     DATABASE_URL: str = "sqlite+aiosqlite:///./auto_info.db"
 
+    # 连接池：写连接个数（SQLite同一时刻只有一个写者，别改大）、GET接口用的只读连接个数、拿不到连接最多等几秒
+    DB_WRITE_POOL_SIZE: int = 1
+    DB_READ_POOL_SIZE: int = 4
+    DB_POOL_TIMEOUT: float = 30.0
+
+    # 单写者协调器：一个事务最多合并多少个写入单元、拿到第一个后再等多少秒攒一攒（0表示不等）、队列最多排多少个
+    WRITE_BATCH_MAX: int = 64
+    WRITE_BATCH_WINDOW: float = 0.0
+    WRITE_QUEUE_MAX: int = 1000
+
+    # SQLite PRAGMA：WAL让读写互不阻塞；cache_size负数表示KiB；mmap_size单位字节，0表示不用mmap；
+    # busy_timeout毫秒（别的进程比如导入脚本占着写锁时等多久）
+    SQLITE_JOURNAL_MODE: str = "WAL"
+    SQLITE_SYNCHRONOUS: str = "NORMAL"
+    SQLITE_CACHE_SIZE: int = -65536
+    SQLITE_MMAP_SIZE: int = 268435456
+    SQLITE_BUSY_TIMEOUT: int = 5000
+
+    # 列表总数的默认计数策略: exact / has_more / cached
+    LIST_COUNT_STRATEGY: str = "exact"
+
+    # 浏览量写回：每隔多少秒、或者攒够多少次就批量写一次库
+    VIEW_FLUSH_INTERVAL: float = 5.0
+    VIEW_FLUSH_THRESHOLD: int = 1000
+
+    # 搜索分词词典（一行一个词），留空就只切bigram；换词典后要重建搜索索引
+    SEARCH_DICTIONARY_PATH: str = ""
+
+    # 相关文章：后台每隔多少秒处理一次重算队列
+    RELATED_REFRESH_INTERVAL: float = 60.0
+
+    # 文章slug生成策略: title / pinyin / hash / date，以及基础slug最长多少字符
+    SLUG_STRATEGY: str = "title"
+    SLUG_MAX_LENGTH: int = 120
+
+    # 近似重复检测：reject（拒绝）/ merge（合并到已有文章）/ link（存为重复）/ off（默认，不检测，创建行为和以前一样）
+    # 估算的Jaccard相似度（3字shingle）不低于多少算重复，正文去掉标点少于多少字不判重
+    DEDUP_POLICY: str = "off"
+    DEDUP_THRESHOLD: float = 0.8
+    DEDUP_MIN_CHARS: int = 50
+
+    # 创建接口的幂等键（Idempotency-Key请求头 / original_url）记多少个、记多久（秒）
+    IDEMPOTENCY_MAX_KEYS: int = 10000
+    IDEMPOTENCY_TTL: float = 86400.0
+
+    # 批量创建文章：每多少篇一个事务，一次最多收多少篇
+    BULK_CHUNK_SIZE: int = 100
+    BULK_MAX_ITEMS: int = 1000
+
+    # 全量导出（NDJSON）每批多少篇，批与批之间不占着读事务
+    EXPORT_BATCH_SIZE: int = 500
+
+    # JSONL导入（python -m app.importer）默认每批多少行，一批一个事务、一个断点
+    IMPORT_BATCH_SIZE: int = 2000
+
+    # 进程内 标签名 -> ID 缓存最多存多少个
+    TAG_CACHE_SIZE: int = 10000
+
+    # 首页统计快照多少秒重算一次（文章有写入会提前作废）
+    STATS_SNAPSHOT_TTL: float = 30.0
+
+    # 公共GET接口响应缓存：memory（进程内LRU）/ redis（多worker共享）/ off；
+    # memory最多存多少条，每条最多存多少秒（写入会按标签提前清掉）；redis的地址和键前缀
+    RESPONSE_CACHE_BACKEND: str = "memory"
+    RESPONSE_CACHE_MAX_ENTRIES: int = 2000
+    RESPONSE_CACHE_TTL: float = 60.0
+    RESPONSE_CACHE_REDIS_URL: str = "redis://localhost:6379/0"
+    RESPONSE_CACHE_PREFIX: str = "autoinfo:"
+
+    # stale-while-revalidate：下面这些路由过了TTL后最多再用多少秒旧数据（同时后台刷新），0表示过期就同步重算；
+    # 它们的响应带 Cache-Control: public, max-age=RESPONSE_CACHE_MAX_AGE, stale-while-revalidate=RESPONSE_CACHE_STALE，
+    # 代理收不到清缓存的通知，max-age要比TTL短。/api/stats的快照也按这个期限
+    RESPONSE_CACHE_STALE: float = 30.0
+    RESPONSE_CACHE_MAX_AGE: int = 5
+    STALE_WHILE_REVALIDATE_ROUTES: str = '["articles","category_hot","categories","tags","popular_tags","stats"]'
+
+    # 哪些GET接口合并同参数的并发请求（single-flight），JSON数组，路由名见main.py；"[]"表示都不合并
+    SINGLE_FLIGHT_ROUTES: str = '["articles","article","categories","category_hot","tags","popular_tags","stats"]'
+
     # CORS配置 - 允许的前端地址
     CORS_ORIGINS: str = '["http://localhost:5173","http://localhost:3000"]'
 
@@ -31,6 +110,22 @@ class Settings(BaseSettings):
         except:
             return ["http://localhost:5173", "http://localhost:3000"]
 
+    @property
+    def single_flight_routes(self) -> List[str]:
+        """SINGLE_FLIGHT_ROUTES转成列表，写坏了就都不合并"""
+        try:
+            return list(json.loads(self.SINGLE_FLIGHT_ROUTES))
+        except (ValueError, TypeError):
+            return []
+
+    @property
+    def stale_while_revalidate_routes(self) -> List[str]:
+        """STALE_WHILE_REVALIDATE_ROUTES转成列表，写坏了就都不用旧数据"""
+        try:
+            return list(json.loads(self.STALE_WHILE_REVALIDATE_ROUTES))
+        except (ValueError, TypeError):
+            return []
+
     class Config:
         env_file = ".env"
         case_sensitive = True
@@ -0,0 +1,177 @@
+"""
+列表总数的计数策略
+- exact：老办法，COUNT(*)整个筛选结果，准但是慢
+- has_more：多取一行判断有没有下一页，干脆不数
+- cached：查article_counters计数表，文章增删改时在同一个事务里顺手维护
+
+热门标签也从这张表出：(published, 不限分类, 标签)这一格就是每个标签的已发布文章数。
+
+老库刚升级（计数表是空的）、或者计数表是升级后才开始记增量的（各状态总数对不上），启动时自动重建一次；
+别的情况下计数表万一和实际数据对不上了，跑一下：python -m app.counters rebuild
+"""
+import asyncio
+from collections import Counter
+from typing import Iterable, Optional, Tuple
+
+from sqlalchemy import delete, func, insert, literal, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from .hooks import ArticleChange, ArticleSnapshot, on_flush
+from .models import Article, ArticleCounter, Category, Tag, article_tag_table
+
+COUNT_EXACT = "exact"
+COUNT_HAS_MORE = "has_more"
+COUNT_CACHED = "cached"
+COUNT_STRATEGIES = (COUNT_EXACT, COUNT_HAS_MORE, COUNT_CACHED)
+
+# 计数表里“不限”用0表示
+ANY = 0
+
+CounterKey = Tuple[str, int, int]
+
+
+def counter_keys(snapshot: ArticleSnapshot) -> Iterable[CounterKey]:
+    """一篇文章会计入哪些计数格子"""
+    categories = [ANY] if snapshot.category_id is None else [ANY, snapshot.category_id]
+    for category_id in categories:
+        yield snapshot.status, category_id, ANY
+        for tag_id in snapshot.tag_ids:
+            yield snapshot.status, category_id, tag_id
+
+
+@on_flush
+def _apply_counter_deltas(session: Session, changes: list[ArticleChange]) -> None:
+    """文章变更时增减计数，和文章写入在同一个事务里"""
+    deltas: Counter = Counter()
+    for change in changes:
+        if change.before == change.after:
+            continue
+        if change.before is not None:
+            deltas.subtract(counter_keys(change.before))
+        if change.after is not None:
+            deltas.update(counter_keys(change.after))
+
+    rows = counter_delta_rows(deltas)
+    if rows:
+        session.connection().execute(counter_upsert(), rows)
+
+
+def counter_delta_rows(deltas: Counter) -> list[dict]:
+    return [
+        {"status": status, "category_id": category_id, "tag_id": tag_id, "count": delta}
+        for (status, category_id, tag_id), delta in deltas.items()
+        if delta
+    ]
+
+
+def counter_upsert():
+    """计数增量的upsert，配合counter_delta_rows一条语句批量执行，不管动了多少篇文章、多少个格子"""
+    table = ArticleCounter.__table__
+    stmt = sqlite_insert(table)
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.status, table.c.category_id, table.c.tag_id],
+        set_={"count": table.c.count + stmt.excluded.count},
+    )
+
+
+async def cached_count(
+    db: AsyncSession,
+    status: str,
+    category_slug: Optional[str] = None,
+    tag_slug: Optional[str] = None,
+) -> int:
+    """从计数表取总数，一次主键查询"""
+    category_id = (
+        func.coalesce(select(Category.id).where(Category.slug == category_slug).scalar_subquery(), -1)
+        if category_slug else literal(ANY)
+    )
+    tag_id = (
+        func.coalesce(select(Tag.id).where(Tag.slug == tag_slug).scalar_subquery(), -1)
+        if tag_slug else literal(ANY)
+    )
+    result = await db.execute(
+        select(ArticleCounter.count).where(
+            ArticleCounter.status == status,
+            ArticleCounter.category_id == category_id,
+            ArticleCounter.tag_id == tag_id,
+        )
+    )
+    return max(result.scalar() or 0, 0)
+
+
+def popular_tags_query(limit: int):
+    """热门标签：计数表里已发布、不限分类的那一排按主键范围扫，几百行排个序"""
+    return (
+        select(Tag.id, Tag.name, Tag.slug, ArticleCounter.count.label("article_count"))
+        .join(ArticleCounter, ArticleCounter.tag_id == Tag.id)
+        .where(
+            ArticleCounter.status == "published",
+            ArticleCounter.category_id == ANY,
+            ArticleCounter.count > 0,
+        )
+        .order_by(ArticleCounter.count.desc(), Tag.id)
+        .limit(limit)
+    )
+
+
+async def rebuild_counters(db: AsyncSession) -> None:
+    """按文章表重新统计一遍计数表，修复漂移用"""
+    table = ArticleCounter.__table__
+    await db.execute(delete(table))
+
+    any_ = literal(ANY)
+    tag_join = Article.__table__.join(article_tag_table, Article.id == article_tag_table.c.article_id)
+    has_category = Article.category_id.isnot(None)
+    sources = [
+        select(Article.status, any_, any_, func.count()).group_by(Article.status),
+        select(Article.status, Article.category_id, any_, func.count())
+        .where(has_category).group_by(Article.status, Article.category_id),
+        select(Article.status, any_, article_tag_table.c.tag_id, func.count())
+        .select_from(tag_join).group_by(Article.status, article_tag_table.c.tag_id),
+        select(Article.status, Article.category_id, article_tag_table.c.tag_id, func.count())
+        .select_from(tag_join).where(has_category)
+        .group_by(Article.status, Article.category_id, article_tag_table.c.tag_id),
+    ]
+    columns = [table.c.status, table.c.category_id, table.c.tag_id, table.c.count]
+    for source in sources:
+        await db.execute(insert(table).from_select(columns, source))
+    await db.commit()
+
+
+async def backfill_counters(db: AsyncSession) -> bool:
+    """
+    启动时检查：有文章但计数表是空的，或者各状态的总数格子和文章表对不上（只记了升级之后的增量），就全量重建
+    检查是一条按状态分组的COUNT加一次计数表主键范围读；重建了返回True
+    """
+    actual = dict((await db.execute(select(Article.status, func.count()).group_by(Article.status))).all())
+    if not actual:
+        return False
+    result = await db.execute(
+        select(ArticleCounter.status, ArticleCounter.count)
+        .where(ArticleCounter.category_id == ANY, ArticleCounter.tag_id == ANY)
+    )
+    recorded = {status: count for status, count in result.all() if count}
+    if recorded == actual:
+        return False
+    await rebuild_counters(db)
+    return True
+
+
+async def _main(argv: list[str]) -> None:
+    from .database import AsyncSessionLocal, init_db
+
+    if argv[:1] != ["rebuild"]:
+        print("用法: python -m app.counters rebuild")
+        return
+    await init_db()
+    async with AsyncSessionLocal() as db:
+        await rebuild_counters(db)
+    print("article_counters rebuilt")
+
+
+if __name__ == "__main__":
+    import sys
+
+    asyncio.run(_main(sys.argv[1:]))
@@ -1,17 +1,79 @@
 """
 数据库配置 - SQLAlchemy Async
 老王用SQLite是因为简单，你要换MySQL/PostgreSQL自己改配置！
+
+读写分开两个引擎：
+- engine：写连接（默认就1个，SQLite本来同一时刻只能有一个写者，多开连接只会互相抢锁报database is locked），
+  增删改、后台写回任务用，依赖是get_db
+- read_engine：只读连接池（DB_READ_POOL_SIZE个），每个连接开了query_only，GET接口用，依赖是get_read_db，
+  从不开写事务、从不提交
+SQLite开WAL：读不挡写、写不挡读，读连接看到的是语句开始那一刻已提交的数据。
+PRAGMA（cache_size、mmap_size、synchronous……）都在Settings里配。内存库（:memory:）没法多连接共享，读写共用一个引擎。
 """
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+from typing import AsyncIterator
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from .config import settings
 
 
-# 创建异步引擎，SQLite用aiosqlite
-engine = create_async_engine(
-    settings.DATABASE_URL,
- echo=settings.DEBUG,  # 开发环境打印SQL，生产环境记得关掉！
-)
+def _is_sqlite(url: str) -> bool:
+    return make_url(url).get_backend_name() == "sqlite"
+
+
+def _is_memory(url: str) -> bool:
+    database = make_url(url).database
+    return not database or database == ":memory:" or "mode=memory" in url
+
+
+def sqlite_pragmas(readonly: bool) -> list[str]:
+    """每个新连接上执行的PRAGMA；journal_mode是库级别的，写连接设一次就行"""
+    pragmas = [
+        f"PRAGMA busy_timeout = {int(settings.SQLITE_BUSY_TIMEOUT)}",
+        f"PRAGMA cache_size = {int(settings.SQLITE_CACHE_SIZE)}",
+        f"PRAGMA mmap_size = {int(settings.SQLITE_MMAP_SIZE)}",
+    ]
+    if readonly:
+        pragmas.append("PRAGMA query_only = ON")
+    else:
+        pragmas.append(f"PRAGMA journal_mode = {settings.SQLITE_JOURNAL_MODE}")
+        pragmas.append(f"PRAGMA synchronous = {settings.SQLITE_SYNCHRONOUS}")
+    return pragmas
+
+
+def make_engine(url: str, pool_size: int, readonly: bool = False) -> AsyncEngine:
+    """建一个连接池固定大小的引擎，SQLite的连接建好就执行PRAGMA"""
+    options = {"echo": settings.DEBUG}  # 开发环境打印SQL，生产环境记得关掉！
+    if not (_is_sqlite(url) and _is_memory(url)):
+        # aiosqlite的文件库默认是NullPool（每次现开连接），要固定个数的池子得显式指定
+        options.update(
+            poolclass=AsyncAdaptedQueuePool, pool_size=pool_size, max_overflow=0, pool_timeout=settings.DB_POOL_TIMEOUT,
+        )
+    new_engine = create_async_engine(url, **options)
+    if _is_sqlite(url):
+        pragmas = sqlite_pragmas(readonly)
+
+        @event.listens_for(new_engine.sync_engine, "connect")
+        def _set_pragmas(dbapi_connection, connection_record) -> None:
+            cursor = dbapi_connection.cursor()
+            for pragma in pragmas:
+                cursor.execute(pragma)
+            cursor.close()
+
+    return new_engine
+
+
+# 写引擎，SQLite用aiosqlite
+engine = make_engine(settings.DATABASE_URL, settings.DB_WRITE_POOL_SIZE)
+
+# 只读引擎，内存库只能和写引擎共用
+if _is_sqlite(settings.DATABASE_URL) and _is_memory(settings.DATABASE_URL):
+    read_engine = engine
+else:
+    read_engine = make_engine(settings.DATABASE_URL, settings.DB_READ_POOL_SIZE, readonly=True)
 
 # 创建Session工厂
 AsyncSessionLocal = async_sessionmaker(
@@ -22,6 +84,14 @@ AsyncSessionLocal = async_sessionmaker(
     autoflush=False,
 )
 
+ReadSessionLocal = async_sessionmaker(
+    read_engine,
+    class_=AsyncSession,
+    expire_on_commit=False,
+    autocommit=False,
+    autoflush=False,
+)
+
 
 class Base(DeclarativeBase):
     """所有ORM模型的基类，继承它就行"""
@@ -30,7 +100,7 @@ class Base(DeclarativeBase):
 
 async def get_db() -> AsyncSession:
     """
-    依赖注入用的数据库Session
+    依赖注入用的数据库Session（写连接），增删改接口用
     用法: db: AsyncSession = Depends(get_db)
     """
     async with AsyncSessionLocal() as session:
@@ -44,7 +114,35 @@ async def get_db() -> AsyncSession:
             await session.close()
 
 
+async def get_read_db() -> AsyncIterator[AsyncSession]:
+    """
+    只读Session（只读连接池），GET接口用
+    不提交，结束时close直接把连接还回池子；连接开了query_only，误写会直接报错
+    用法: db: AsyncSession = Depends(get_read_db)
+    """
+    async with ReadSessionLocal() as session:
+        yield session
+
+
 async def init_db():
     """初始化数据库表，启动时调用一次就行"""
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(create_missing_indexes)
+
+
+async def dispose_engines() -> None:
+    """关机时关掉读写两个连接池"""
+    await engine.dispose()
+    if read_engine is not engine:
+        await read_engine.dispose()
+
+
+def create_missing_indexes(conn) -> None:
+    """
+    create_all只建不存在的表，老库里已有的表后来加的索引不会补上
+    这里挨个补，已经有的跳过
+    """
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
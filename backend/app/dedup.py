@@ -0,0 +1,286 @@
+"""
+近似重复检测 - MinHash + LSH分段索引
+同一条新闻36氪、虎嗅各发一遍，标题改几个字、正文换个开头，以前每份都进库成了一篇新文章。
+现在入库前先算签名查一下：
+- 签名：标题 + 去掉HTML的正文，NFKC小写、去掉空白标点后切3字shingle，64个最小哈希（numpy向量化）。
+  两篇文章签名里相同位置相等的比例就是shingle集合Jaccard相似度的估计
+- 索引：签名切成16段、每段4个哈希，每段算一个键存进article_fingerprint_bands（主键(key, article_id)）。
+  有一段键相同就是候选：相似度0.8的两篇至少撞一段的概率 1-(1-0.8^4)^16 > 99.9%，
+  0.3的只有12%，撞上了再用签名估算相似度筛掉。查一篇就是16个主键点查，100万篇也一样快
+- 文章增删改时在同一个事务里维护（hooks.on_flush），老库第一次启动自动回填
+- 正文太短（去掉标点不到DEDUP_MIN_CHARS个字）的不算签名，不参与判重
+
+本来想用64位SimHash + 海明距离<=3（4段16位索引），实测几百到一千字的中文资讯改一个字就能翻4、5位，
+阈值放宽又要多切段、每段桶变大，所以换成了MinHash，对“换个开头、改几个字”稳得多。
+
+查到重复以后按DEDUP_POLICY处理（见ingest.py）：
+- reject：拒绝，返回已有文章
+- merge：不建新文章，把新标签、缺的摘要/封面/媒体补到已有文章上
+- link：照样入库，但状态是duplicate（不在前台列表里出现），记下是哪篇的重复
+- off（默认）：不检测，签名照样维护，改成别的策略马上能用
+
+签名表对不上了（比如直接往库里灌过数据）就跑：python -m app.dedup rebuild（已有的重复关系会保留）
+"""
+import asyncio
+import re
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from sqlalchemy import bindparam, delete, func, insert, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .hooks import ArticleChange, on_flush
+from .models import Article, ArticleFingerprint, ArticleFingerprintBand
+from .search import strip_html
+from .tokenizer import normalize
+
+POLICY_OFF = "off"
+POLICY_REJECT = "reject"
+POLICY_MERGE = "merge"
+POLICY_LINK = "link"
+POLICIES = (POLICY_OFF, POLICY_REJECT, POLICY_MERGE, POLICY_LINK)
+
+# link策略下重复文章的状态，不是published就不会出现在前台
+ARTICLE_STATUS_DUPLICATE = "duplicate"
+
+SHINGLE = 3
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+
+_NOISE_RE = re.compile(r"[\W_]+")
+
+# 哈希用的常数（splitmix64），保证跨进程、跨机器算出来一样
+_P1, _P2, _P3 = np.uint64(0x9E3779B97F4A7C15), np.uint64(0xC2B2AE3D27D4EB4F), np.uint64(0x165667B19E3779F9)
+_M1, _M2 = np.uint64(0xBF58476D1CE4E5B9), np.uint64(0x94D049BB133111EB)
+_S30, _S27, _S31, _S32 = np.uint64(30), np.uint64(27), np.uint64(31), np.uint64(32)
+
+
+def _mix(h: np.ndarray) -> np.ndarray:
+    """splitmix64的收尾混合，uint64数组按元素算"""
+    h = h ^ (h >> _S30)
+    h = h * _M1
+    h = h ^ (h >> _S27)
+    h = h * _M2
+    return h ^ (h >> _S31)
+
+
+# 64个“排列”各用一个种子
+_SEEDS = _mix(np.arange(1, NUM_PERM + 1, dtype=np.uint64) * _P1)
+_ROW_WEIGHTS = _mix(np.arange(1, ROWS + 1, dtype=np.uint64) * _P2)
+_BAND_SALTS = _mix(np.arange(1, BANDS + 1, dtype=np.uint64) * _P3)
+
+
+class DuplicateMatch(NamedTuple):
+    """查到的重复：撞上的文章、它归属的原文（它自己就是原文时两者相同）、估算的相似度"""
+    article_id: int
+    canonical_id: int
+    similarity: float
+
+
+def fingerprint_text(title: Optional[str], content: Optional[str]) -> str:
+    """参与签名的文本：标题 + 纯文本正文，去掉空白和标点"""
+    return _NOISE_RE.sub("", normalize(f"{title or ''} {strip_html(content)}"))
+
+
+def minhash(text: str) -> Optional[np.ndarray]:
+    """3字shingle的MinHash签名（NUM_PERM个uint32），不够一个shingle返回None"""
+    codes = np.frombuffer(text.encode("utf-32-le"), dtype="<u4").astype(np.uint64)
+    if len(codes) < SHINGLE:
+        return None
+    shingles = np.unique(_mix(codes[:-2] * _P1 + codes[1:-1] * _P2 + codes[2:] * _P3))
+    hashed = _mix(shingles[:, None] ^ _SEEDS[None, :])
+    return (hashed.min(axis=0) >> _S32).astype(np.uint32)
+
+
+def fingerprint(title: Optional[str], content: Optional[str]) -> Optional[np.ndarray]:
+    """文章签名，正文太短不算（返回None）"""
+    text = fingerprint_text(title, content)
+    if len(text) < settings.DEDUP_MIN_CHARS:
+        return None
+    return minhash(text)
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """两份签名估算的Jaccard相似度"""
+    return int(np.count_nonzero(a == b)) / NUM_PERM
+
+
+def band_keys(signature: np.ndarray) -> List[int]:
+    """签名切BANDS段，每段哈希成一个有符号64位键（SQLite的INTEGER）"""
+    rows = signature.astype(np.uint64).reshape(BANDS, ROWS)
+    keys = _mix((rows * _ROW_WEIGHTS).sum(axis=1, dtype=np.uint64) ^ _BAND_SALTS)
+    return keys.view(np.int64).tolist()
+
+
+def signature_bytes(signature: np.ndarray) -> bytes:
+    return signature.astype("<u4").tobytes()
+
+
+def signature_from_bytes(data: bytes) -> np.ndarray:
+    return np.frombuffer(data, dtype="<u4")
+
+
+async def find_duplicates(db: AsyncSession, signatures: Sequence[np.ndarray]) -> List[Optional[DuplicateMatch]]:
+    """一批签名一条查询查候选（所有段键一个IN走主键），逐个估算相似度取最像的"""
+    if not signatures:
+        return []
+    keys = [band_keys(signature) for signature in signatures]
+    result = await db.execute(
+        select(ArticleFingerprintBand.key, ArticleFingerprint.article_id,
+               ArticleFingerprint.signature, ArticleFingerprint.duplicate_of)
+        .join(ArticleFingerprint, ArticleFingerprint.article_id == ArticleFingerprintBand.article_id)
+        .where(ArticleFingerprintBand.key.in_({key for group in keys for key in group}))
+    )
+    buckets: Dict[int, Set[int]] = {}
+    candidates: Dict[int, Tuple[np.ndarray, Optional[int]]] = {}
+    for row in result:
+        buckets.setdefault(row.key, set()).add(row.article_id)
+        if row.article_id not in candidates:
+            candidates[row.article_id] = (signature_from_bytes(row.signature), row.duplicate_of)
+
+    matches: List[Optional[DuplicateMatch]] = []
+    for signature, group in zip(signatures, keys):
+        best: Optional[DuplicateMatch] = None
+        for article_id in set().union(*(buckets.get(key, ()) for key in group)):
+            other, duplicate_of = candidates[article_id]
+            score = similarity(signature, other)
+            if score >= settings.DEDUP_THRESHOLD and (
+                best is None or (-score, article_id) < (-best.similarity, best.article_id)
+            ):
+                best = DuplicateMatch(article_id, duplicate_of or article_id, score)
+        matches.append(best)
+    return matches
+
+
+async def find_duplicate(db: AsyncSession, signature: np.ndarray) -> Optional[DuplicateMatch]:
+    return (await find_duplicates(db, [signature]))[0]
+
+
+def nearest_in(signature: np.ndarray, others: Iterable[Tuple[Any, np.ndarray]]) -> Optional[Tuple[Any, float]]:
+    """在一小批(键, 签名)里找最像的重复（同一批入库的文章互相比），返回(键, 相似度)"""
+    best = None
+    for key, other in others:
+        score = similarity(signature, other)
+        if score >= settings.DEDUP_THRESHOLD and (best is None or score > best[1]):
+            best = (key, score)
+    return best
+
+
+async def link_duplicates(db: AsyncSession, links: Dict[int, int]) -> None:
+    """记下 重复文章ID -> 原文ID（文章已经flush过，签名行已经在了）"""
+    if not links:
+        return
+    table = ArticleFingerprint.__table__
+    await db.execute(
+        update(table).where(table.c.article_id == bindparam("b_id")).values(duplicate_of=bindparam("b_canonical")),
+        [{"b_id": article_id, "b_canonical": canonical_id} for article_id, canonical_id in links.items()],
+    )
+
+
+def _band_rows(article_id: int, signature: np.ndarray) -> List[dict]:
+    return [{"key": key, "article_id": article_id} for key in dict.fromkeys(band_keys(signature))]
+
+
+@on_flush
+def _sync_fingerprints(session: Session, changes: List[ArticleChange]) -> None:
+    """文章增删改时维护签名表和分段表，和文章写入同一个事务"""
+    conn = session.connection()
+    table = ArticleFingerprint.__table__
+    band_table = ArticleFingerprintBand.__table__
+    removed = [c.article_id for c in changes if c.after is None]
+    if removed:
+        conn.execute(delete(table).where(table.c.article_id.in_(removed)))
+        conn.execute(delete(band_table).where(band_table.c.article_id.in_(removed)))
+        # 原文删了，挂在它下面的重复就没有归属了
+        conn.execute(update(table).where(table.c.duplicate_of.in_(removed)).values(duplicate_of=None))
+
+    rows, band_rows, touched, dropped = [], [], [], []
+    for change in changes:
+        if change.after is None or not change.touches("title", "content"):
+            continue
+        state = change.article.__dict__
+        if "content" not in state:  # 没加载正文（不会发生在接口里），等rebuild
+            continue
+        signature = fingerprint(state.get("title"), state["content"])
+        if change.before is not None:  # 新建的还没有分段行，不用删
+            touched.append(change.article_id)
+        if signature is None:
+            dropped.append(change.article_id)
+        else:
+            rows.append({"article_id": change.article_id, "signature": signature_bytes(signature)})
+            band_rows.extend(_band_rows(change.article_id, signature))
+    if touched:
+        conn.execute(delete(band_table).where(band_table.c.article_id.in_(touched)))
+    if dropped:
+        conn.execute(delete(table).where(table.c.article_id.in_(dropped)))
+    if rows:
+        # 改了正文也保留原来的duplicate_of
+        stmt = sqlite_insert(table)
+        stmt = stmt.on_conflict_do_update(index_elements=[table.c.article_id], set_={"signature": stmt.excluded.signature})
+        conn.execute(stmt, rows)
+        conn.execute(insert(band_table), band_rows)
+
+
+async def rebuild_fingerprints(db: AsyncSession, batch_size: int = 1000) -> int:
+    """按文章表全量重算签名和分段（保留已有的重复关系），返回有签名的文章数"""
+    table = ArticleFingerprint.__table__
+    band_table = ArticleFingerprintBand.__table__
+    result = await db.execute(select(table.c.article_id, table.c.duplicate_of).where(table.c.duplicate_of.isnot(None)))
+    links = dict(result.all())
+    await db.execute(delete(table))
+    await db.execute(delete(band_table))
+
+    total = 0
+    last_id = 0
+    while True:
+        result = await db.execute(
+            select(Article.id, Article.title, Article.content)
+            .where(Article.id > last_id).order_by(Article.id).limit(batch_size)
+        )
+        batch = result.all()
+        if not batch:
+            break
+        rows, band_rows = [], []
+        for row in batch:
+            signature = fingerprint(row.title, row.content)
+            if signature is not None:
+                rows.append({"article_id": row.id, "signature": signature_bytes(signature), "duplicate_of": links.get(row.id)})
+                band_rows.extend(_band_rows(row.id, signature))
+        if rows:
+            await db.execute(insert(table), rows)
+            await db.execute(insert(band_table), band_rows)
+        total += len(rows)
+        last_id = batch[-1].id
+    await db.commit()
+    return total
+
+
+async def backfill_fingerprints(db: AsyncSession) -> int:
+    """签名表是空的但有文章（老库刚升级），就全量算一次"""
+    if (await db.execute(select(func.count()).select_from(ArticleFingerprint))).scalar():
+        return 0
+    if not (await db.execute(select(Article.id).limit(1))).first():
+        return 0
+    return await rebuild_fingerprints(db)
+
+
+async def _main(argv: List[str]) -> None:
+    from .database import AsyncSessionLocal, init_db
+
+    if argv[:1] != ["rebuild"]:
+        print("用法: python -m app.dedup rebuild")
+        return
+    await init_db()
+    async with AsyncSessionLocal() as db:
+        total = await rebuild_fingerprints(db)
+    print(f"article_fingerprints rebuilt: {total} articles")
+
+
+if __name__ == "__main__":
+    import sys
+
+    asyncio.run(_main(sys.argv[1:]))
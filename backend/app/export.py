@@ -0,0 +1,121 @@
+"""
+全量导出 - GET /api/export/articles.ndjson
+视频流水线、搜索重建、备份都要整个语料库，以前拿 /api/articles 用OFFSET一页页翻，越往后越慢（平方级）。
+现在按id顺序流式吐出，一行一篇（字段同Article.to_dict()）：
+- 按id做键集分批：WHERE id > 上一批最后一个 ORDER BY id LIMIT EXPORT_BATCH_SIZE，走主键，每批一样快
+- 一批的标签、媒体各一条IN查询，分类整表读一次放内存（分类没几个）
+- 内存里同时只有一批，语料库多大都一样；批与批之间结束读事务，不会长时间压着写入
+- 导出不是快照：导出过程中新建的文章id更大，会被带上；改过的按读到那一刻的内容
+"""
+import json
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from sqlalchemy import Select, select
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from .models import Article, Category, Media, Tag, article_tag_table
+
+EXPORT_COLUMNS = (
+    Article.id, Article.title, Article.slug, Article.summary, Article.content, Article.cover_image,
+    Article.category_id, Article.author_name, Article.author_avatar, Article.status, Article.is_original,
+    Article.views, Article.published_at, Article.created_at, Article.updated_at,
+)
+
+
+def export_query(
+    status: Optional[str] = None,
+    category_id: Optional[int] = None,
+    updated_since: Optional[datetime] = None,
+) -> Select:
+    """导出的基础查询（还没接分批条件）"""
+    query = select(*EXPORT_COLUMNS)
+    if status:
+        query = query.where(Article.status == status)
+    if category_id is not None:
+        query = query.where(Article.category_id == category_id)
+    if updated_since is not None:
+        query = query.where(Article.updated_at >= updated_since)
+    return query
+
+
+def _isoformat(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value else None
+
+
+async def _hydrate(db: AsyncSession, rows: List[Any], categories: Dict[int, dict]) -> List[dict]:
+    """一批文章补上标签和媒体，各一条查询"""
+    ids = [row.id for row in rows]
+    tags: Dict[int, List[dict]] = defaultdict(list)
+    result = await db.execute(
+        select(article_tag_table.c.article_id, Tag.id, Tag.name, Tag.slug)
+        .join(Tag, Tag.id == article_tag_table.c.tag_id)
+        .where(article_tag_table.c.article_id.in_(ids))
+        .order_by(article_tag_table.c.article_id, Tag.id)
+    )
+    for article_id, tag_id, name, slug in result:
+        tags[article_id].append({"id": tag_id, "name": name, "slug": slug})
+
+    media: Dict[int, List[dict]] = defaultdict(list)
+    result = await db.execute(
+        select(Media.article_id, Media.id, Media.type, Media.url, Media.thumbnail_url, Media.caption)
+        .where(Media.article_id.in_(ids))
+        .order_by(Media.article_id, Media.order_index, Media.id)
+    )
+    for row in result:
+        media[row.article_id].append({
+            "id": row.id, "type": row.type, "url": row.url, "thumbnail_url": row.thumbnail_url, "caption": row.caption,
+        })
+
+    return [
+        {
+            "id": row.id,
+            "title": row.title,
+            "slug": row.slug,
+            "summary": row.summary,
+            "content": row.content,
+            "cover_image": row.cover_image,
+            "category": categories.get(row.category_id),
+            "tags": tags.get(row.id, []),
+            "author_name": row.author_name,
+            "author_avatar": row.author_avatar,
+            "status": row.status,
+            "is_original": row.is_original,
+            "views": row.views,
+            "published_at": _isoformat(row.published_at),
+            "created_at": _isoformat(row.created_at),
+            "updated_at": _isoformat(row.updated_at),
+            "media_items": media.get(row.id, []),
+        }
+        for row in rows
+    ]
+
+
+async def iter_export_batches(db: AsyncSession, query: Select, batch_size: int) -> AsyncIterator[List[dict]]:
+    """按id分批读出文章（字典），每批之后结束读事务"""
+    result = await db.execute(select(Category.id, Category.name, Category.slug))
+    categories = {c.id: {"id": c.id, "name": c.name, "slug": c.slug} for c in result}
+
+    last_id = 0
+    while True:
+        result = await db.execute(query.where(Article.id > last_id).order_by(Article.id).limit(batch_size))
+        rows = result.all()
+        if not rows:
+            return
+        batch = await _hydrate(db, rows, categories)
+        await db.commit()
+        yield batch
+        if len(rows) < batch_size:
+            return
+        last_id = rows[-1].id
+
+
+async def ndjson_stream(engine: AsyncEngine, query: Select, batch_size: int) -> AsyncIterator[bytes]:
+    """
+    StreamingResponse用的生成器：一批编码成一块发出去
+    自己开Session——请求的依赖Session在开始发响应体之前就关了
+    """
+    async with AsyncSession(engine, expire_on_commit=False) as db:
+        async for batch in iter_export_batches(db, query, batch_size):
+            yield "".join(json.dumps(item, ensure_ascii=False) + "\n" for item in batch).encode("utf-8")
@@ -0,0 +1,123 @@
+"""
+响应的快速序列化路径
+以前列表一页20篇：to_list_dict()手工isoformat每个时间 -> 塞进PaginatedResponse/ApiResponse再校验一遍 ->
+jsonable_encoder把整棵字典树又递归走一遍 -> json.dumps，大头全花在pydantic和jsonable_encoder上。
+现在热路径（走响应缓存的列表、详情，还有/api/stats）：
+- 行 -> 字典用预先编好的序列化器（attrgetter一次取出所有字段，C里跑），时间不再手工isoformat，原样交给orjson
+- 外面的信封直接拼普通字典（键的顺序和ApiResponse / PaginatedResponse一致），不建模型、不走jsonable_encoder
+- FastJSONResponse用orjson一次写成bytes；其余接口也默认用它渲染（仍按response_model校验）
+- 装饰器上的response_model不动，/api/openapi.json照旧由schemas生成
+
+输出和原来逐字节等价：orjson对不带时区的datetime输出和isoformat()一样，中文不转义、没有多余空格。
+新增序列化器时字段顺序照抄对应的to_dict()，测试里会逐个比对。
+"""
+from operator import attrgetter
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import orjson
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+Serializer = Callable[[Any], dict]
+
+
+def _default(obj: Any) -> Any:
+    """orjson不认识的类型：pydantic模型按JSON模式导出，别的照实报错"""
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json")
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(obj: Any) -> bytes:
+    """序列化成UTF-8的JSON bytes（紧凑、中文不转义，datetime输出isoformat）"""
+    return orjson.dumps(obj, default=_default)
+
+
+def loads(data: bytes | str) -> Any:
+    return orjson.loads(data)
+
+
+class FastJSONResponse(JSONResponse):
+    """orjson渲染的JSONResponse，内容可以直接带datetime"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def row_serializer(fields: Iterable[str], **nested: Serializer) -> Serializer:
+    """
+    编一个 行 -> 字典 的序列化器：按fields的顺序取同名属性，一次attrgetter全取出来
+    nested是要再转一道的字段：值是列表就逐个转，是None就还是None，否则转单个
+    """
+    keys = tuple(fields)
+    if len(keys) < 2:
+        raise ValueError("至少两个字段，attrgetter单字段不返回元组")
+    getter = attrgetter(*keys)
+    if not nested:
+        return lambda row: dict(zip(keys, getter(row)))
+
+    converters = tuple(nested.items())
+
+    def serialize(row: Any) -> dict:
+        data = dict(zip(keys, getter(row)))
+        for key, convert in converters:
+            value = data[key]
+            if isinstance(value, list):
+                data[key] = [convert(item) for item in value]
+            elif value is not None:
+                data[key] = convert(value)
+        return data
+
+    return serialize
+
+
+# 分类、标签的引用：{id, name, slug}
+ref_item = row_serializer(("id", "name", "slug"))
+
+# 列表页的一篇（ArticleListRow，分类和标签已经是字典），同Article.to_list_dict()
+LIST_ITEM_FIELDS = (
+    "id", "title", "slug", "summary", "cover_image", "category", "tags",
+    "author_name", "author_avatar", "views", "published_at", "created_at",
+)
+list_item = row_serializer(LIST_ITEM_FIELDS)
+
+# 文章详情（Article，关联已经加载好），同Article.to_dict()
+DETAIL_FIELDS = (
+    "id", "title", "slug", "summary", "content", "cover_image", "category", "tags",
+    "author_name", "author_avatar", "status", "is_original", "views",
+    "published_at", "created_at", "updated_at", "media_items",
+)
+media_item = row_serializer(("id", "type", "url", "thumbnail_url", "caption"))
+article_detail = row_serializer(DETAIL_FIELDS, category=ref_item, tags=ref_item, media_items=media_item)
+
+
+def list_items(rows: Iterable[Any]) -> List[dict]:
+    return [list_item(row) for row in rows]
+
+
+def envelope(data: Optional[dict] = None, message: str = "success", code: int = 0) -> dict:
+    """和ApiResponse一样的外壳"""
+    return {"code": code, "message": message, "data": data}
+
+
+def page_body(
+    items: List[dict],
+    total: int,
+    page: int,
+    page_size: int,
+    total_pages: int,
+    next_cursor: Optional[str] = None,
+    has_more: bool = False,
+    count_strategy: str = "exact",
+) -> Dict[str, Any]:
+    """和PaginatedResponse一样的分页响应体"""
+    return {
+        "items": items,
+        "total": total,
+        "page": page,
+        "page_size": page_size,
+        "total_pages": total_pages,
+        "next_cursor": next_cursor,
+        "has_more": has_more,
+        "count_strategy": count_strategy,
+    }
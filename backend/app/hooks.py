@@ -0,0 +1,171 @@
+"""
+文章变更钩子
+不管是接口、测试夹具还是脚本，只要走ORM改了文章，这里都能拿到改之前和改之后的快照。
+- on_flush：和本次写入同一个事务里执行，适合维护计数表、索引表这类数据库里的派生数据
+- on_commit：事务提交之后执行，适合更新进程内的内存索引、缓存
+
+SAVEPOINT（begin_nested）释放、回滚也会触发Session的after_commit / after_rollback，
+自己监听这两个事件的，开头先用outermost()挡掉，只认最外层事务真正提交、回滚的那一下。
+攒在session.info里等提交的列表，SAVEPOINT回滚时这里统一截回它开始时的长度。
+
+直接用Core批量写的（比如导入脚本）绕过了这里，写完自己调对应的rebuild！
+"""
+from typing import Callable, FrozenSet, List, NamedTuple, Optional
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, attributes
+
+from .models import Article
+
+
+class ArticleSnapshot(NamedTuple):
+    """文章在某一时刻影响派生数据的那几个字段"""
+    id: int
+    status: str
+    category_id: Optional[int]
+    tag_ids: FrozenSet[int]
+
+
+class ArticleChange(NamedTuple):
+    """一次变更：新建时before为空，删除时after为空"""
+    before: Optional[ArticleSnapshot]
+    after: Optional[ArticleSnapshot]
+    # 变更后的ORM对象（删除时为空）和本次改动过的属性名（只有更新时才有）
+    article: Optional[Article] = None
+    changed: FrozenSet[str] = frozenset()
+
+    @property
+    def article_id(self) -> int:
+        return (self.after or self.before).id
+
+    def touches(self, *keys: str) -> bool:
+        """新建、删除一律算；更新时看这几个属性有没有改"""
+        if self.before is None or self.after is None:
+            return True
+        return any(key in self.changed for key in keys)
+
+
+FlushHandler = Callable[[Session, List[ArticleChange]], None]
+CommitHandler = Callable[[List[ArticleChange]], None]
+
+_flush_handlers: List[FlushHandler] = []
+_commit_handlers: List[CommitHandler] = []
+
+_PENDING_KEY = "article_changes"
+_SAVEPOINT_MARKS_KEY = "savepoint_marks"
+
+
+def on_flush(fn: FlushHandler) -> FlushHandler:
+    """注册flush钩子（同步函数，在事务内执行）"""
+    _flush_handlers.append(fn)
+    return fn
+
+
+def on_commit(fn: CommitHandler) -> CommitHandler:
+    """注册commit钩子（同步函数，提交成功后执行）"""
+    _commit_handlers.append(fn)
+    return fn
+
+
+def _old_scalar(obj: Article, key: str):
+    hist = attributes.get_history(obj, key)
+    if hist.deleted:
+        return hist.deleted[0]
+    if hist.unchanged:
+        return hist.unchanged[0]
+    return getattr(obj, key)
+
+
+def _snapshot_before(obj: Article) -> ArticleSnapshot:
+    tags = attributes.get_history(obj, "tags")
+    return ArticleSnapshot(
+        id=obj.id,
+        status=_old_scalar(obj, "status"),
+        category_id=_old_scalar(obj, "category_id"),
+        tag_ids=frozenset(t.id for t in [*(tags.unchanged or ()), *(tags.deleted or ())]),
+    )
+
+
+def _snapshot_after(obj: Article) -> ArticleSnapshot:
+    category_id = obj.category_id
+    category = obj.__dict__.get("category")  # 只看已经加载的，别在flush里触发懒加载
+    if category_id is None and category is not None:
+        category_id = category.id
+    return ArticleSnapshot(
+        id=obj.id,
+        status=obj.status,
+        category_id=category_id,
+        tag_ids=frozenset(t.id for t in obj.tags),
+    )
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changes(session: Session, flush_context) -> None:
+    changes = []
+    for obj in session.new:
+        if isinstance(obj, Article):
+            changes.append(ArticleChange(None, _snapshot_after(obj), obj))
+    for obj in session.dirty:
+        if isinstance(obj, Article) and session.is_modified(obj):
+            changed = frozenset(attr.key for attr in inspect(obj).attrs if attr.history.has_changes())
+            changes.append(ArticleChange(_snapshot_before(obj), _snapshot_after(obj), obj, changed))
+    for obj in session.deleted:
+        if isinstance(obj, Article):
+            changes.append(ArticleChange(_snapshot_before(obj), None))
+    if not changes:
+        return
+
+    for handler in _flush_handlers:
+        handler(session, changes)
+    session.info.setdefault(_PENDING_KEY, []).extend(changes)
+
+
+def outermost(session: Session) -> bool:
+    """after_commit / after_rollback里判断是不是最外层事务（不是SAVEPOINT）结束"""
+    return not session.in_nested_transaction()
+
+
+@event.listens_for(Session, "after_transaction_create")
+def _mark_savepoint(session: Session, transaction) -> None:
+    """开SAVEPOINT时记下session.info里各个待提交列表有多长"""
+    if transaction.nested:
+        marks = {key: len(value) for key, value in session.info.items() if isinstance(value, list)}
+        session.info.setdefault(_SAVEPOINT_MARKS_KEY, {})[transaction] = marks
+
+
+@event.listens_for(Session, "after_rollback")
+def _truncate_savepoint(session: Session) -> None:
+    """SAVEPOINT回滚了，里面追加进待提交列表的东西都扔掉，别等外层提交后当真处理"""
+    if outermost(session):
+        return
+    marks = session.info.get(_SAVEPOINT_MARKS_KEY, {}).get(session.get_nested_transaction())
+    if marks is None:
+        return
+    for key, value in session.info.items():
+        if isinstance(value, list):
+            del value[marks.get(key, 0):]
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _drop_savepoint_marks(session: Session, transaction) -> None:
+    marks = session.info.get(_SAVEPOINT_MARKS_KEY)
+    if marks:
+        marks.pop(transaction, None)
+
+
+@event.listens_for(Session, "after_commit")
+def _dispatch_changes(session: Session) -> None:
+    if not outermost(session):
+        return
+    changes = session.info.pop(_PENDING_KEY, None)
+    if not changes:
+        return
+    for handler in _commit_handlers:
+        handler(changes)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changes(session: Session) -> None:
+    if not outermost(session):
+        return
+    session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,125 @@
+"""
+幂等创建 - n8n的HTTP节点失败会自动重试
+以前重试要么又建一篇 slug-1 的重复文章，要么把标签全建一遍之后才在slug检查上报错。
+现在创建接口认两种幂等键：
+- 请求头 Idempotency-Key（同一个接口里唯一）
+- 请求体里的 original_url（资讯原文链接，n8n的数据里本来就有）
+第一次成功的响应（状态码 + 响应体）按键记在进程内的IdempotencyStore里，
+重复的请求查一次字典就原样返回（响应头带 Idempotent-Replayed: true），不碰文章表。
+同一个键的请求还在处理中又来一个（n8n超时重试）就等前一个的结果，不会并发建两篇。
+
+只记成功的响应，失败的重试会重新执行；容量 IDEMPOTENCY_MAX_KEYS，过期时间 IDEMPOTENCY_TTL。
+进程重启、多进程部署时各进程各记各的，这个场景下再重复推送就交给近似重复检测（dedup.py）兜底。
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from .config import settings
+
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+Response = Tuple[int, dict]
+
+
+def idempotency_keys(scope: str, header_key: Optional[str], original_url: Optional[str] = None) -> List[str]:
+    """一个请求的幂等键：请求头的键按接口区分，原文链接不区分接口"""
+    keys = []
+    if header_key and header_key.strip():
+        keys.append(f"{scope}:{header_key.strip()}")
+    if original_url and original_url.strip():
+        keys.append(url_key(original_url))
+    return keys
+
+
+def url_key(original_url: str) -> str:
+    return f"url:{original_url.strip()}"
+
+
+class IdempotencyStore:
+    """幂等键 -> (过期时间, 状态码, 响应体)，LRU + TTL，过期的读到时才删"""
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, int, dict]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Response]:
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] <= time.monotonic():
+            del self._entries[key]
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1], entry[2]
+
+    def put(self, key: str, status_code: int, body: dict) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl, status_code, body)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def run(self, keys: Sequence[str], produce: Callable[[], Awaitable[Response]]) -> Tuple[int, dict, bool]:
+        """
+        按幂等键执行一次：记过的直接返回（第三项为True），同键在处理中就等它，
+        否则执行produce，成功（2xx）的响应记到所有键下
+        """
+        while True:
+            for key in keys:
+                hit = self.get(key)
+                if hit is not None:
+                    return hit[0], hit[1], True
+            pending = next((self._inflight[key] for key in keys if key in self._inflight), None)
+            if pending is None:
+                break
+            self.waits += 1
+            await asyncio.shield(pending)  # 前一个失败了就轮到自己执行
+
+        future = asyncio.get_running_loop().create_future()
+        for key in keys:
+            self._inflight[key] = future
+        try:
+            status_code, body = await produce()
+            if 200 <= status_code < 300:
+                for key in keys:
+                    self.put(key, status_code, body)
+            return status_code, body, False
+        finally:
+            for key in keys:
+                if self._inflight.get(key) is future:
+                    del self._inflight[key]
+            future.set_result(None)
+
+    def reset(self) -> None:
+        """清空记录和统计（测试用）"""
+        self._entries.clear()
+        self._inflight.clear()
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self.evictions = 0
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "in_flight": len(self._inflight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "waits": self.waits,
+            "evictions": self.evictions,
+        }
+
+
+idempotency_store = IdempotencyStore(settings.IDEMPOTENCY_MAX_KEYS, settings.IDEMPOTENCY_TTL)
@@ -0,0 +1,418 @@
+"""
+JSONL批量导入 - 老数据迁移、整库灌数据用
+以前只能一篇篇调 POST /api/articles，100万篇要跑一整天。现在：
+
+    python -m app.importer articles.jsonl [--batch-size 2000] [--workers 4]
+
+- 流式读文件，一行一篇，字段同ArticleCreateSchema；文件多大内存都一样
+- 校验、算基础slug、FTS分词、重复检测签名这些吃CPU的活放进进程池（--workers，0就在本进程里做）
+- 主进程一批一个事务：slug（slug_counters一次拿够）、分类、标签各一两条集合查询，
+  文章/标签关联/媒体/FTS/签名/计数增量/相关文章队列/条件GET版本号全部Core executemany（和ORM钩子维护的一样），
+  不建ORM对象
+- 导入期间先删掉这几张表的非唯一索引、FTS暂停自动合并段，导完重建索引、optimize一次
+  （中途挂了也没事：应用启动时init_db会把缺的索引补上，FTS照样能用，只是段多一点）
+- 断点（字节偏移、行号、累计结果）记在import_checkpoints表里，按文件的绝对路径一行，和那一批在同一个事务里写：
+  提交了断点才往前走，挂在哪儿都不会重复导。重跑同一个命令从断点接着导；--restart从头来
+- 坏行（JSON不对、校验不过、分类不存在）和指定slug已存在的记进 <文件>.errors.jsonl，不影响其他行
+- 进度和吞吐打到stderr
+
+导入不做近似重复判断（迁移的数据本来就是要全进来的），只把签名写好，之后新来的文章能跟它们比。
+运行中的应用进程里的搜索建议内存索引、响应缓存不会自动带上导入的文章，导完重启一下应用。
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import Counter, deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from datetime import datetime
+from functools import partial
+from typing import Callable, Deque, Dict, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+from pydantic import ValidationError
+from sqlalchemy import delete, event, func, insert, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+
+from .conditional import bump_versions
+from .config import settings
+from .counters import counter_delta_rows, counter_keys, counter_upsert
+from .database import Base, create_missing_indexes
+from .dedup import band_keys, fingerprint, signature_bytes
+from .hooks import ArticleSnapshot
+from .ingest import (
+    CHINA_TZ, STATUS_CREATED, STATUS_DUPLICATE, STATUS_ERROR, BulkEntry,
+    assign_slugs, clean_tag_names, media_fields, resolve_tags, validation_message,
+)
+from .models import (
+    Article, ArticleFingerprint, ArticleFingerprintBand, Category, ImportCheckpoint, Media, RelatedRefreshQueue,
+    article_tag_table,
+)
+from .response_cache import TAG_LISTS, category_tag, tag_tag
+from .schemas import ArticleCreateSchema
+from .search import FTS_TABLE, fts, fts_available, index_row
+from .slugs import article_base_slug
+
+# 导入期间删掉、导完重建非唯一索引的表；唯一索引留着，slug查重和标签名解析要用
+DEFERRED_INDEX_TABLES = ("articles", "article_tag", "media", "article_fingerprint_bands")
+FTS_DEFAULT_AUTOMERGE = 4
+
+# 一批写库撞了唯一约束（应用同时在写）就回滚重来，最多这么多次
+MAX_ATTEMPTS = 3
+
+
+class Prepared(NamedTuple):
+    """worker处理好的一行：校验后的字段 + 预先算好的派生数据"""
+    line: int
+    fields: dict
+    base: Optional[str]
+    fts_row: Optional[dict]
+    signature: Optional[bytes]
+    bands: List[int]
+
+
+class Rejected(NamedTuple):
+    line: int
+    error: str
+
+
+def prepare_lines(lines: List[Tuple[int, bytes]], with_fts: bool) -> List[Union[Prepared, Rejected]]:
+    """worker进程里跑：校验一批行，算好基础slug、FTS分词、重复检测签名"""
+    out: List[Union[Prepared, Rejected]] = []
+    for number, raw in lines:
+        try:
+            data = ArticleCreateSchema.model_validate_json(raw)
+        except ValidationError as e:
+            out.append(Rejected(number, validation_message(e)))
+            continue
+        base = None if data.slug else article_base_slug(data.title, data.published_at)
+        fts_row = index_row(data.title, data.summary, " ".join(clean_tag_names(data.tags)), data.content) if with_fts else None
+        signature = fingerprint(data.title, data.content)
+        out.append(Prepared(
+            number, data.model_dump(), base, fts_row,
+            None if signature is None else signature_bytes(signature),
+            [] if signature is None else band_keys(signature),
+        ))
+    return out
+
+
+def read_batches(path: str, offset: int, line: int, batch_size: int) -> Iterator[Tuple[List[Tuple[int, bytes]], int, int]]:
+    """从字节偏移offset（第line行之后）接着读，每batch_size个非空行一批，带上批尾的偏移和行号"""
+    batch: List[Tuple[int, bytes]] = []
+    with open(path, "rb") as f:
+        f.seek(offset)
+        for raw in f:
+            offset += len(raw)
+            line += 1
+            if raw.strip():
+                batch.append((line, raw))
+            if len(batch) >= batch_size:
+                yield batch, offset, line
+                batch = []
+    if batch:
+        yield batch, offset, line
+
+
+class ImportReport:
+    """导入进度：读到第几行、建了多少、重复多少、坏了多少"""
+
+    def __init__(self, offset: int = 0, line: int = 0, created: int = 0, duplicate: int = 0, error: int = 0):
+        self.offset = offset
+        self.line = line
+        self.created = created
+        self.duplicate = duplicate
+        self.error = error
+        self.started = time.perf_counter()
+        self.resumed_from = line
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    @property
+    def rate(self) -> float:
+        """本次运行每秒处理的行数"""
+        return (self.line - self.resumed_from) / self.elapsed if self.elapsed else 0.0
+
+    def checkpoint(self, source: str, offset: int, line: int, results: List[Tuple[int, dict]]) -> dict:
+        """读到offset / 第line行、再算上这批results之后的断点（报告本身不动，提交了再apply）"""
+        statuses = Counter(result["status"] for _, result in results)
+        created, duplicate = statuses.pop(STATUS_CREATED, 0), statuses.pop(STATUS_DUPLICATE, 0)
+        return {
+            "source": source, "offset": offset, "line": line, "created": self.created + created,
+            "duplicate": self.duplicate + duplicate, "error": self.error + sum(statuses.values()),
+        }
+
+    def apply(self, state: dict) -> None:
+        self.offset, self.line = state["offset"], state["line"]
+        self.created, self.duplicate, self.error = state["created"], state["duplicate"], state["error"]
+
+    def summary(self) -> str:
+        return (
+            f"{self.line:,} lines  {self.created:,} created  {self.duplicate:,} duplicate  {self.error:,} error  "
+            f"{self.rate:,.0f} lines/s  {self.elapsed:,.1f} s"
+        )
+
+
+CHECKPOINT_FIELDS = ("offset", "line", "created", "duplicate", "error")
+
+
+async def _load_checkpoint(engine: AsyncEngine, source: str) -> Optional[dict]:
+    table = ImportCheckpoint.__table__
+    async with engine.connect() as conn:
+        row = (await conn.execute(
+            select(*(table.c[name] for name in CHECKPOINT_FIELDS)).where(table.c.source == source)
+        )).first()
+    return None if row is None else dict(row._mapping)
+
+
+async def _save_checkpoint(db: AsyncSession, state: dict) -> None:
+    """断点upsert进当前事务，跟着这批一起提交"""
+    table = ImportCheckpoint.__table__
+    stmt = sqlite_insert(table).values(**state, updated_at=datetime.utcnow())
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=[table.c.source],
+        set_={name: stmt.excluded[name] for name in (*CHECKPOINT_FIELDS, "updated_at")},
+    ))
+
+
+def _defer_indexes(conn: Connection) -> None:
+    for name in DEFERRED_INDEX_TABLES:
+        for index in Base.metadata.tables[name].indexes:
+            if not index.unique:
+                conn.exec_driver_sql(f"DROP INDEX IF EXISTS {index.name}")
+
+
+def _set_fts_automerge(conn: Connection, value: int) -> None:
+    conn.exec_driver_sql(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rank) VALUES ('automerge', {int(value)})")
+
+
+def _optimize_fts(conn: Connection) -> None:
+    conn.exec_driver_sql(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+
+
+async def _insert_batch(db: AsyncSession, entries: List[BulkEntry], prepared: Dict[int, Prepared]) -> None:
+    """一批写进当前事务，每个entry.result填上结果（调用方提交）"""
+    slugs = await assign_slugs(db, entries)
+
+    category_ids = {e.data.category_id for e in entries if e.data.category_id and e.result is None}
+    known_categories: Dict[int, str] = {}
+    if category_ids:
+        result = await db.execute(select(Category.id, Category.slug).where(Category.id.in_(category_ids)))
+        known_categories = dict(result.all())
+    pending = []
+    for entry in entries:
+        if entry.result is not None:
+            continue
+        if entry.data.category_id and entry.data.category_id not in known_categories:
+            entry.result = {"status": STATUS_ERROR, "error": "分类不存在"}
+            continue
+        pending.append(entry)
+    if not pending:
+        return
+
+    tags = await resolve_tags(db, (name for e in pending for name in e.data.tags))
+    # 主键自己分配：同一个事务里slug计数表已经拿了写锁，别人插不进来；没拿到锁撞了就整批重来
+    next_id = (await db.execute(select(func.max(Article.id)))).scalar() or 0
+    now = datetime.now(CHINA_TZ)
+    articles, links, media, fts_rows, prints, bands, queue = [], [], [], [], [], [], []
+    deltas: Counter = Counter()
+    for entry in pending:
+        next_id += 1
+        data, extra = entry.data, prepared[entry.index]
+        tag_ids = [tags[name].id for name in clean_tag_names(data.tags)]
+        articles.append({
+            "id": next_id, "title": data.title, "slug": slugs[entry.index], "summary": data.summary,
+            "content": data.content, "cover_image": data.cover_image, "category_id": data.category_id,
+            "author_name": data.author_name, "author_avatar": data.author_avatar, "is_original": data.is_original,
+            "status": data.status, "published_at": data.published_at or now,
+        })
+        links.extend({"article_id": next_id, "tag_id": tag_id} for tag_id in tag_ids)
+        media.extend({**media_fields(item), "article_id": next_id} for item in data.media_items)
+        if extra.fts_row is not None:
+            fts_rows.append({"rowid": next_id, **extra.fts_row})
+        if extra.signature is not None:
+            prints.append({"article_id": next_id, "signature": extra.signature})
+            bands.extend({"key": key, "article_id": next_id} for key in dict.fromkeys(extra.bands))
+        queue.append({"article_id": next_id})
+        deltas.update(counter_keys(ArticleSnapshot(next_id, data.status, data.category_id, frozenset(tag_ids))))
+        entry.result = {"status": STATUS_CREATED, "id": next_id}
+
+    await db.execute(insert(Article.__table__), articles)
+    for table, rows in (
+        (article_tag_table, links),
+        (Media.__table__, media),
+        (fts, fts_rows),
+        (ArticleFingerprint.__table__, prints),
+        (ArticleFingerprintBand.__table__, bands),
+    ):
+        if rows:
+            await db.execute(insert(table), rows)
+    await db.execute(sqlite_insert(RelatedRefreshQueue).on_conflict_do_nothing(), queue)
+    await db.execute(counter_upsert(), counter_delta_rows(deltas))
+    # 条件GET的版本号：总列表、这批用到的分类和标签
+    versions = [TAG_LISTS] + [tag_tag(tag.slug) for tag in tags.values()]
+    versions.extend(category_tag(known_categories[e.data.category_id]) for e in pending if e.data.category_id)
+    await bump_versions(db, versions)
+
+
+async def _write_batch(
+    db: AsyncSession,
+    batch: List[Union[Prepared, Rejected]],
+    checkpoint: Optional[Callable[[List[Tuple[int, dict]]], dict]] = None,
+) -> List[Tuple[int, dict]]:
+    """
+    一批一个事务写库，返回每行的(行号, 结果)
+    checkpoint：拿这批的结果算出新断点，和这批在同一个事务里写进import_checkpoints
+    """
+    rejected = [(item.line, {"status": STATUS_ERROR, "error": item.error}) for item in batch if isinstance(item, Rejected)]
+    prepared = {item.line: item for item in batch if isinstance(item, Prepared)}
+    entries = [
+        BulkEntry(item.line, ArticleCreateSchema.model_construct(**item.fields), item.base) for item in prepared.values()
+    ]
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            await _insert_batch(db, entries, prepared)
+            results = rejected + [(entry.index, entry.result) for entry in entries]
+            if checkpoint is not None:
+                await _save_checkpoint(db, checkpoint(results))
+            await db.commit()
+            return results
+        except IntegrityError:
+            await db.rollback()
+            if attempt == MAX_ATTEMPTS - 1:
+                raise
+            for entry in entries:
+                entry.result = None
+
+
+def _import_engine(url: str) -> AsyncEngine:
+    """导入专用的引擎：大页缓存、临时表放内存，提交只在检查点上fsync"""
+    engine = create_async_engine(url)
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def _pragmas(dbapi_connection, connection_record) -> None:
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA synchronous = NORMAL")
+        cursor.execute("PRAGMA cache_size = -262144")
+        cursor.execute("PRAGMA temp_store = MEMORY")
+        cursor.close()
+
+    return engine
+
+
+async def import_file(
+    engine: AsyncEngine,
+    path: str,
+    *,
+    batch_size: int = 2000,
+    workers: int = 0,
+    errors_path: Optional[str] = None,
+    restart: bool = False,
+    defer_indexes: bool = True,
+    progress: bool = False,
+) -> ImportReport:
+    """把JSONL文件导进engine对应的库，返回导入报告；有断点就接着导"""
+    source = os.path.abspath(path)
+    errors_path = errors_path or f"{path}.errors.jsonl"
+    state = None if restart else await _load_checkpoint(engine, source)
+    report = ImportReport(**state) if state else ImportReport()
+
+    async with engine.begin() as conn:
+        if restart:
+            await conn.execute(delete(ImportCheckpoint.__table__).where(ImportCheckpoint.source == source))
+        with_fts = await conn.run_sync(fts_available)
+        if defer_indexes:
+            await conn.run_sync(_defer_indexes)
+        if with_fts:
+            await conn.run_sync(_set_fts_automerge, 0)
+
+    executor: Optional[Executor] = ProcessPoolExecutor(workers) if workers > 0 else None
+    loop = asyncio.get_running_loop()
+    batches = read_batches(path, report.offset, report.line, batch_size)
+    in_flight: Deque[Tuple[asyncio.Future, int, int]] = deque()
+
+    def submit() -> None:
+        """进程池里最多同时排 2*workers 批，读文件不会跑到写库前面太多"""
+        while len(in_flight) < max(1, 2 * workers):
+            item = next(batches, None)
+            if item is None:
+                return
+            lines, offset, line = item
+            if executor is None:
+                future = loop.create_future()
+                future.set_result(prepare_lines(lines, with_fts))
+            else:
+                future = loop.run_in_executor(executor, prepare_lines, lines, with_fts)
+            in_flight.append((future, offset, line))
+
+    last_report = 0.0
+    try:
+        with open(errors_path, "w" if not state else "a", encoding="utf-8") as errors:
+            async with AsyncSession(engine, expire_on_commit=False) as db:
+                submit()
+                while in_flight:
+                    future, offset, line = in_flight.popleft()
+                    batch = await future
+                    submit()
+                    # 断点和这批一起提交；提交成功了报告再跟着往前走
+                    advance = partial(report.checkpoint, source, offset, line)
+                    results = sorted(await _write_batch(db, batch, advance), key=lambda r: r[0])
+                    for number, result in results:
+                        if result["status"] == STATUS_CREATED:
+                            continue
+                        record = {"line": number, **{k: v for k, v in result.items() if k != "index"}}
+                        errors.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    errors.flush()
+                    report.apply(advance(results))
+                    if progress and time.perf_counter() - last_report >= 1:
+                        last_report = time.perf_counter()
+                        print(f"\r{report.summary()}", end="", file=sys.stderr, flush=True)
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+    finish_started = time.perf_counter()
+    async with engine.begin() as conn:
+        if defer_indexes:
+            await conn.run_sync(create_missing_indexes)
+        if with_fts:
+            await conn.run_sync(_set_fts_automerge, FTS_DEFAULT_AUTOMERGE)
+            await conn.run_sync(_optimize_fts)
+    if progress:
+        print(f"\r{report.summary()}", file=sys.stderr)
+        print(f"indexes rebuilt and FTS optimized in {time.perf_counter() - finish_started:,.1f} s", file=sys.stderr)
+    return report
+
+
+async def _main(argv: List[str]) -> None:
+    from .database import init_db
+
+    parser = argparse.ArgumentParser(prog="python -m app.importer", description="JSONL批量导入文章")
+    parser.add_argument("path", help="JSONL/NDJSON文件，一行一篇，字段同 POST /api/articles")
+    parser.add_argument("--batch-size", type=int, default=settings.IMPORT_BATCH_SIZE, help="每批多少行（一批一个事务）")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="校验/分词进程数，0表示不开进程池")
+    parser.add_argument("--errors", help="坏行记录，默认 <文件>.errors.jsonl")
+    parser.add_argument("--restart", action="store_true", help="不管断点，从头导")
+    parser.add_argument("--keep-indexes", action="store_true", help="导入期间不删索引（应用同时在跑、库很大只追加一点时用）")
+    args = parser.parse_args(argv)
+
+    await init_db()
+    engine = _import_engine(settings.DATABASE_URL)
+    try:
+        report = await import_file(
+            engine, args.path, batch_size=args.batch_size, workers=args.workers,
+            errors_path=args.errors, restart=args.restart,
+            defer_indexes=not args.keep_indexes, progress=True,
+        )
+    finally:
+        await engine.dispose()
+    print(f"imported: {report.summary()}")
+
+
+if __name__ == "__main__":
+    asyncio.run(_main(sys.argv[1:]))
@@ -0,0 +1,503 @@
+"""
+文章入库（单篇创建、更新标签和批量导入共用）
+n8n以前一篇一篇POST，每篇要查好几次slug、每个标签一次查询、一次flush一次commit。
+批量接口 POST /api/articles/bulk 按块处理：
+- 一块里所有slug一起查：指定的slug一条IN查重，自动生成的按基础slug分组，每组从slug_counters一次拿够编号（见slugs.py）
+- 一块里所有标签一起解析（resolve_tags：进程内缓存 + 一条IN + INSERT ON CONFLICT DO NOTHING + 一条IN查回）；分类一条IN校验
+- 文章、标签关联、媒体走ORM一次flush批量INSERT，一块一个写入单元交给写入协调器（和别的写接口一起排队、
+  一起group commit，不另外占写连接），计数表/搜索索引这些钩子照常维护
+- 某块出错（并发导入抢了同一个slug、标签建不出来、锁等超时……什么错都算）就回滚这一块，逐篇重试，
+  坏的那篇单独报error，不连累整批；前面的块已经提交了，不能让整个请求变成500、调用方不知道哪些入了库
+- 近似重复：一块的指纹一条查询查库（见dedup.py），同一块里的也互相比，按DEDUP_POLICY拒绝/合并/标记
+"""
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import event, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, attributes, make_transient_to_detached
+from sqlalchemy.orm.util import identity_key
+
+from .config import settings
+from .dedup import (
+    ARTICLE_STATUS_DUPLICATE, POLICY_LINK, POLICY_MERGE, POLICY_OFF, POLICY_REJECT, DuplicateMatch,
+    band_keys, find_duplicate, find_duplicates, fingerprint, link_duplicates, nearest_in,
+)
+from .hooks import outermost
+from .idempotency import idempotency_store, url_key
+from .loading import article_write_options
+from .models import Article, Category, Media, Tag
+from .schemas import ArticleCreateSchema
+from .slugs import allocate_slug_batches, allocate_slugs, article_base_slug, generate_slug
+from .writer import write_coordinator
+
+# 北京时间（UTC+8）
+CHINA_TZ = timezone(timedelta(hours=8))
+
+STATUS_CREATED = "created"
+STATUS_DUPLICATE = "duplicate"
+STATUS_ERROR = "error"
+STATUS_MERGED = "merged"
+
+
+def media_fields(item: dict) -> dict:
+    """请求里的一个媒体项 -> media表的列"""
+    return {
+        "type": item.get("type", "image"),
+        "url": item.get("url", ""),
+        "thumbnail_url": item.get("thumbnail_url"),
+        "caption": item.get("caption"),
+        "order_index": item.get("order_index", 0),
+    }
+
+
+def _media(item: dict) -> Media:
+    return Media(**media_fields(item))
+
+
+def build_article(data: ArticleCreateSchema, slug: str, tags: List[Tag]) -> Article:
+    """按创建Schema拼出文章对象，媒体挂在关系上跟文章一起INSERT"""
+    article = Article(
+        title=data.title,
+        slug=slug,
+        summary=data.summary,
+        content=data.content,
+        cover_image=data.cover_image,
+        category_id=data.category_id,
+        author_name=data.author_name,
+        author_avatar=data.author_avatar,
+        is_original=data.is_original,
+        status=data.status,
+        published_at=data.published_at or datetime.now(CHINA_TZ),
+    )
+    article.tags = tags
+    article.media_items = [_media(item) for item in data.media_items]
+    return article
+
+
+def merge_data(article: Article, data: ArticleCreateSchema, tags: List[Tag]) -> None:
+    """
+    把一份重复稿合并到文章上：补新标签、补空的摘要/封面、补没有的媒体，正文标题不动
+    动了什么就刷新updated_at：只改标签、媒体时文章行本身不UPDATE，onupdate不会触发，
+    详情的ETag / Last-Modified按它算，不刷新的话客户端一直拿304、看不到新标签和媒体
+    """
+    changed = False
+    known = {tag.id for tag in article.tags}
+    added = [tag for tag in tags if tag.id not in known]
+    if added:
+        article.tags = article.tags + added
+        changed = True
+    if not article.summary and data.summary:
+        article.summary = data.summary
+        changed = True
+    if not article.cover_image and data.cover_image:
+        article.cover_image = data.cover_image
+        changed = True
+    urls = {media.url for media in article.media_items}
+    for item in data.media_items:
+        if item.get("url") and item["url"] not in urls:
+            urls.add(item["url"])
+            article.media_items.append(_media(item))
+            changed = True
+    if changed:
+        article.updated_at = datetime.utcnow()
+
+
+async def detect_duplicate(db: AsyncSession, data: ArticleCreateSchema) -> Optional[DuplicateMatch]:
+    """单篇创建前查近似重复，DEDUP_POLICY=off或正文太短就不查"""
+    if settings.DEDUP_POLICY == POLICY_OFF:
+        return None
+    signature = fingerprint(data.title, data.content)
+    return await find_duplicate(db, signature) if signature is not None else None
+
+
+async def merge_into(db: AsyncSession, article_id: int, data: ArticleCreateSchema) -> Article:
+    """merge策略：把重复稿合并到已有文章上（在调用方的事务里，调用方提交）"""
+    article = await db.get(Article, article_id, options=article_write_options(), populate_existing=True)
+    tags = await get_or_create_tags(db, data.tags) if data.tags else []
+    merge_data(article, data, tags)
+    return article
+
+
+def validation_message(error: ValidationError) -> str:
+    """校验错误拼成一行：字段路径: 原因"""
+    return "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in error.errors())
+
+
+def clean_tag_names(names: Iterable[str]) -> List[str]:
+    """去掉空白和重复，保持原来的顺序"""
+    return list(dict.fromkeys(name.strip() for name in names if name and name.strip()))
+
+
+class TagCache:
+    """
+    进程内的 标签名 -> (id, slug) 缓存，LRU，热门标签基本不用查库
+    - 事务提交之后才把本次查到/建好的标签放进来，回滚了的不会进缓存
+    - ORM改名、删标签时在flush里作废对应的名字；绕过ORM改标签表的要自己调clear()
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Tuple[int, str]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, name: str) -> Optional[Tuple[int, str]]:
+        entry = self._entries.get(name)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(name)
+        self.hits += 1
+        return entry
+
+    def put(self, name: str, tag_id: int, slug: str) -> None:
+        self._entries[name] = (tag_id, slug)
+        self._entries.move_to_end(name)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, name: str) -> None:
+        self._entries.pop(name, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def reset(self) -> None:
+        """清空缓存和统计（测试用）"""
+        self.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "max_size": self.max_size, "hits": self.hits, "misses": self.misses}
+
+
+tag_cache = TagCache(settings.TAG_CACHE_SIZE)
+
+_PENDING_TAGS_KEY = "resolved_tags"
+_CACHED_TAGS_KEY = "cached_tags"
+
+
+@event.listens_for(Session, "after_flush")
+def _invalidate_changed_tags(session: Session, flush_context) -> None:
+    for obj in session.deleted:
+        if isinstance(obj, Tag):
+            tag_cache.invalidate(obj.name)
+    for obj in session.dirty:
+        if isinstance(obj, Tag):
+            # 改名、改slug：新旧名字都作废
+            tag_cache.invalidate(obj.name)
+            for name in attributes.get_history(obj, "name").deleted:
+                tag_cache.invalidate(name)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_resolved_tags(session: Session) -> None:
+    if not outermost(session):
+        return
+    session.info.pop(_CACHED_TAGS_KEY, None)
+    for name, tag_id, slug in session.info.pop(_PENDING_TAGS_KEY, ()):
+        tag_cache.put(name, tag_id, slug)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_resolved_tags(session: Session) -> None:
+    # 用过缓存里的标签又回滚了（SAVEPOINT也算），说不定就是缓存过期惹的祸：这些名字作废，下次重新查库
+    for name in session.info.get(_CACHED_TAGS_KEY, ()):
+        tag_cache.invalidate(name)
+    if not outermost(session):
+        return
+    session.info.pop(_CACHED_TAGS_KEY, None)
+    session.info.pop(_PENDING_TAGS_KEY, None)
+
+
+def _attach_tag(db: AsyncSession, tag_id: int, name: str, slug: str) -> Tag:
+    """缓存命中的标签直接挂进Session当作已持久化的对象，不发SQL"""
+    tag = db.sync_session.identity_map.get(identity_key(Tag, tag_id))
+    if tag is None:
+        tag = Tag(id=tag_id, name=name, slug=slug)
+        make_transient_to_detached(tag)
+        db.add(tag)
+    return tag
+
+
+async def _free_slugs(db: AsyncSession, names: List[str]) -> Dict[str, str]:
+    """给新标签挑slug：一条IN查哪些已被占用，撞了的加时间戳后缀"""
+    wanted = {name: generate_slug(name) or "tag" for name in names}
+    result = await db.execute(select(Tag.slug).where(Tag.slug.in_(set(wanted.values()))))
+    taken = set(result.scalars())
+    suffix = datetime.utcnow().strftime("%Y%m%d%H%M%S")
+    slugs = {}
+    for name in names:
+        slug = wanted[name]
+        n = 0
+        while slug in taken:
+            n += 1
+            slug = f"{wanted[name]}-{suffix}" if n == 1 else f"{wanted[name]}-{suffix}-{n - 1}"
+        taken.add(slug)
+        slugs[name] = slug
+    return slugs
+
+
+async def resolve_tags(db: AsyncSession, names: Iterable[str]) -> Dict[str, Tag]:
+    """
+    一批标签名一起解析，返回 名称 -> 标签
+    缓存命中的不查库；剩下的一条IN查，还缺的 INSERT ... ON CONFLICT DO NOTHING 一起建，
+    再一条IN把它们查回来。并发导入抢着建同一个标签时，没抢到的那边直接查回对方建好的。
+    查出来的等事务真正提交了才进缓存；用了缓存的事务（或SAVEPOINT）回滚，那几个名字从缓存里作废。
+    """
+    names = clean_tag_names(names)
+    tags: Dict[str, Tag] = {}
+    missing = []
+    for name in names:
+        cached = tag_cache.get(name)
+        if cached is None:
+            missing.append(name)
+        else:
+            tags[name] = _attach_tag(db, cached[0], name, cached[1])
+            db.sync_session.info.setdefault(_CACHED_TAGS_KEY, set()).add(name)
+    if not missing:
+        return tags
+
+    pending = db.sync_session.info.setdefault(_PENDING_TAGS_KEY, [])
+    result = await db.execute(select(Tag).where(Tag.name.in_(missing)))
+    for tag in result.scalars():
+        tags[tag.name] = tag
+        pending.append((tag.name, tag.id, tag.slug))
+
+    # 新名字的slug也可能刚被别人占了，那一行会被DO NOTHING跳过，换个后缀再来
+    for _ in range(3):
+        missing = [name for name in missing if name not in tags]
+        if not missing:
+            break
+        slugs = await _free_slugs(db, missing)
+        await db.execute(
+            sqlite_insert(Tag).on_conflict_do_nothing(),
+            [{"name": name, "slug": slugs[name]} for name in missing],
+        )
+        result = await db.execute(select(Tag).where(Tag.name.in_(missing)))
+        for tag in result.scalars():
+            tags[tag.name] = tag
+            pending.append((tag.name, tag.id, tag.slug))
+
+    missing = [name for name in names if name not in tags]
+    if missing:
+        raise RuntimeError(f"标签创建失败: {missing}")
+    return tags
+
+
+async def get_or_create_tags(db: AsyncSession, tag_names: List[str]) -> List[Tag]:
+    """获取或创建标签，按传入顺序返回（去掉空白和重复）"""
+    tags = await resolve_tags(db, tag_names)
+    return [tags[name] for name in clean_tag_names(tag_names)]
+
+
+class BulkEntry:
+    """批量里的一篇：原始位置、校验后的数据、处理结果"""
+
+    __slots__ = ("index", "data", "base", "result")
+
+    def __init__(self, index: int, data: ArticleCreateSchema, base: Optional[str] = None):
+        self.index = index
+        self.data = data
+        self.base = base  # 预先算好的基础slug（导入时在worker进程里算），没有就现算
+        self.result: Optional[dict] = None
+
+
+async def assign_slugs(db: AsyncSession, entries: List[BulkEntry]) -> Dict[int, str]:
+    """给一块文章分配slug，指定的slug已存在（库里或同一批里）就标成duplicate"""
+    explicit = {e.index: e.data.slug for e in entries if e.data.slug}
+    existing: Dict[str, int] = {}
+    if explicit:
+        result = await db.execute(select(Article.slug, Article.id).where(Article.slug.in_(set(explicit.values()))))
+        existing = dict(result.all())
+
+    slugs: Dict[int, str] = {}
+    used: Set[str] = set()
+    for entry in entries:
+        slug = explicit.get(entry.index)
+        if slug is None:
+            continue
+        if slug in existing or slug in used:
+            entry.result = {"index": entry.index, "status": STATUS_DUPLICATE, "slug": slug, "id": existing.get(slug)}
+            continue
+        used.add(slug)
+        slugs[entry.index] = slug
+
+    # 自动生成的按基础slug分组，所有组一起拿够号；避开同一批里指定的slug，被占了的那组再单独补
+    groups: Dict[str, List[BulkEntry]] = {}
+    for entry in entries:
+        if not entry.data.slug:
+            base = entry.base or article_base_slug(entry.data.title, entry.data.published_at)
+            groups.setdefault(base, []).append(entry)
+    allocated = await allocate_slug_batches(db, {base: len(group) for base, group in groups.items()})
+    for base, group in groups.items():
+        free = [slug for slug in allocated[base] if slug not in used]
+        while len(free) < len(group):
+            more = await allocate_slugs(db, base, len(group) - len(free))
+            free.extend(slug for slug in more if slug not in used)
+        for entry, slug in zip(group, free):
+            slugs[entry.index] = slug
+    return slugs
+
+
+async def _find_chunk_duplicates(db: AsyncSession, entries: List[BulkEntry]) -> Dict[int, object]:
+    """
+    一块文章查近似重复：库里的一条查询，同一块里的按段键分桶互相比
+    返回 序号 -> 库里的DuplicateMatch 或 同一块里它重复的那一项（原文，不会是别人的重复）
+    """
+    if settings.DEDUP_POLICY == POLICY_OFF:
+        return {}
+    signatures = {e.index: fingerprint(e.data.title, e.data.content) for e in entries}
+    checked = [e for e in entries if signatures[e.index] is not None]
+    matches = await find_duplicates(db, [signatures[e.index] for e in checked])
+
+    targets: Dict[int, object] = {}
+    buckets: Dict[int, List[BulkEntry]] = {}  # 同一块里的原文也按段键分桶，不用两两比
+    for entry, match in zip(checked, matches):
+        if match is not None:
+            targets[entry.index] = match
+            continue
+        keys = band_keys(signatures[entry.index])
+        others = dict.fromkeys(other for key in keys for other in buckets.get(key, ()))
+        near = nearest_in(signatures[entry.index], ((other, signatures[other.index]) for other in others))
+        if near is not None:
+            targets[entry.index] = near[0]
+        else:
+            for key in keys:
+                buckets.setdefault(key, []).append(entry)
+    return targets
+
+
+def _canonical_id(target, built: Dict[int, Article]) -> int:
+    """重复的原文ID：库里的直接有，同一块里的要等flush之后才有"""
+    return built[target.index].id if isinstance(target, BulkEntry) else target.canonical_id
+
+
+async def _ingest_chunk(db: AsyncSession, entries: List[BulkEntry]) -> List[Tuple[BulkEntry, dict]]:
+    """
+    一块文章的写入单元：集合查询解析slug/标签/分类，一次flush写完（不提交）
+    入库了的（created / merged / reject下的duplicate）结果返回出去，提交成功了才记到entry上；
+    写库前就定了的（指定slug已存在、分类不存在）直接记在entry上
+    """
+    slugs = await assign_slugs(db, entries)
+
+    category_ids = {e.data.category_id for e in entries if e.data.category_id and e.result is None}
+    known_categories: Set[int] = set()
+    if category_ids:
+        result = await db.execute(select(Category.id).where(Category.id.in_(category_ids)))
+        known_categories = set(result.scalars())
+
+    pending = []
+    for entry in entries:
+        if entry.result is not None:
+            continue
+        if entry.data.category_id and entry.data.category_id not in known_categories:
+            entry.result = {"index": entry.index, "status": STATUS_ERROR, "error": "分类不存在"}
+            continue
+        pending.append(entry)
+    if not pending:
+        return []
+
+    candidates = pending
+    targets = await _find_chunk_duplicates(db, candidates)
+    policy = settings.DEDUP_POLICY
+    rejected = [e for e in candidates if policy == POLICY_REJECT and e.index in targets]
+    pending = [e for e in candidates if e not in rejected]
+
+    tags = await resolve_tags(db, (name for e in pending for name in e.data.tags))
+    articles = []
+    built: Dict[int, Article] = {}
+    merged: List[Tuple[BulkEntry, Article]] = []
+    loaded: Dict[int, Article] = {}
+    for entry in pending:
+        entry_tags = [tags[n] for n in clean_tag_names(entry.data.tags)]
+        target = targets.get(entry.index)
+        if policy == POLICY_MERGE and target is not None:
+            # 同一块里的原文还没入库，直接合并到它的对象上；库里的加载出来合并
+            if isinstance(target, BulkEntry):
+                into = built[target.index]
+            else:
+                if target.canonical_id not in loaded:
+                    loaded[target.canonical_id] = await db.get(
+                        Article, target.canonical_id, options=article_write_options(), populate_existing=True
+                    )
+                into = loaded[target.canonical_id]
+            merge_data(into, entry.data, entry_tags)
+            merged.append((entry, into))
+            continue
+        article = build_article(entry.data, slugs[entry.index], entry_tags)
+        if target is not None:
+            article.status = ARTICLE_STATUS_DUPLICATE
+        db.add(article)
+        built[entry.index] = article
+        articles.append((entry, article))
+
+    await db.flush()  # 拿到新文章ID，指纹行由flush钩子写好了
+    if policy == POLICY_LINK and targets:
+        await link_duplicates(db, {built[i].id: _canonical_id(t, built) for i, t in targets.items()})
+
+    results = []
+    for entry, article in articles:
+        result = {"index": entry.index, "status": STATUS_CREATED, "id": article.id, "slug": article.slug}
+        if entry.index in targets:
+            result["duplicate_of"] = _canonical_id(targets[entry.index], built)
+        results.append((entry, result))
+    for entry, article in merged:
+        results.append((entry, {"index": entry.index, "status": STATUS_MERGED, "id": article.id, "slug": article.slug}))
+    for entry in rejected:
+        results.append((entry, {
+            "index": entry.index, "status": STATUS_DUPLICATE, "id": _canonical_id(targets[entry.index], built),
+        }))
+    return results
+
+
+async def ingest_chunk(db: AsyncSession, entries: List[BulkEntry]) -> None:
+    """
+    一块文章交给写入协调器（没启动时在db上直接提交），结果记到每个entry.result上
+    出错（不光是IntegrityError）整块回滚，逐篇重来，谁坏了只报谁（块内的重复关系这时已入库，逐篇查也查得到）
+    """
+    try:
+        results = await write_coordinator.run(db, lambda session: _ingest_chunk(session, entries))
+    except Exception as e:
+        if len(entries) == 1:
+            error = str(e.orig) if isinstance(e, DBAPIError) else str(e)
+            entries[0].result = {"index": entries[0].index, "status": STATUS_ERROR, "error": error}
+            return
+        for entry in entries:
+            entry.result = None
+            await ingest_chunk(db, [entry])
+        return
+    for entry, result in results:
+        entry.result = result
+
+
+async def bulk_create_articles(db: AsyncSession, items: List[dict], chunk_size: int) -> List[dict]:
+    """批量创建文章，按输入顺序返回每一篇的结果：created / duplicate / merged / error"""
+    results: List[Optional[dict]] = [None] * len(items)
+    entries = []
+    for index, item in enumerate(items):
+        try:
+            data = ArticleCreateSchema.model_validate(item)
+        except ValidationError as e:
+            results[index] = {"index": index, "status": STATUS_ERROR, "error": validation_message(e)}
+            continue
+        # 原文链接最近单篇创建过（n8n先单篇推了又整批推），不用再查库
+        created = idempotency_store.get(url_key(data.original_url)) if data.original_url else None
+        if created is not None:
+            article = created[1]["data"]
+            results[index] = {"index": index, "status": STATUS_DUPLICATE, "id": article["id"], "slug": article["slug"]}
+            continue
+        entries.append(BulkEntry(index, data))
+
+    for start in range(0, len(entries), chunk_size):
+        chunk = entries[start:start + chunk_size]
+        await ingest_chunk(db, chunk)
+        for entry in chunk:
+            results[entry.index] = entry.result
+    return results
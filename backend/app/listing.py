@@ -0,0 +1,86 @@
+"""
+列表行的轻量读取路径
+列表类接口只查列表要用的那几列（绝不碰content），结果装进ArticleListRow，
+分类和标签按整页批量各查一次，不建ORM对象、不进identity map。
+"""
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import Select, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .loading import ARTICLE_LIST_COLUMNS
+from .models import Article, Category, Tag, article_tag_table
+
+
+class ArticleListRow:
+    """列表页的一篇文章，字段和Article.to_list_dict()一一对应"""
+
+    __slots__ = (
+        "id", "title", "slug", "summary", "cover_image", "category_id",
+        "author_name", "author_avatar", "views", "published_at", "created_at",
+        "category", "tags",
+    )
+
+    def __init__(self, row: Any):
+        for column in ARTICLE_LIST_COLUMNS:
+            setattr(self, column.key, getattr(row, column.key))
+        self.category: Optional[dict] = None
+        self.tags: List[dict] = []
+
+    def to_list_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "title": self.title,
+            "slug": self.slug,
+            "summary": self.summary,
+            "cover_image": self.cover_image,
+            "category": self.category,
+            "tags": self.tags,
+            "author_name": self.author_name,
+            "author_avatar": self.author_avatar,
+            "views": self.views,
+            "published_at": self.published_at.isoformat() if self.published_at else None,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+        }
+
+
+def list_row_query() -> Select:
+    """列表行的基础查询，在它上面接where/join/order_by"""
+    return select(*ARTICLE_LIST_COLUMNS).select_from(Article)
+
+
+async def hydrate_list_rows(db: AsyncSession, rows: Iterable[Any]) -> List[ArticleListRow]:
+    """把查出来的列表行补上分类和标签，整页只多两条查询"""
+    items = [ArticleListRow(row) for row in rows]
+    if not items:
+        return items
+
+    category_ids = {item.category_id for item in items if item.category_id is not None}
+    categories: Dict[int, dict] = {}
+    if category_ids:
+        result = await db.execute(
+            select(Category.id, Category.name, Category.slug).where(Category.id.in_(category_ids))
+        )
+        categories = {c.id: {"id": c.id, "name": c.name, "slug": c.slug} for c in result}
+
+    tags: Dict[int, List[dict]] = defaultdict(list)
+    result = await db.execute(
+        select(article_tag_table.c.article_id, Tag.id, Tag.name, Tag.slug)
+        .join(Tag, Tag.id == article_tag_table.c.tag_id)
+        .where(article_tag_table.c.article_id.in_([item.id for item in items]))
+        .order_by(article_tag_table.c.article_id, Tag.id)
+    )
+    for article_id, tag_id, name, slug in result:
+        tags[article_id].append({"id": tag_id, "name": name, "slug": slug})
+
+    for item in items:
+        item.category = categories.get(item.category_id)
+        item.tags = tags.get(item.id, [])
+    return items
+
+
+async def fetch_list_rows(db: AsyncSession, query: Select) -> List[ArticleListRow]:
+    """执行列表查询并补全分类标签"""
+    result = await db.execute(query)
+    return await hydrate_list_rows(db, result.all())
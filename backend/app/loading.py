@@ -0,0 +1,58 @@
+"""
+按接口划分的加载方案（loading profile）
+模型上的关系默认都是selectin，写接口用着方便，但读接口只该加载自己序列化的那些列和关系。
+每个读接口在查询上挂对应的options，没声明的关系一律raiseload，谁偷偷访问直接报错，
+不会再悄悄多出一条SQL或者把几十KB的content读出来又扔掉。
+列表类接口连ORM对象都不建，按ARTICLE_LIST_COLUMNS只查列，见listing.py。
+"""
+from sqlalchemy.orm import load_only, raiseload, selectinload
+
+from .models import Article, Category, Tag
+
+# to_list_dict()用到的列，列表类接口只查这些
+ARTICLE_LIST_COLUMNS = (
+    Article.id,
+    Article.title,
+    Article.slug,
+    Article.summary,
+    Article.cover_image,
+    Article.category_id,
+    Article.author_name,
+    Article.author_avatar,
+    Article.views,
+    Article.published_at,
+    Article.created_at,
+)
+
+CATEGORY_REF_COLUMNS = (Category.id, Category.name, Category.slug)
+CATEGORY_LIST_COLUMNS = (*CATEGORY_REF_COLUMNS, Category.description, Category.icon)
+TAG_COLUMNS = (Tag.id, Tag.name, Tag.slug)
+
+
+def article_detail_options() -> tuple:
+    """详情接口：全部列 + 分类引用 + 标签 + 媒体"""
+    return (
+        selectinload(Article.category).options(load_only(*CATEGORY_REF_COLUMNS), raiseload("*")),
+        selectinload(Article.tags).load_only(*TAG_COLUMNS),
+        selectinload(Article.media_items),
+        raiseload("*"),
+    )
+
+
+def article_write_options() -> tuple:
+    """写接口：和详情一样全量加载，更新/删除时要靠旧的标签和媒体算差异"""
+    return (
+        selectinload(Article.category).options(raiseload("*")),
+        selectinload(Article.tags),
+        selectinload(Article.media_items),
+    )
+
+
+def category_list_options() -> tuple:
+    """分类列表：只要分类自己的列，绝不顺带加载分类下的文章"""
+    return (load_only(*CATEGORY_LIST_COLUMNS), raiseload("*"))
+
+
+def category_ref_options() -> tuple:
+    """只需要分类的id/name/slug时用"""
+    return (load_only(*CATEGORY_REF_COLUMNS), raiseload("*"))
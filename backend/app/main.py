@@ -3,26 +3,61 @@ FastAPI主入口文件
 老王给你搭好了，别tm乱改核心逻辑！
 """
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, Depends, HTTPException, Request, status
+from fastapi import FastAPI, Depends, Header, HTTPException, Request, Response, status
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func, desc
-from typing import Optional, List
-from datetime import datetime, timezone, timedelta
-import re
-
-# 北京时间（UTC+8）
-CHINA_TZ = timezone(timedelta(hours=8))
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import aliased
+from typing import Optional, List, Tuple
+from datetime import datetime
 import uvicorn
 
 from .config import settings
-from .database import get_db, init_db, engine
-from .models import Article, Category, Tag, Media
+from .database import get_db, get_read_db, init_db, dispose_engines, AsyncSessionLocal, ReadSessionLocal
+from .models import Article, ArticleSimilarity, Category, Tag, Media, article_tag_table
+from .pagination import KeysetOrder, InvalidCursorError, fetch_page
+from .counters import (
+    COUNT_CACHED, COUNT_EXACT, COUNT_HAS_MORE, COUNT_STRATEGIES, backfill_counters, cached_count, popular_tags_query,
+)
+from .view_counter import view_counter
+from .writer import write_coordinator
+from .stats import stats_snapshot
+from .singleflight import single_flight
+from .fastjson import FastJSONResponse, article_detail, envelope, list_items, page_body
+from .conditional import (
+    article_validator, article_version, bump_versions, collection_validator, is_conditional,
+    not_modified, not_modified_response, revalidation,
+)
+from .response_cache import (
+    CACHE_HEADER, STALE_WHILE_REVALIDATE_ROUTES, TAG_CATEGORIES, TAG_LISTS,
+    article_tag, cache_control, category_tag, response_cache, tag_tag,
+)
+from .idempotency import REPLAYED_HEADER, idempotency_keys, idempotency_store
+from .export import export_query, ndjson_stream
+from .ingest import (
+    STATUS_CREATED, STATUS_DUPLICATE, STATUS_ERROR, STATUS_MERGED,
+    build_article, bulk_create_articles, detect_duplicate, get_or_create_tags, merge_into, tag_cache,
+)
+from .dedup import ARTICLE_STATUS_DUPLICATE, POLICY_MERGE, POLICY_REJECT, backfill_fingerprints, link_duplicates
+from .slugs import allocate_slug, article_base_slug, generate_slug
+from .listing import list_row_query, hydrate_list_rows, fetch_list_rows
+from .search import SearchHits, build_match_query, fts_ready, backfill_search_index, title_hits
+from .suggest import suggestion_index
+from .related import KIND_CATEGORY, KIND_SIMILAR, KIND_TAG, related_refresher, seed_related_queue
+from .loading import (
+    article_detail_options,
+    article_write_options,
+    category_list_options,
+    category_ref_options,
+)
 from .schemas import (
     ArticleListSchema,
     ArticleDetailSchema,
     ArticleCreateSchema,
+    ArticleBulkCreateSchema,
     ArticleUpdateSchema,
     ArticleSimpleSchema,
     CategorySchema,
@@ -43,14 +78,38 @@ async def lifespan(app: FastAPI):
     """
     # 启动时执行
     await init_db()
+    async with AsyncSessionLocal() as session:
+        if await backfill_counters(session):
+            print("Article counters rebuilt")
+        indexed = await backfill_search_index(session)
+        if indexed:
+            print(f"Search index backfilled: {indexed} articles")
+        print(f"Suggestion index built: {await suggestion_index.build(session)} articles")
+        fingerprinted = await backfill_fingerprints(session)
+        if fingerprinted:
+            print(f"Duplicate fingerprints backfilled: {fingerprinted} articles")
+        queued = await seed_related_queue(session)
+        if queued:
+            print(f"Related articles queued for computation: {queued} articles")
+    write_coordinator.start(AsyncSessionLocal)
+    view_counter.start(AsyncSessionLocal, write_coordinator)
+    related_refresher.start(ReadSessionLocal)  # 只读连接读语料，写入交给write_coordinator
+    response_cache.start(ReadSessionLocal)
+    stats_snapshot.start(ReadSessionLocal)
     print(f"{settings.APP_NAME} v{settings.APP_VERSION} started successfully!")
     print(f"API docs: http://localhost:8000/api/docs")
 
     yield  # 应用运行期间
 
-    # 关闭时执行 - 优雅关闭数据库连接
+    # 关闭时执行 - 先把缓冲的浏览量写回，再关数据库连接
+    await related_refresher.stop()
+    await response_cache.stop()
+    await stats_snapshot.stop()
+    await view_counter.stop()
+    print(f"Flushed views: {view_counter.flushed_total}")
+    await write_coordinator.stop()
     print("Shutting down database connection...")
-    await engine.dispose()
+    await dispose_engines()
     print("Graceful shutdown completed!")
 
 
@@ -63,6 +122,7 @@ app = FastAPI(
     redoc_url="/api/redoc",
     openapi_url="/api/openapi.json",
     lifespan=lifespan,  # 使用新的lifespan参数
+    default_response_class=FastJSONResponse,  # orjson渲染，见fastjson.py
 )
 
 
@@ -99,43 +159,59 @@ async def general_exception_handler(request: Request, exc: Exception):
 
 
 # ========== 辅助函数 ==========
-def generate_slug(title: str) -> str:
-    """生成URL友好的slug，老王我亲自写的！"""
-    # 转小写，替换空格和特殊字符为连字符
-    slug = re.sub(r"[^\w\s-]", "", title.lower())
-    slug = re.sub(r"[-\s]+", "-", slug)
-    return slug.strip("-")
+# 游标分页的排序键，和各接口原来的排序保持一致，最后补id保证唯一
+LATEST_ORDER = KeysetOrder("latest", Article.published_at, Article.created_at, Article.id, nullable=[0])
+HOT_ORDER = KeysetOrder("hot", Article.views, Article.published_at, Article.id, nullable=[1])
+
+
+async def fetch_article_page(db: AsyncSession, query, order: KeysetOrder, limit: int, cursor: Optional[str] = None, offset: int = 0):
+    """分页取列表行并补全分类标签，游标不合法直接400"""
+    try:
+        rows, next_cursor = await fetch_page(db, query, order, limit, cursor=cursor, offset=offset)
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return await hydrate_list_rows(db, rows), next_cursor
+
+
+async def count_rows(db: AsyncSession, query) -> int:
+    """COUNT(*)筛选结果，子查询只带id列，别把content也拖进来"""
+    result = await db.execute(
+        select(func.count()).select_from(query.with_only_columns(Article.id, maintain_column_froms=True).subquery())
+    )
+    return result.scalar() or 0
+
+
+def resolve_count_strategy(count: Optional[str]) -> str:
+    """没传就用配置里的默认计数策略"""
+    count = count or settings.LIST_COUNT_STRATEGY
+    if count not in COUNT_STRATEGIES:
+        raise HTTPException(status_code=400, detail=f"count只能是: {', '.join(COUNT_STRATEGIES)}")
+    return count
+
+
+def page_lower_bound(offset: int, items: list, has_more: bool) -> int:
+    """has_more模式下不数总数，total只给已知的下界"""
+    return offset + len(items) + (1 if has_more else 0)
 
 
 async def get_article_by_id_or_slug(db: AsyncSession, id_or_slug: str | int) -> Article | None:
-    """通过ID或slug获取文章"""
+    """通过ID或slug获取文章（详情加载方案）"""
     if isinstance(id_or_slug, int) or id_or_slug.isdigit():
-        return await db.get(Article, int(id_or_slug))
+        condition = Article.id == int(id_or_slug)
     else:
-        result = await db.execute(select(Article).where(Article.slug == id_or_slug))
-        return result.scalar_one_or_none()
-
-
-async def get_or_create_tags(db: AsyncSession, tag_names: List[str]) -> List[Tag]:
-    """获取或创建标签，老王这个函数写得很优雅！"""
-    tags = []
-    for name in tag_names:
-        if not name or not name.strip():
-            continue
-        name = name.strip()
-        result = await db.execute(select(Tag).where(Tag.name == name))
-        tag = result.scalar_one_or_none()
-        if not tag:
-            slug = generate_slug(name)
-            # 确保slug唯一
-            existing = await db.execute(select(Tag).where(Tag.slug == slug))
-            if existing.scalar_one_or_none():
-                slug = f"{slug}-{datetime.utcnow().strftime('%Y%m%d%H%M%S')}"
-            tag = Tag(name=name, slug=slug)
-            db.add(tag)
-            await db.flush()
-        tags.append(tag)
-    return tags
+        condition = Article.slug == id_or_slug
+    result = await db.execute(
+        select(Article)
+        .where(condition)
+        .options(*article_detail_options())
+        .execution_options(populate_existing=True)
+    )
+    return result.scalar_one_or_none()
+
+
+async def get_article_for_write(db: AsyncSession, article_id: int) -> Article | None:
+    """写接口取文章，标签、媒体全量加载，顺便刷新掉同一Session里列表查询留下的半截对象"""
+    return await db.get(Article, article_id, options=article_write_options(), populate_existing=True)
 
 
 # ========== API路由 ==========
@@ -153,15 +229,39 @@ async def health_check():
     return ApiResponse(code=0, message="OK", data={"status": "healthy"})
 
 
+@app.get("/api/metrics", response_model=ApiResponse)
+async def metrics():
+    """运行指标（浏览量写回缓冲、搜索建议索引等）"""
+    return ApiResponse(
+        code=0,
+        message="success",
+        data={
+            "view_counter": view_counter.stats(),
+            "suggestions": suggestion_index.stats(),
+            "related": related_refresher.stats(),
+            "stats_snapshot": stats_snapshot.stats(),
+            "tag_cache": tag_cache.stats(),
+            "idempotency": idempotency_store.stats(),
+            "writer": write_coordinator.stats(),
+            "response_cache": response_cache.stats(),
+            "single_flight": single_flight.stats(),
+            "conditional": revalidation.stats(),
+        },
+    )
+
+
 # ========== 文章API ==========
 @app.get("/api/articles", response_model=PaginatedResponse)
 async def list_articles(
+    request: Request,
     page: int = 1,
     page_size: int = 20,
     category: Optional[str] = None,
     tag: Optional[str] = None,
     status: str = "published",
-    db: AsyncSession = Depends(get_db),
+    cursor: Optional[str] = None,
+    count: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db),
 ):
     """
     获取文章列表
@@ -171,8 +271,31 @@ async def list_articles(
     - **category**: 分类slug筛选
     - **tag**: 标签slug筛选
     - **status**: 文章状态筛选
+    - **cursor**: 上一页返回的next_cursor，传了就按游标翻页，忽略page
+    - **count**: 总数计数策略 exact（COUNT(*)）/ has_more（不计数）/ cached（计数表）
     """
-    query = select(Article).where(Article.status == status)
+    count = resolve_count_strategy(count)
+    params = dict(page=page, page_size=page_size, category=category, tag=tag, status=status, cursor=cursor, count=count)
+    tags = [category_tag(category)] if category else []
+    if tag:
+        tags.append(tag_tag(tag))
+    return await cached(
+        request, "articles", params, tags or [TAG_LISTS], db, lambda session: _list_articles(session, **params)
+    )
+
+
+async def _list_articles(
+    db: AsyncSession,
+    page: int,
+    page_size: int,
+    category: Optional[str],
+    tag: Optional[str],
+    status: str,
+    cursor: Optional[str],
+    count: str,
+) -> dict:
+    """文章列表（缓存没命中时查库），直接拼PaginatedResponse结构的字典"""
+    query = list_row_query().where(Article.status == status)
 
     # 按分类筛选
     if category:
@@ -182,27 +305,29 @@ async def list_articles(
     if tag:
         query = query.join(Article.tags).where(Tag.slug == tag)
 
-    # 按发布时间倒序
-    query = query.order_by(desc(Article.published_at), desc(Article.created_at))
+    # 分页（按发布时间倒序）
+    offset = (page - 1) * page_size
+    articles, next_cursor = await fetch_article_page(db, query, LATEST_ORDER, page_size, cursor=cursor, offset=offset)
+    has_more = next_cursor is not None
 
     # 获取总数
-    total_result = await db.execute(select(func.count()).select_from(query.subquery()))
-    total = total_result.scalar() or 0
-
-    # 分页
+    if count == COUNT_HAS_MORE:
+        total = page_lower_bound(offset, articles, has_more)
+    elif count == COUNT_CACHED:
+        total = await cached_count(db, status, category, tag)
+    else:
+        total = await count_rows(db, query)
     total_pages = (total + page_size - 1) // page_size
-    offset = (page - 1) * page_size
-    query = query.offset(offset).limit(page_size)
-
-    result = await db.execute(query)
-    articles = result.scalars().all()
 
-    return PaginatedResponse(
-        items=[article.to_list_dict() for article in articles],
+    return page_body(
+        items=list_items(articles),
         total=total,
         page=page,
         page_size=page_size,
         total_pages=total_pages,
+        next_cursor=next_cursor,
+        has_more=has_more,
+        count_strategy=count,
     )
 
 
@@ -211,25 +336,33 @@ async def list_articles(
 async def search_articles_v2(
     q: str,
     limit: int = 5,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
 ):
     """
     即时搜索文章（用于前端搜索建议）
 
-    - **q**: 搜索关键词（标题）
+    - **q**: 搜索关键词（标题或标签名，前缀、中间匹配都行）
     - **limit**: 返回数量，默认5条
     """
     if not q or len(q.strip()) < 1:
         return ApiResponse(code=0, message="success", data={"items": []})
 
-    keyword = f"%{q.strip()}%"
-    query = select(Article).where(
-        Article.status == "published",
-        Article.title.ilike(keyword),
-    ).order_by(desc(Article.views)).limit(limit)
+    # 内存索引建好了就直接查内存，不碰数据库（提交时没同步上的先补读那几篇）
+    if suggestion_index.ready:
+        if suggestion_index.stale:
+            await suggestion_index.refresh(db)
+        return ApiResponse(code=0, message="success", data={"items": suggestion_index.suggest(q, limit)})
+
+    query = select(Article.id, Article.title, Article.slug, Article.summary).where(Article.status == "published")
+    hits = title_hits(q.strip()) if await fts_ready(db) else None
+    if hits is not None:
+        query = query.where(Article.id.in_(hits))
+    else:
+        query = query.where(Article.title.ilike(f"%{q.strip()}%"))
+    query = query.order_by(desc(Article.views)).limit(limit)
 
     result = await db.execute(query)
-    articles = result.scalars().all()
+    articles = result.all()
 
     return ApiResponse(
         code=0,
@@ -251,29 +384,63 @@ async def search_articles_v2(
 @app.get("/api/articles/{article_id}/related", response_model=ApiResponse)
 async def get_related_articles(
     article_id: int,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
 ):
     """
-    获取相关推荐文章
+    获取相关推荐文章（预先算好存在article_similarities里，见related.py，一次主键查询）
 
     - **article_id**: 文章ID
     返回：
-    - by_tag: 同标签文章（最多6条）
-    - by_category: 同分类热门文章（最多6条）
+    - similar: 综合最像的文章（最多6条）
+    - by_tag: 有共同标签的文章里最像的（最多6条）
+    - by_category: 同分类文章里最像的（最多6条）
     """
-    article = await db.get(Article, article_id)
-    if not article:
-        raise HTTPException(status_code=404, detail="文章不存在")
+    source = aliased(Article)
+    query = (
+        list_row_query()
+        .add_columns(ArticleSimilarity.kind)
+        .join(ArticleSimilarity, ArticleSimilarity.neighbor_id == Article.id)
+        .join(source, source.id == ArticleSimilarity.article_id)
+        .where(ArticleSimilarity.article_id == article_id, Article.status == "published")
+        .order_by(ArticleSimilarity.kind, ArticleSimilarity.rank)
+    )
+    rows = (await db.execute(query)).all()
+    if not rows:
+        # 还没算过（新文章排在重算队列里），退回现查
+        return ApiResponse(code=0, message="success", data=await related_fallback(db, article_id))
+
+    related = {KIND_SIMILAR: [], KIND_TAG: [], KIND_CATEGORY: []}
+    for row, item in zip(rows, await hydrate_list_rows(db, rows)):
+        related[row.kind].append(item.to_list_dict())
+    return ApiResponse(
+        code=0,
+        message="success",
+        data={
+            "similar": related[KIND_SIMILAR],
+            "by_tag": related[KIND_TAG],
+            "by_category": related[KIND_CATEGORY],
+        },
+    )
+
 
-    # 获取当前文章的标签ID和分类ID
-    tag_ids = [t.id for t in article.tags]
-    category_id = article.category_id
+async def related_fallback(db: AsyncSession, article_id: int) -> dict:
+    """没有预先算好的相关文章时现查：同标签按时间倒序、同分类按浏览量"""
+    # 获取当前文章的标签ID和分类ID，只查这两样
+    category_result = await db.execute(select(Article.category_id).where(Article.id == article_id))
+    row = category_result.first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="文章不存在")
+    category_id = row.category_id
+    tag_result = await db.execute(
+        select(article_tag_table.c.tag_id).where(article_tag_table.c.article_id == article_id)
+    )
+    tag_ids = tag_result.scalars().all()
 
     # 同标签文章
     by_tag = []
     if tag_ids:
         tag_query = (
-            select(Article)
+            list_row_query()
             .join(Article.tags)
             .where(
                 Article.status == "published",
@@ -284,14 +451,13 @@ async def get_related_articles(
             .order_by(desc(Article.published_at))
             .limit(6)
         )
-        tag_result = await db.execute(tag_query)
-        by_tag = tag_result.scalars().all()
+        by_tag = await fetch_list_rows(db, tag_query)
 
     # 同分类热门文章
     by_category = []
     if category_id:
         cat_query = (
-            select(Article)
+            list_row_query()
             .where(
                 Article.status == "published",
                 Article.id != article_id,
@@ -300,58 +466,141 @@ async def get_related_articles(
             .order_by(desc(Article.views), desc(Article.published_at))
             .limit(6)
         )
-        cat_result = await db.execute(cat_query)
-        by_category = cat_result.scalars().all()
+        by_category = await fetch_list_rows(db, cat_query)
 
-    return ApiResponse(
-        code=0,
-        message="success",
-        data={
-            "by_tag": [a.to_list_dict() for a in by_tag],
-            "by_category": [a.to_list_dict() for a in by_category],
-        },
-    )
+    return {
+        "similar": [],
+        "by_tag": [a.to_list_dict() for a in by_tag],
+        "by_category": [a.to_list_dict() for a in by_category],
+    }
 
 
 @app.get("/api/articles/{id_or_slug}", response_model=ApiResponse)
-async def get_article(id_or_slug: str, db: AsyncSession = Depends(get_db)):
-    """获取文章详情"""
-    article = await get_article_by_id_or_slug(db, id_or_slug)
-    if not article:
-        raise HTTPException(status_code=404, detail="文章不存在")
+async def get_article(id_or_slug: str, request: Request, db: AsyncSession = Depends(get_read_db)):
+    """
+    获取文章详情
+    带If-None-Match / If-Modified-Since且文章没改过就回304（只查一次id和updated_at），照样记浏览量
+    """
+    if is_conditional(request):
+        row = await article_version(db, id_or_slug)
+        if row is not None:
+            validator = article_validator(row.id, row.updated_at)
+            if not_modified(request, validator):
+                view_counter.record(row.id)
+                return not_modified_response(validator.headers())
+
+    async def fill(session: Optional[AsyncSession]) -> dict:
+        article = await get_article_by_id_or_slug(session or db, id_or_slug)
+        if not article:
+            raise HTTPException(status_code=404, detail="文章不存在")
+        return {
+            "body": envelope(article_detail(article)),
+            "headers": article_validator(article.id, article.updated_at).headers(),
+        }
+
+    entry, state = await cached_entry(
+        "article", response_cache.key("article", id_or_slug=id_or_slug),
+        lambda entry: [article_tag(entry["body"]["data"]["id"])], fill,
+    )
 
-    # 增加浏览次数
-    article.views += 1
-    await db.commit()
+    # 浏览次数先记在内存里，后台批量写回，返回值带上没写回的增量（缓存里存的是库里的值，别改它）
+    body = entry["body"]
+    data = body["data"]
+    view_counter.record(data["id"])
+    data = {**data, "views": data["views"] + view_counter.pending_for(data["id"])}
+    return cache_response("article", {**body, "data": data}, state, entry["headers"])
 
-    return ApiResponse(code=0, message="success", data=article.to_dict())
+
+async def cached_entry(route: str, key: str, tags, fill) -> Tuple[dict, str]:
+    """
+    走响应缓存，缓存的是 {"body": 响应体, "headers": 校验值头}：命中直接返回，没命中执行fill(None)（用请求的Session）存起来
+    tags拿缓存项算出挂哪些标签；返回(缓存项, HIT/MISS/STALE)
+    同参数的并发请求合并成一次（查缓存 + 没命中时查库），路由开没开合并看SINGLE_FLIGHT_ROUTES；
+    STALE_WHILE_REVALIDATE_ROUTES里的路由过期了先返回旧的，后台用新开的只读Session执行fill(session)刷新
+    """
+    return await single_flight.do(route, key, lambda: response_cache.get_or_set(
+        key, tags, fill, stale_ok=route in STALE_WHILE_REVALIDATE_ROUTES,
+    ))
+
+
+def cache_response(route: str, body: dict, state: str, validator_headers: Optional[dict] = None) -> FastJSONResponse:
+    """X-Cache头标明是否命中，带上校验值；允许边用旧的边刷新的路由带上给代理的Cache-Control"""
+    headers = {CACHE_HEADER: state, **(validator_headers or {})}
+    policy = cache_control(route)
+    if policy:
+        headers["Cache-Control"] = policy
+    return FastJSONResponse(content=body, headers=headers)
+
+
+async def cached(request: Request, route: str, params: dict, tags: List[str], db: AsyncSession, produce) -> Response:
+    """
+    列表类接口：条件请求先按标签版本号校验，没变就304；否则走响应缓存，
+    produce(session)返回和response_model同结构的普通字典（见fastjson.py），存进缓存、orjson直接渲染
+    校验值在查数据之前读，中间有写入最多让客户端下次多拿一遍，不会拿着新ETag配旧数据
+    """
+    key = response_cache.key(route, **params)
+    validator = None
+    if is_conditional(request):
+        validator = await collection_validator(db, key, tags)
+        if not_modified(request, validator):
+            policy = cache_control(route)
+            return not_modified_response({**validator.headers(), **({"Cache-Control": policy} if policy else {})})
+
+    async def fill(session: Optional[AsyncSession]) -> dict:
+        current = validator if session is None and validator is not None else None
+        if current is None:
+            current = await collection_validator(session or db, key, tags)
+        return {"body": await produce(session or db), "headers": current.headers()}
+
+    entry, state = await cached_entry(route, key, lambda entry: tags, fill)
+    return cache_response(route, entry["body"], state, entry["headers"])
+
+
+async def idempotent(keys: List[str], status_code: int, produce) -> JSONResponse:
+    """
+    按幂等键执行创建：重复的请求直接返回第一次的响应，不碰数据库
+    produce返回要序列化的响应对象；没有幂等键就直接执行
+    """
+    async def run():
+        return status_code, jsonable_encoder(await produce())
+
+    if not keys:
+        code, body = await run()
+        return JSONResponse(status_code=code, content=body)
+    code, body, replayed = await idempotency_store.run(keys, run)
+    return JSONResponse(status_code=code, content=body, headers={REPLAYED_HEADER: "true"} if replayed else None)
 
 
 @app.post("/api/articles", response_model=ApiResponse, status_code=status.HTTP_201_CREATED)
-async def create_article(article_data: ArticleCreateSchema, db: AsyncSession = Depends(get_db)):
+async def create_article(
+    article_data: ArticleCreateSchema,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    db: AsyncSession = Depends(get_db),
+):
     """
     创建文章（API上传用）
 
     支持的内容格式：
     - content: HTML格式的正文（Quill编辑器输出）
     - media_items: 媒体列表 [{type:'image|video', url:'...', caption:'...'}]
+
+    幂等：带 Idempotency-Key 请求头或 original_url 的重复请求原样返回第一次的响应
     """
-    # 生成slug（如果没提供）
-    if not article_data.slug:
-        slug = generate_slug(article_data.title)
-        # 确保slug唯一
-        counter = 1
-        original_slug = slug
-        while (await db.execute(select(Article).where(Article.slug == slug))).scalar_one_or_none():
-            slug = f"{original_slug}-{counter}"
-            counter += 1
-    else:
-        slug = article_data.slug
+    keys = idempotency_keys("articles", idempotency_key, article_data.original_url)
+    return await idempotent(
+        keys, status.HTTP_201_CREATED,
+        lambda: write_coordinator.run(db, lambda session: _create_article(session, article_data)),
+    )
 
-    # 检查slug是否已存在
-    existing = await db.execute(select(Article).where(Article.slug == slug))
-    if existing.scalar_one_or_none():
-        raise HTTPException(status_code=400, detail=f"Slug '{slug}' 已存在")
+
+async def _create_article(db: AsyncSession, article_data: ArticleCreateSchema) -> ApiResponse:
+    """创建文章的实际逻辑（写入单元，不提交），幂等包装见create_article"""
+    # 指定了slug就检查是否已存在
+    slug = article_data.slug
+    if slug:
+        existing = await db.execute(select(Article.id).where(Article.slug == slug))
+        if existing.scalar_one_or_none():
+            raise HTTPException(status_code=400, detail=f"Slug '{slug}' 已存在")
 
     # 获取或创建分类
     category = None
@@ -360,50 +609,78 @@ async def create_article(article_data: ArticleCreateSchema, db: AsyncSession = D
         if not category:
             raise HTTPException(status_code=400, detail="分类不存在")
 
+    # 近似重复（同一条新闻换个来源又推一遍），按DEDUP_POLICY处理
+    match = await detect_duplicate(db, article_data)
+    if match and settings.DEDUP_POLICY == POLICY_REJECT:
+        raise HTTPException(status_code=409, detail=f"内容和文章 {match.canonical_id} 重复")
+    if match and settings.DEDUP_POLICY == POLICY_MERGE:
+        article = await merge_into(db, match.canonical_id, article_data)
+        await db.flush()
+        await db.refresh(article)
+        return ApiResponse(code=0, message="已合并到已有文章", data=article.to_dict())
+
     # 获取或创建标签
     tags = await get_or_create_tags(db, article_data.tags) if article_data.tags else []
 
-    # 创建文章
-    article = Article(
-        title=article_data.title,
-        slug=slug,
-        summary=article_data.summary,
-        content=article_data.content,
-        cover_image=article_data.cover_image,
-        category_id=article_data.category_id,
-        author_name=article_data.author_name,
-        author_avatar=article_data.author_avatar,
-        is_original=article_data.is_original,
-        status=article_data.status,
-        published_at=article_data.published_at or datetime.now(CHINA_TZ),
-    )
+    # 没指定slug：按策略生成基础slug，撞了从计数表直接拿下一个编号
+    if not slug:
+        slug = await allocate_slug(db, article_base_slug(article_data.title, article_data.published_at))
 
-    # 设置关联
+    # 创建文章（媒体项挂在关系上一起写）
+    article = build_article(article_data, slug, tags)
     if category:
         article.category = category
-    if tags:
-        article.tags = tags
-
+    if match:
+        article.status = ARTICLE_STATUS_DUPLICATE
     db.add(article)
-    await db.flush()  # 获取article.id
-
-    # 添加媒体项
-    if article_data.media_items:
-        for media_item in article_data.media_items:
-            media = Media(
-                article_id=article.id,
-                type=media_item.get("type", "image"),
-                url=media_item.get("url", ""),
-                thumbnail_url=media_item.get("thumbnail_url"),
-                caption=media_item.get("caption"),
-                order_index=media_item.get("order_index", 0),
-            )
-            db.add(media)
 
-    await db.commit()
+    try:
+        await db.flush()
+    except IntegrityError:
+        # 回滚交给调用方。指定的slug：检查完到写入之间被并发请求抢了，是调用方的事；
+        # 自动生成的slug分配时已经避开了被占的，真撞了是服务端的问题，别让人家以为自己传错了
+        if article_data.slug:
+            raise HTTPException(status_code=400, detail=f"Slug '{slug}' 已存在")
+        raise HTTPException(status_code=409, detail="自动生成的slug冲突，请重试")
+    if match:
+        await link_duplicates(db, {article.id: match.canonical_id})
     await db.refresh(article)
 
-    return ApiResponse(code=0, message="文章创建成功", data=article.to_dict())
+    data = article.to_dict()
+    if match:
+        data["duplicate_of"] = match.canonical_id
+    return ApiResponse(code=0, message="文章创建成功", data=data)
+
+
+@app.post("/api/articles/bulk", response_model=ApiResponse)
+async def bulk_create_articles_api(
+    payload: ArticleBulkCreateSchema,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    批量创建文章（n8n批量推送用）
+
+    - 每一项的字段同单篇创建；按chunk_size分块，一块一个事务
+    - 返回每一项的结果（和输入同序）：created（带id、slug，link策略下的近似重复多带duplicate_of）/
+      duplicate（指定的slug已存在，或reject策略下内容重复，id是已有文章）/ merged（合并到了已有文章id）/ error（带原因）
+    - 某一项失败不影响其他项
+    - 带 Idempotency-Key 请求头的重复请求原样返回第一次的响应；original_url最近单篇创建过的项直接报duplicate
+    """
+    if len(payload.items) > settings.BULK_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"一次最多{settings.BULK_MAX_ITEMS}篇")
+    return await idempotent(
+        idempotency_keys("articles/bulk", idempotency_key), status.HTTP_200_OK, lambda: _bulk_create(db, payload)
+    )
+
+
+async def _bulk_create(db: AsyncSession, payload: ArticleBulkCreateSchema) -> ApiResponse:
+    """批量创建的实际逻辑，幂等包装见bulk_create_articles_api"""
+    results = await bulk_create_articles(db, payload.items, payload.chunk_size or settings.BULK_CHUNK_SIZE)
+    summary = {key: 0 for key in (STATUS_CREATED, STATUS_DUPLICATE, STATUS_MERGED, STATUS_ERROR)}
+    for result in results:
+        summary[result["status"]] += 1
+    return ApiResponse(code=0, message="批量创建完成", data={**summary, "items": results})
 
 
 @app.put("/api/articles/{article_id}", response_model=ApiResponse)
@@ -413,7 +690,12 @@ async def update_article(
     db: AsyncSession = Depends(get_db),
 ):
     """更新文章"""
-    article = await db.get(Article, article_id)
+    return await write_coordinator.run(db, lambda session: _update_article(session, article_id, article_data))
+
+
+async def _update_article(db: AsyncSession, article_id: int, article_data: ArticleUpdateSchema) -> ApiResponse:
+    """更新文章的写入单元"""
+    article = await get_article_for_write(db, article_id)
     if not article:
         raise HTTPException(status_code=404, detail="文章不存在")
 
@@ -449,7 +731,7 @@ async def update_article(
             setattr(article, field, value)
 
     article.updated_at = datetime.utcnow()
-    await db.commit()
+    await db.flush()
     await db.refresh(article)
 
     return ApiResponse(code=0, message="文章更新成功", data=article.to_dict())
@@ -458,38 +740,47 @@ async def update_article(
 @app.delete("/api/articles/{article_id}", response_model=ApiResponse)
 async def delete_article(article_id: int, db: AsyncSession = Depends(get_db)):
     """删除文章"""
-    article = await db.get(Article, article_id)
-    if not article:
-        raise HTTPException(status_code=404, detail="文章不存在")
-
-    await db.delete(article)
-    await db.commit()
-
+    async def unit(session: AsyncSession) -> None:
+        article = await get_article_for_write(session, article_id)
+        if not article:
+            raise HTTPException(status_code=404, detail="文章不存在")
+        await session.delete(article)
+        await session.flush()
+
+    await write_coordinator.run(db, unit)
     return ApiResponse(code=0, message="文章删除成功")
 
 
 # ========== 分类API ==========
 @app.get("/api/categories", response_model=ApiResponse)
-async def list_categories(db: AsyncSession = Depends(get_db)):
+async def list_categories(request: Request, db: AsyncSession = Depends(get_read_db)):
     """获取所有分类"""
-    result = await db.execute(select(Category).order_by(Category.id))
+    return await cached(request, "categories", {}, [TAG_CATEGORIES], db, _list_categories)
+
+
+async def _list_categories(db: AsyncSession) -> dict:
+    result = await db.execute(select(Category).options(*category_list_options()).order_by(Category.id))
     categories = result.scalars().all()
 
-    return ApiResponse(
-        code=0,
-        message="success",
-        data={
-            "items": [
-                {"id": c.id, "name": c.name, "slug": c.slug, "description": c.description, "icon": c.icon}
-                for c in categories
-            ]
-        },
-    )
+    return envelope({
+        "items": [
+            {"id": c.id, "name": c.name, "slug": c.slug, "description": c.description, "icon": c.icon}
+            for c in categories
+        ]
+    })
 
 
 @app.post("/api/categories", response_model=ApiResponse, status_code=status.HTTP_201_CREATED)
 async def create_category(category_data: CategoryCreateSchema, db: AsyncSession = Depends(get_db)):
     """创建分类"""
+    category = await write_coordinator.run(db, lambda session: _create_category(session, category_data))
+    stats_snapshot.invalidate()  # 分类数变了（提交之后再作废，别让并发的读把旧数又缓存上）
+    response_cache.invalidate([TAG_CATEGORIES, category_tag(category.slug)])
+    return ApiResponse(code=0, message="分类创建成功", data={"id": category.id, "name": category.name, "slug": category.slug})
+
+
+async def _create_category(db: AsyncSession, category_data: CategoryCreateSchema) -> Category:
+    """创建分类的写入单元"""
     # 检查名称是否重复
     existing = await db.execute(select(Category).where(Category.name == category_data.name))
     if existing.scalar_one_or_none():
@@ -504,45 +795,39 @@ async def create_category(category_data: CategoryCreateSchema, db: AsyncSession
         icon=category_data.icon,
     )
     db.add(category)
-    await db.commit()
-    await db.refresh(category)
-
-    return ApiResponse(code=0, message="分类创建成功", data={"id": category.id, "name": category.name, "slug": category.slug})
+    await db.flush()
+    # 分类列表、这个slug下的列表的条件GET版本号（响应缓存提交之后再清）
+    await bump_versions(db, [TAG_CATEGORIES, category_tag(category.slug)])
+    return category
 
 
 # ========== 标签API ==========
 @app.get("/api/tags", response_model=ApiResponse)
-async def list_tags(db: AsyncSession = Depends(get_db)):
+async def list_tags(request: Request, db: AsyncSession = Depends(get_read_db)):
     """获取所有标签"""
+    return await cached(request, "tags", {}, [TAG_LISTS], db, _list_tags)
+
+
+async def _list_tags(db: AsyncSession) -> dict:
     result = await db.execute(select(Tag).order_by(Tag.name))
     tags = result.scalars().all()
 
-    return ApiResponse(
-        code=0,
-        message="success",
-        data={"items": [{"id": t.id, "name": t.name, "slug": t.slug} for t in tags]},
-    )
+    return envelope({"items": [{"id": t.id, "name": t.name, "slug": t.slug} for t in tags]})
 
 
 @app.get("/api/tags/popular", response_model=ApiResponse)
-async def popular_tags(limit: int = 20, db: AsyncSession = Depends(get_db)):
-    """获取热门标签（按文章数量排序）"""
-    query = (
-        select(Tag.id, Tag.name, Tag.slug, func.count(Article.id).label("article_count"))
-        .join(Article.tags)
-        .group_by(Tag.id)
-        .order_by(desc("article_count"))
-        .limit(limit)
+async def popular_tags(request: Request, limit: int = 20, db: AsyncSession = Depends(get_read_db)):
+    """获取热门标签（按已发布文章数量排序，草稿不算）"""
+    return await cached(
+        request, "popular_tags", {"limit": limit}, [TAG_LISTS], db, lambda session: _popular_tags(session, limit)
     )
 
-    result = await db.execute(query)
+
+async def _popular_tags(db: AsyncSession, limit: int) -> dict:
+    result = await db.execute(popular_tags_query(limit))
     tags = result.all()
 
-    return ApiResponse(
-        code=0,
-        message="success",
-        data={"items": [{"id": t.id, "name": t.name, "slug": t.slug, "count": t.article_count} for t in tags]},
-    )
+    return envelope({"items": [{"id": t.id, "name": t.name, "slug": t.slug, "count": t.article_count} for t in tags]})
 
 
 # ========== 搜索API ==========
@@ -551,45 +836,70 @@ async def search_articles(
     q: str,
     page: int = 1,
     page_size: int = 20,
-    db: AsyncSession = Depends(get_db),
+    cursor: Optional[str] = None,
+    count: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db),
 ):
     """
     搜索文章（旧接口，保留兼容）
+    有FTS5索引时按相关度（bm25）排序并返回高亮片段，否则退回LIKE按发布时间排序
 
-    - **q**: 搜索关键词（标题或内容）
+    - **q**: 搜索关键词（标题、摘要、标签或内容，空格分隔多个词）
     - **page**: 页码
     - **page_size**: 每页数量
+    - **cursor**: 上一页返回的next_cursor
+    - **count**: 总数计数策略，搜索结果没有计数表，cached按exact处理
     """
+    count = resolve_count_strategy(count)
+    if count == COUNT_CACHED:
+        count = COUNT_EXACT
     if not q or len(q.strip()) < 2:
         raise HTTPException(status_code=400, detail="搜索关键词至少2个字符")
 
-    keyword = f"%{q.strip()}%"
-    query = select(Article).where(
-        Article.status == "published",
-        (Article.title.ilike(keyword)) | (Article.content.ilike(keyword)),
-    )
-
-    # 获取总数
-    total_result = await db.execute(select(func.count()).select_from(query.subquery()))
-    total = total_result.scalar() or 0
+    keyword = q.strip()
+    match = build_match_query(keyword) if await fts_ready(db) else None
+    if match:
+        # FTS5全文索引，按相关度排序
+        hits = SearchHits(keyword, match)
+        query, order = hits.page_query(), hits.order
+    else:
+        # 没有FTS5或者关键词太短，老办法LIKE，按发布时间倒序
+        like = f"%{keyword}%"
+        query = list_row_query().where(
+            Article.status == "published",
+            (Article.title.ilike(like)) | (Article.content.ilike(like)),
+        )
+        order = LATEST_ORDER
 
     # 分页
-    total_pages = (total + page_size - 1) // page_size
     offset = (page - 1) * page_size
-    query = query.offset(offset).limit(page_size)
+    articles, next_cursor = await fetch_article_page(db, query, order, page_size, cursor=cursor, offset=offset)
+    items = [article.to_list_dict() for article in articles]
+    if match:
+        highlights = await hits.highlights(db, [(a.id, a.title) for a in articles])
+        for item in items:
+            item["title_highlight"], item["snippet"] = highlights.get(item["id"], (item["title"], None))
 
-    result = await db.execute(query)
-    articles = result.scalars().all()
+    # 获取总数
+    if count == COUNT_HAS_MORE:
+        total = page_lower_bound(offset, articles, next_cursor is not None)
+    else:
+        total = await count_rows(db, query)
+    total_pages = (total + page_size - 1) // page_size
 
     return ApiResponse(
         code=0,
         message="success",
         data={
-            "items": [article.to_list_dict() for article in articles],
+            "items": items,
             "total": total,
             "page": page,
             "page_size": page_size,
             "total_pages": total_pages,
+            "next_cursor": next_cursor,
+            "has_more": next_cursor is not None,
+            "count_strategy": count,
+            "engine": "fts5" if match else "like",
             "keyword": q,
         },
     )
@@ -598,84 +908,90 @@ async def search_articles(
 @app.get("/api/categories/{slug}/hot", response_model=ApiResponse)
 async def get_category_hot_articles(
     slug: str,
+    request: Request,
     limit: int = 5,
-    db: AsyncSession = Depends(get_db),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db),
 ):
     """
     获取分类热门文章
 
     - **slug**: 分类slug
     - **limit**: 返回数量，默认5条
+    - **cursor**: 上一页返回的next_cursor（浏览量一直在变，翻页时可能有少量重复或遗漏）
     """
+    return await cached(
+        request,
+        "category_hot",
+        {"slug": slug, "limit": limit, "cursor": cursor},
+        [category_tag(slug)],
+        db,
+        lambda session: _category_hot_articles(session, slug, limit, cursor),
+    )
+
+
+async def _category_hot_articles(db: AsyncSession, slug: str, limit: int, cursor: Optional[str]) -> dict:
+    """分类热门（缓存没命中时查库）"""
     # 查找分类
-    category_result = await db.execute(select(Category).where(Category.slug == slug))
+    category_result = await db.execute(
+        select(Category).options(*category_ref_options()).where(Category.slug == slug)
+    )
     category = category_result.scalar_one_or_none()
     if not category:
         raise HTTPException(status_code=404, detail="分类不存在")
 
     # 获取该分类的热门文章（按浏览量排序）
-    query = (
-        select(Article)
-        .where(
-            Article.status == "published",
-            Article.category_id == category.id,
-        )
-        .order_by(desc(Article.views), desc(Article.published_at))
-        .limit(limit)
+    query = list_row_query().where(
+        Article.status == "published",
+        Article.category_id == category.id,
     )
+    articles, next_cursor = await fetch_article_page(db, query, HOT_ORDER, limit, cursor=cursor)
 
-    result = await db.execute(query)
-    articles = result.scalars().all()
-
-    return ApiResponse(
-        code=0,
-        message="success",
-        data={
-            "category": {"id": category.id, "name": category.name, "slug": category.slug},
-            "items": [a.to_list_dict() for a in articles],
-        },
-    )
+    return envelope({
+        "category": {"id": category.id, "name": category.name, "slug": category.slug},
+        "items": list_items(articles),
+        "next_cursor": next_cursor,
+    })
 
 
 # ========== 统计API ==========
 @app.get("/api/stats", response_model=ApiResponse)
-async def get_stats(db: AsyncSession = Depends(get_db)):
-    """获取网站统计数据"""
-    # 文章总数
-    article_count = await db.execute(select(func.count(Article.id)).where(Article.status == "published"))
-    article_count = article_count.scalar() or 0
-
-    # 分类数
-    category_count = await db.execute(select(func.count(Category.id)))
-    category_count = category_count.scalar() or 0
-
-    # 标签数
-    tag_count = await db.execute(select(func.count(Tag.id)))
-    tag_count = tag_count.scalar() or 0
-
-    # 总浏览量
-    total_views = await db.execute(select(func.sum(Article.views)))
-    total_views = total_views.scalar() or 0
-
-    # 最新文章
-    latest_result = await db.execute(
-        select(Article)
-        .where(Article.status == "published")
-        .order_by(desc(Article.published_at))
-        .limit(5)
-    )
-    latest_articles = latest_result.scalars().all()
+async def get_stats(db: AsyncSession = Depends(get_read_db)):
+    """
+    获取网站统计数据
+    读内存快照，过期或文章有写入才重算；snapshot_age是快照的年龄（秒）
+    不走响应缓存：快照本身就是这个接口的缓存，还要实时加上没写回的浏览量；快照过期时并发的请求合并成一次重算
+    """
+    data = await single_flight.do("stats", "stats", lambda: stats_snapshot.get(db))
+    policy = cache_control("stats")
+    return FastJSONResponse(content=envelope(data), headers={"Cache-Control": policy} if policy else None)
 
-    return ApiResponse(
-        code=0,
-        message="success",
-        data={
-            "article_count": article_count,
-            "category_count": category_count,
-            "tag_count": tag_count,
-            "total_views": total_views,
-            "latest_articles": [a.to_list_dict() for a in latest_articles],
-        },
+
+# ========== 导出API ==========
+@app.get("/api/export/articles.ndjson")
+async def export_articles(
+    status: Optional[str] = None,
+    category: Optional[str] = None,
+    updated_since: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_read_db),
+):
+    """
+    全量导出文章（NDJSON，一行一篇，字段同文章详情），按id顺序流式返回
+
+    - status: 只导出这个状态的，不填导出全部
+    - category: 分类slug
+    - updated_since: 只导出这个时间之后更新过的（增量同步用）
+    """
+    category_id = None
+    if category:
+        category_id = (await db.execute(select(Category.id).where(Category.slug == category))).scalar()
+        if category_id is None:
+            raise HTTPException(status_code=404, detail="分类不存在")
+    query = export_query(status, category_id, updated_since)
+    return StreamingResponse(
+        ndjson_stream(db.bind, query, settings.EXPORT_BATCH_SIZE),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="articles.ndjson"'},
     )
 
 
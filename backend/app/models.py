@@ -2,7 +2,7 @@
 数据库模型定义
 文章、分类、标签、媒体...都写在这
 """
-from sqlalchemy import String, Integer, Text, Boolean, DateTime, ForeignKey, Table, Column
+from sqlalchemy import BigInteger, LargeBinary, String, Integer, Text, Boolean, DateTime, Float, ForeignKey, Table, Column, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from datetime import datetime
 from .database import Base
@@ -27,9 +27,10 @@ class Category(Base):
     description: Mapped[str | None] = mapped_column(Text, nullable=True)
     icon: Mapped[str | None] = mapped_column(String(100), nullable=True)  # 图标（可选）
 
-    # 关联文章
+    # 关联文章 - 千万别再selectin了！一个分类下几万篇文章连content一起全读出来
+    # 只有删除分类置空外键时才会用到，读接口按需自己查
     articles: Mapped[list["Article"]] = relationship(
-        "Article", back_populates="category", lazy="selectin"
+        "Article", back_populates="category", lazy="select"
     )
 
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
@@ -52,7 +53,8 @@ class Media(Base):
     __tablename__ = "media"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    article_id: Mapped[int] = mapped_column(Integer, ForeignKey("articles.id", ondelete="CASCADE"), nullable=False)
+    # 按文章批量取媒体（详情selectin、导出）要走索引
+    article_id: Mapped[int] = mapped_column(Integer, ForeignKey("articles.id", ondelete="CASCADE"), nullable=False, index=True)
     type: Mapped[str] = mapped_column(String(10), nullable=False)  # 'image' 或 'video'
     url: Mapped[str] = mapped_column(String(500), nullable=False)  # 媒体URL
     thumbnail_url: Mapped[str | None] = mapped_column(String(500), nullable=True)  # 视频缩略图
@@ -104,6 +106,12 @@ class Article(Base):
         "Media", back_populates="article", cascade="all, delete-orphan", lazy="selectin"
     )
 
+    __table_args__ = (
+        # 游标分页用的复合索引，和列表/热门的排序一一对应
+        Index("ix_articles_status_published", "status", "published_at", "created_at", "id"),
+        Index("ix_articles_category_hot", "category_id", "status", "views", "published_at", "id"),
+    )
+
     def to_dict(self) -> dict:
         """转成字典，API返回用"""
         return {
@@ -148,3 +156,97 @@ class Article(Base):
             "published_at": self.published_at.isoformat() if self.published_at else None,
             "created_at": self.created_at.isoformat() if self.created_at else None,
         }
+
+
+class ArticleCounter(Base):
+    """
+    文章数计数表，按(状态, 分类, 标签)维度存好，列表页总数直接查这里不用COUNT(*)
+    category_id/tag_id为0表示不限
+    """
+    __tablename__ = "article_counters"
+
+    status: Mapped[str] = mapped_column(String(20), primary_key=True)
+    category_id: Mapped[int] = mapped_column(Integer, primary_key=True, default=0)
+    tag_id: Mapped[int] = mapped_column(Integer, primary_key=True, default=0)
+    count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+
+
+class SlugCounter(Base):
+    """每个基础slug已经用到的最大编号（base本身算0），分配slug时一条UPDATE拿号"""
+    __tablename__ = "slug_counters"
+
+    base: Mapped[str] = mapped_column(String(255), primary_key=True)
+    last: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
+class ArticleFingerprint(Base):
+    """
+    文章MinHash签名（64个32位最小哈希，二进制存），判重时拿来估算Jaccard相似度（见dedup.py）
+    duplicate_of：这篇是哪篇的重复（link策略入库的），原文自己为空
+    """
+    __tablename__ = "article_fingerprints"
+
+    article_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    signature: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+    duplicate_of: Mapped[int | None] = mapped_column(Integer, nullable=True, index=True)
+
+
+class ArticleFingerprintBand(Base):
+    """
+    MinHash的LSH分段：签名切成16段，每段哈希成一个键，一篇文章16行
+    两篇文章只要有一段键相同就是候选，按主键(key, article_id)前缀查
+    """
+    __tablename__ = "article_fingerprint_bands"
+
+    key: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    article_id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+
+
+class ArticleSimilarity(Base):
+    """
+    相关文章表：每篇文章预先算好的前N个邻居，详情页的相关推荐直接按主键查
+    kind：similar（综合最像）/ tag（有共同标签）/ category（同分类）
+    """
+    __tablename__ = "article_similarities"
+
+    article_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    kind: Mapped[str] = mapped_column(String(10), primary_key=True)
+    rank: Mapped[int] = mapped_column(Integer, primary_key=True)
+    neighbor_id: Mapped[int] = mapped_column(Integer, nullable=False, index=True)
+    score: Mapped[float] = mapped_column(Float, nullable=False)
+
+
+class RelatedRefreshQueue(Base):
+    """等着重算相关文章的文章ID，文章改了在同一个事务里入队，后台任务批量处理"""
+    __tablename__ = "related_refresh_queue"
+
+    article_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    queued_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+class CacheVersion(Base):
+    """
+    列表类响应的版本号，按响应缓存的标签记（lists、categories、category:{slug}、tag:{slug}）
+    文章增删改、新建分类时在同一个事务里加一，条件GET的ETag / Last-Modified由它算
+    """
+    __tablename__ = "cache_versions"
+
+    tag: Mapped[str] = mapped_column(String(255), primary_key=True)
+    version: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+class ImportCheckpoint(Base):
+    """
+    JSONL导入的断点，一个源文件一行：读到的字节偏移、行号和累计结果
+    和那一批文章在同一个事务里写，提交了断点才往前走，中途挂了重跑不会重复导
+    """
+    __tablename__ = "import_checkpoints"
+
+    source: Mapped[str] = mapped_column(String(1024), primary_key=True)
+    offset: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    line: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    created: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    duplicate: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    error: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,138 @@
+"""
+游标分页（keyset pagination）
+OFFSET翻到第5000页要先数过去10万行，游标直接从上一页最后一行往后接着取，
+第1页和第5000页一样快！游标对客户端是不透明的，别让前端自己拼。
+"""
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Sequence, Tuple
+
+from sqlalchemy import Select, and_, desc, false, or_, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+class InvalidCursorError(ValueError):
+    """游标解析失败（被篡改、过期格式或者排序方式对不上）"""
+
+
+class KeysetOrder:
+    """
+    一组倒序排序列，最后一列必须唯一（一般是id），保证游标位置不重复。
+
+    SQLite里NULL最小，倒序时排在最后。只有第一列允许为NULL：
+    带游标的查询先用行值比较 (a, b, id) < (?, ?, ?) 走索引定位，
+    非NULL的行取完了再去取第一列为NULL的尾巴，两段都能走索引。
+    """
+
+    def __init__(self, name: str, *columns, nullable: Sequence[int] = ()):
+        self.name = name
+        self.columns = columns
+        self.nullable = set(nullable)
+
+    def order_by(self) -> list:
+        return [desc(c) for c in self.columns]
+
+    def values_of(self, row: Any) -> list:
+        """从一行结果（ORM对象或者命名行）里取出游标值"""
+        return [getattr(row, c.key) for c in self.columns]
+
+    def _after(self, values: Sequence, start: int = 0) -> Any:
+        """“排在values后面”的条件，values对应第start列起的排序列，NULL按最小值处理"""
+        columns = self.columns[start:]
+        if not any(v is None for v in values) and not any(i > start for i in self.nullable):
+            # 全是非NULL值，直接行值比较，SQLite能拿它做索引范围扫描
+            return tuple_(*columns) < tuple(values)
+
+        col, value = columns[0], values[0]
+        if value is None:
+            lower = false()
+            equal = col.is_(None)
+        else:
+            # 第一列的NULL尾巴由fetch_page单独取，这里只管后面的列
+            lower = or_(col < value, col.is_(None)) if start and start in self.nullable else col < value
+            equal = col == value
+        if len(columns) == 1:
+            return lower
+        return or_(lower, and_(equal, self._after(values[1:], start + 1)))
+
+    def encode(self, row: Any) -> str:
+        return encode_cursor(self.name, self.values_of(row))
+
+    def decode(self, cursor: str) -> list:
+        return decode_cursor(cursor, self.name, len(self.columns))
+
+
+def _dump_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    return value
+
+
+def _load_value(value: Any) -> Any:
+    if isinstance(value, dict) and "dt" in value:
+        return datetime.fromisoformat(value["dt"])
+    return value
+
+
+def encode_cursor(sort_name: str, values: Sequence[Any]) -> str:
+    """把排序键编码成URL安全的不透明字符串"""
+    payload = json.dumps({"s": sort_name, "v": [_dump_value(v) for v in values]}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_name: str, size: int) -> list:
+    """解码游标，排序方式或长度对不上直接报错"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        values = [_load_value(v) for v in payload["v"]]
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise InvalidCursorError("无效的分页游标")
+    if payload.get("s") != sort_name or len(values) != size:
+        raise InvalidCursorError("分页游标与排序方式不匹配")
+    return values
+
+
+async def fetch_page(
+    db: AsyncSession,
+    query: Select,
+    order: KeysetOrder,
+    limit: int,
+    cursor: Optional[str] = None,
+    offset: int = 0,
+) -> Tuple[List[Any], Optional[str]]:
+    """
+    按order取一页数据，返回 (rows, next_cursor)
+    给了cursor就走keyset，忽略offset；没给就是老的OFFSET分页，
+    但同样会返回next_cursor，前端从第1页开始就能切到游标模式。
+    多取一行用来判断还有没有下一页。
+    """
+    descriptions = query.column_descriptions
+    is_entity = len(descriptions) == 1 and descriptions[0]["expr"] is descriptions[0]["entity"]
+
+    def scalars(result):
+        # select(Article)取的是ORM对象，select(列...)取的是行
+        return result.scalars().all() if is_entity else result.all()
+
+    if cursor is None:
+        page_query = query.order_by(*order.order_by()).offset(offset).limit(limit + 1)
+        rows = list(scalars(await db.execute(page_query)))
+    else:
+        values = order.decode(cursor)
+        lead = order.columns[0]
+        if values[0] is None:
+            # 游标已经在第一列为NULL的尾巴里了
+            page_query = query.where(lead.is_(None), order._after(values[1:], start=1))
+            rows = list(scalars(await db.execute(page_query.order_by(*order.order_by()).limit(limit + 1))))
+        else:
+            page_query = query.where(order._after(values))
+            rows = list(scalars(await db.execute(page_query.order_by(*order.order_by()).limit(limit + 1))))
+            if 0 in order.nullable and len(rows) <= limit:
+                # 非NULL的取完了，接着取NULL尾巴
+                tail_query = query.where(lead.is_(None)).order_by(*order.order_by()).limit(limit + 1 - len(rows))
+                rows.extend(scalars(await db.execute(tail_query)))
+
+    next_cursor = order.encode(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
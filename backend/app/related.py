@@ -0,0 +1,365 @@
+"""
+相关文章 - 预先算好每篇文章最像的前N篇，详情页直接按主键查表
+以前每次打开详情页都现查两遍：同标签的按时间倒序、同分类的按浏览量，既不相关也不便宜。
+
+打分 = 0.6 × 标签重合度 + 0.4 × 标题/摘要的TF-IDF余弦相似度
+- 标签重合度：标签按IDF加权（冷门标签比“AI”这种人人都有的标签更说明问题）后的余弦
+- TF-IDF：用搜索同一个分词器切标题和摘要，去掉只出现一次的词和一半以上文章都有的词
+整个语料建成两个scipy稀疏矩阵，按批（默认64篇一批）乘出和全部文章的得分，
+numpy一次挑出每篇的前N名，分三份存进article_similarities：
+similar（综合最像）、tag（有共同标签里最像的）、category（同分类里最像的）。
+
+增量：文章的标题、摘要、标签、分类、状态变了，在同一个事务里进related_refresh_queue，
+后台任务定时处理：重算这些文章自己的邻居，再把列表里有它们的、以及和它们最像的那批文章也重算一遍。
+增量是近似的，想要全量精确结果：python -m app.related rebuild
+
+全量、增量都一样：先读队列和语料、结束读事务，再在事务外算；结果按WRITE_CHUNK篇一块，
+每块一个短写入单元交给写入协调器（没启动时直接在传进来的Session上提交），
+老库第一次启动、大批导入之后全量重算几十秒，也不会占着唯一的写连接和写锁让接口的写入超时。
+重算期间详情页看到的是新旧混着的邻居，写完就齐了。
+"""
+import asyncio
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from scipy import sparse
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .hooks import ArticleChange, on_flush
+from .models import Article, ArticleSimilarity, RelatedRefreshQueue, article_tag_table
+from .tokenizer import tokenizer
+from .writer import write_coordinator
+
+TOP_N = 6
+KIND_SIMILAR = "similar"
+KIND_TAG = "tag"
+KIND_CATEGORY = "category"
+KINDS = (KIND_SIMILAR, KIND_TAG, KIND_CATEGORY)
+
+TAG_WEIGHT = 0.6
+TEXT_WEIGHT = 0.4
+# 超过这个比例的文章都有的词不参与打分（语料太小时不卡）
+MAX_DF = 0.5
+MAX_DF_MIN_DOCS = 50
+BATCH_SIZE = 64
+# 待重算的超过全部文章这个比例，干脆全量重算
+FULL_REBUILD_RATIO = 0.2
+# 增量时，改动文章的前多少名邻居也跟着重算（它可能挤进这些文章的列表）
+REVERSE_FANOUT = TOP_N * 4
+WRITE_CHUNK = 500
+
+# {文章ID: {kind: [(邻居ID, 得分)]}}
+Neighbours = Dict[int, Dict[str, List[Tuple[int, float]]]]
+
+
+class Doc(NamedTuple):
+    """参与相似度计算的一篇已发布文章"""
+    id: int
+    category_id: Optional[int]
+    text: str
+    tag_ids: Tuple[int, ...]
+
+
+def _normalize_rows(matrix: sparse.csr_matrix) -> sparse.csr_matrix:
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    inverse = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+    return sparse.diags(inverse.astype(np.float32)) @ matrix
+
+
+def _weighted_matrix(features: Sequence[Iterable], max_df: Optional[float]) -> sparse.csr_matrix:
+    """
+    每篇文章的特征（词或标签ID）-> 按IDF加权、行归一化的稀疏矩阵
+    只出现在一篇文章里的特征对相似度没贡献，直接丢掉
+    """
+    n = len(features)
+    vocabulary: Dict = {}
+    rows: List[int] = []
+    cols: List[int] = []
+    for i, items in enumerate(features):
+        for item in items:
+            rows.append(i)
+            cols.append(vocabulary.setdefault(item, len(vocabulary)))
+    counts = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.float32), (rows, cols)), shape=(n, len(vocabulary))
+    )
+    counts.sum_duplicates()
+    df = np.bincount(counts.indices, minlength=len(vocabulary))
+    keep = df > 1
+    if max_df is not None and n >= MAX_DF_MIN_DOCS:
+        keep &= df <= max_df * n
+    idf = (np.log((1 + n) / (1 + df)) + 1).astype(np.float32)
+    weighted = counts[:, np.flatnonzero(keep)] @ sparse.diags(idf[keep])
+    return _normalize_rows(sparse.csr_matrix(weighted))
+
+
+def _top(scores: np.ndarray, ids: np.ndarray, k: int) -> List[List[Tuple[int, float]]]:
+    """每行得分最高的k个（只要大于0的），同分新文章（ID大）在前"""
+    k = min(k, scores.shape[1])
+    if k == 0:
+        return [[] for _ in range(scores.shape[0])]
+    part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    values = np.take_along_axis(scores, part, axis=1)
+    result = []
+    for row_idx, row_vals in zip(part, values):
+        picked = [(int(ids[j]), float(v)) for j, v in zip(row_idx, row_vals) if v > 1e-6]
+        picked.sort(key=lambda item: (-item[1], -item[0]))
+        result.append(picked)
+    return result
+
+
+class SimilarityModel:
+    """整个已发布语料的标签矩阵和TF-IDF矩阵"""
+
+    def __init__(self, docs: Sequence[Doc]):
+        self.ids = np.array([d.id for d in docs], dtype=np.int64)
+        self.positions = {d.id: i for i, d in enumerate(docs)}
+        self.categories = np.array([d.category_id if d.category_id is not None else -1 for d in docs])
+        self.tags = _weighted_matrix([d.tag_ids for d in docs], max_df=None)
+        self.text = _weighted_matrix([tokenizer.tokenize(d.text) for d in docs], max_df=MAX_DF)
+        self.tags_t = self.tags.T.tocsr()
+        self.text_t = self.text.T.tocsr()
+
+    def neighbours(self, positions: Sequence[int], top_n: int = TOP_N, batch_size: int = BATCH_SIZE) -> Neighbours:
+        """按批算这些文章和全部文章的得分，挑出每种前top_n"""
+        result: Neighbours = {}
+        for start in range(0, len(positions), batch_size):
+            batch = np.asarray(positions[start:start + batch_size], dtype=np.int64)
+            tag_scores = (self.tags[batch] @ self.tags_t).toarray()
+            scores = TAG_WEIGHT * tag_scores + TEXT_WEIGHT * (self.text[batch] @ self.text_t).toarray()
+            scores[np.arange(len(batch)), batch] = 0  # 自己不算
+            own_category = self.categories[batch][:, None]
+            same_category = (own_category == self.categories[None, :]) & (own_category >= 0)
+            by_kind = {
+                KIND_SIMILAR: _top(scores, self.ids, top_n),
+                KIND_TAG: _top(np.where(tag_scores > 0, scores, 0), self.ids, top_n),
+                KIND_CATEGORY: _top(np.where(same_category, scores, 0), self.ids, top_n),
+            }
+            for i, position in enumerate(batch):
+                result[int(self.ids[position])] = {kind: lists[i] for kind, lists in by_kind.items()}
+        return result
+
+
+async def load_corpus(db: AsyncSession) -> List[Doc]:
+    """读全部已发布文章的标题、摘要、分类和标签"""
+    result = await db.execute(
+        select(Article.id, Article.category_id, Article.title, Article.summary)
+        .where(Article.status == "published").order_by(Article.id)
+    )
+    articles = result.all()
+    tag_result = await db.execute(
+        select(article_tag_table.c.article_id, article_tag_table.c.tag_id)
+        .join(Article, Article.id == article_tag_table.c.article_id)
+        .where(Article.status == "published")
+    )
+    tags: Dict[int, List[int]] = {}
+    for article_id, tag_id in tag_result:
+        tags.setdefault(article_id, []).append(tag_id)
+    return [
+        Doc(a.id, a.category_id, f"{a.title} {a.summary or ''}", tuple(tags.get(a.id, ())))
+        for a in articles
+    ]
+
+
+async def _replace_rows(db: AsyncSession, article_ids: Iterable[int], neighbours: Neighbours) -> None:
+    """删掉这些文章的旧邻居，写入新算的"""
+    article_ids = list(article_ids)
+    for start in range(0, len(article_ids), WRITE_CHUNK):
+        chunk = article_ids[start:start + WRITE_CHUNK]
+        await db.execute(delete(ArticleSimilarity).where(ArticleSimilarity.article_id.in_(chunk)))
+    rows = [
+        {"article_id": article_id, "kind": kind, "rank": rank, "neighbor_id": neighbor_id, "score": score}
+        for article_id, lists in neighbours.items()
+        for kind, items in lists.items()
+        for rank, (neighbor_id, score) in enumerate(items)
+    ]
+    for start in range(0, len(rows), WRITE_CHUNK * 10):
+        await db.execute(ArticleSimilarity.__table__.insert(), rows[start:start + WRITE_CHUNK * 10])
+
+
+async def _write_neighbours(db: AsyncSession, article_ids: Iterable[int], neighbours: Neighbours) -> None:
+    """按WRITE_CHUNK篇一块替换邻居，一块一个写入单元，块与块之间把写连接让给别人"""
+    article_ids = sorted(article_ids)
+    for start in range(0, len(article_ids), WRITE_CHUNK):
+        chunk = article_ids[start:start + WRITE_CHUNK]
+        part = {i: neighbours[i] for i in chunk if i in neighbours}
+        await write_coordinator.run(db, lambda session, chunk=chunk, part=part: _replace_rows(session, chunk, part))
+
+
+async def _finish(session: AsyncSession, queued: Set[int], prune: bool) -> None:
+    """写入单元：出队；全量时顺带删掉已经不是已发布文章的旧邻居"""
+    if prune:
+        published = select(Article.id).where(Article.status == "published")
+        await session.execute(delete(ArticleSimilarity).where(ArticleSimilarity.article_id.not_in(published)))
+    queued = list(queued)
+    for start in range(0, len(queued), WRITE_CHUNK):
+        chunk = queued[start:start + WRITE_CHUNK]
+        await session.execute(delete(RelatedRefreshQueue).where(RelatedRefreshQueue.article_id.in_(chunk)))
+
+
+async def _snapshot(db: AsyncSession) -> Tuple[Set[int], List[Doc]]:
+    """读队列和语料，读完就结束读事务（把连接还回池子），后面要算好一会儿"""
+    queued = set((await db.execute(select(RelatedRefreshQueue.article_id))).scalars().all())
+    docs = await load_corpus(db) if queued else []
+    await db.commit()
+    return queued, docs
+
+
+async def rebuild_related(db: AsyncSession, batch_size: int = BATCH_SIZE) -> int:
+    """全量重算所有已发布文章的相关文章，返回文章数"""
+    queued = set((await db.execute(select(RelatedRefreshQueue.article_id))).scalars().all())
+    docs = await load_corpus(db)
+    await db.commit()
+    return await _rebuild(db, queued, docs, batch_size)
+
+
+async def _rebuild(db: AsyncSession, queued: Set[int], docs: List[Doc], batch_size: int) -> int:
+    """
+    全量重算：在事务外分段算，每段的结果分块写；最后删掉不再发布的文章的邻居、出队
+    读语料之后才入队的文章留在队列里，下一轮增量再算
+    """
+    model = await asyncio.to_thread(SimilarityModel, docs)
+    positions = list(range(len(docs)))
+    # 分段算、分段写，别把10万篇的结果全攒在内存里
+    step = batch_size * 16
+    for start in range(0, len(positions), step):
+        neighbours = await asyncio.to_thread(model.neighbours, positions[start:start + step], TOP_N, batch_size)
+        await _write_neighbours(db, neighbours, neighbours)
+    await write_coordinator.run(db, lambda session: _finish(session, queued, prune=True))
+    return len(docs)
+
+
+async def refresh_related(db: AsyncSession, batch_size: int = BATCH_SIZE) -> int:
+    """处理重算队列，返回重算了多少篇文章的邻居"""
+    queued, docs = await _snapshot(db)
+    if not queued:
+        return 0
+    if len(queued) > len(docs) * FULL_REBUILD_RATIO:
+        return await _rebuild(db, queued, docs, batch_size)
+
+    model = await asyncio.to_thread(SimilarityModel, docs)
+    dirty = [model.positions[i] for i in sorted(queued) if i in model.positions]
+    wide = await asyncio.to_thread(model.neighbours, dirty, REVERSE_FANOUT, batch_size)
+
+    # 列表里有改动文章的，以及和改动文章最像的那批，都要重算
+    affected: Set[int] = set()
+    queued_ids = sorted(queued)
+    for start in range(0, len(queued_ids), WRITE_CHUNK):
+        listing = await db.execute(
+            select(ArticleSimilarity.article_id)
+            .where(ArticleSimilarity.neighbor_id.in_(queued_ids[start:start + WRITE_CHUNK])).distinct()
+        )
+        affected.update(listing.scalars().all())
+    await db.commit()
+    for lists in wide.values():
+        for items in lists.values():
+            affected.update(neighbor_id for neighbor_id, _ in items)
+    affected -= queued
+    affected_positions = sorted(model.positions[i] for i in affected if i in model.positions)
+    neighbours = {
+        article_id: {kind: items[:TOP_N] for kind, items in lists.items()} for article_id, lists in wide.items()
+    }
+    neighbours.update(await asyncio.to_thread(model.neighbours, affected_positions, TOP_N, batch_size))
+
+    # 删了的、不再发布的文章也在queued里，旧邻居一并删掉
+    await _write_neighbours(db, queued | affected, neighbours)
+    await write_coordinator.run(db, lambda session: _finish(session, queued, prune=False))
+    return len(neighbours)
+
+
+async def seed_related_queue(db: AsyncSession) -> int:
+    """相关文章表是空的（老库刚升级），把所有已发布文章排进队列，交给后台任务全量算"""
+    if (await db.execute(select(ArticleSimilarity.article_id).limit(1))).first():
+        return 0
+    ids = (await db.execute(select(Article.id).where(Article.status == "published"))).scalars().all()
+    if ids:
+        await db.execute(
+            sqlite_insert(RelatedRefreshQueue).on_conflict_do_nothing(), [{"article_id": i} for i in ids]
+        )
+        await db.commit()
+    return len(ids)
+
+
+@on_flush
+def _queue_related_refresh(session: Session, changes: List[ArticleChange]) -> None:
+    """影响相似度的字段变了就入队，和文章写入在同一个事务里"""
+    ids = [
+        c.article_id for c in changes
+        if c.touches("title", "summary", "tags", "status", "category_id", "category")
+    ]
+    if ids:
+        session.connection().execute(
+            sqlite_insert(RelatedRefreshQueue).on_conflict_do_nothing(), [{"article_id": i} for i in ids]
+        )
+
+
+class RelatedRefresher:
+    """后台定时处理重算队列"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._session_factory: Optional[async_sessionmaker[AsyncSession]] = None
+        self._task: Optional[asyncio.Task] = None
+        self.refreshed_total = 0
+        self.last_error: Optional[str] = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                async with self._session_factory() as db:
+                    self.refreshed_total += await refresh_related(db)
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"相关文章重算失败，下次重试：{e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self, session_factory: async_sessionmaker[AsyncSession]) -> None:
+        """启动后台任务，lifespan里调用；session_factory只用来读（可以是只读引擎），写入都经write_coordinator"""
+        self._session_factory = session_factory
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "running": self._task is not None,
+            "interval": self.interval,
+            "refreshed_articles": self.refreshed_total,
+            "last_error": self.last_error,
+        }
+
+
+# 全局实例
+related_refresher = RelatedRefresher(settings.RELATED_REFRESH_INTERVAL)
+
+
+async def _main(argv: List[str]) -> None:
+    from .database import AsyncSessionLocal, init_db
+
+    if argv[:1] not in (["rebuild"], ["refresh"]):
+        print("用法: python -m app.related rebuild|refresh")
+        return
+    await init_db()
+    async with AsyncSessionLocal() as db:
+        if argv[0] == "rebuild":
+            print(f"article_similarities rebuilt: {await rebuild_related(db)} articles")
+        else:
+            print(f"article_similarities refreshed: {await refresh_related(db)} articles")
+
+
+if __name__ == "__main__":
+    import sys
+
+    asyncio.run(_main(sys.argv[1:]))
@@ -0,0 +1,526 @@
+"""
+公共GET接口的响应缓存
+文章列表、详情、分类、标签、热门这几个接口占了绝大部分流量，而数据只在n8n推文章时才变。
+现在按 路由 + 规范化后的参数（FastAPI解析完、带上默认值、排好序）缓存整个响应体：
+- 后端：memory（进程内LRU，条数 + TTL封顶）或 redis（任何说Redis协议的服务，多worker共享；
+  自带一个极简RESP客户端，不用装redis包）；off关闭
+- 每条缓存打标签，写入时按标签精确清掉：
+  article:{id} 文章详情；category:{slug} / tag:{slug} 按分类/标签筛的列表、分类热门；
+  lists 不筛分类标签的列表、标签、热门标签；categories 分类列表
+  （/api/stats不走这里，它有自己的统计快照，还要实时加上没写回的浏览量）
+- 文章增删改在flush钩子里算出要清的标签，提交后才清（回滚了就不清）；新建分类清categories；
+  浏览量写回后清对应文章的详情（详情里的views = 缓存的库里值 + 还没写回的增量）
+- 算响应的过程中有写入提交（进程内的），算出来的结果不存，免得把旧数据又存回去
+- 缓存后端出错（Redis挂了）就当没命中，直接查库
+- stale-while-revalidate：STALE_WHILE_REVALIDATE_ROUTES里的路由，过了TTL的缓存在 RESPONSE_CACHE_STALE 秒内
+  照样直接返回，同时后台任务（自己开只读Session）重算一份换上；超过这个期限就不再返回，老老实实查库。
+  被按标签清掉的不算过期，直接没了，写入之后不会读到旧数据
+- 这些路由的响应带 Cache-Control: public, max-age, stale-while-revalidate，nginx按同样的策略缓存；
+  代理收不到清缓存的通知，所以max-age（RESPONSE_CACHE_MAX_AGE）比进程内的TTL短得多
+
+Core直接写库的（导入脚本）绕过了钩子，memory后端重启就没了；redis后端等TTL或者手动清。
+"""
+import asyncio
+import math
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import unquote, urlencode, urlparse
+
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.util import identity_key
+
+from .config import settings
+from .fastjson import dumps, loads
+from .hooks import ArticleChange, on_flush, outermost
+from .models import Category, Tag
+from .view_counter import view_counter
+
+BACKEND_MEMORY = "memory"
+BACKEND_REDIS = "redis"
+BACKEND_OFF = "off"
+
+TAG_LISTS = "lists"
+TAG_CATEGORIES = "categories"
+
+CACHE_HEADER = "X-Cache"
+CACHE_HIT = "HIT"
+CACHE_MISS = "MISS"
+CACHE_STALE = "STALE"
+
+STALE_WHILE_REVALIDATE_ROUTES = frozenset(settings.stale_while_revalidate_routes)
+
+_PURGE_KEY = "response_cache_purge"
+_AFFECTED_KEY = "affected_cache_tags"
+
+
+def article_tag(article_id: int) -> str:
+    return f"article:{article_id}"
+
+
+def category_tag(slug: str) -> str:
+    return f"category:{slug}"
+
+
+def tag_tag(slug: str) -> str:
+    return f"tag:{slug}"
+
+
+def cache_control(route: str) -> Optional[str]:
+    """允许过期后边用边刷新的路由给代理和浏览器的Cache-Control，别的路由不给（代理就不缓存）"""
+    if route not in STALE_WHILE_REVALIDATE_ROUTES:
+        return None
+    return (
+        f"public, max-age={int(settings.RESPONSE_CACHE_MAX_AGE)}, "
+        f"stale-while-revalidate={int(settings.RESPONSE_CACHE_STALE)}"
+    )
+
+
+class MemoryBackend:
+    """
+    进程内LRU：OrderedDict按访问顺序排，超了条数淘汰最久没用的；标签 -> 键 的反查表用来精确清除
+    每条记着存进来的时间和彻底作废的时间，get返回(响应体, 存了多少秒)，新不新鲜由ResponseCache判断
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[dict, float, float, Tuple[str, ...]]]" = OrderedDict()
+        self._tags: Dict[str, Set[str]] = {}
+        self.evictions = 0
+        self.expirations = 0
+
+    def _drop(self, key: str) -> None:
+        tags = self._entries.pop(key)[3]
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    async def get(self, key: str) -> Optional[Tuple[dict, float]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        now = time.monotonic()
+        if entry[2] <= now:
+            self._drop(key)
+            self.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return entry[0], now - entry[1]
+
+    async def set(self, key: str, body: dict, tags: Iterable[str], lifetime: float) -> None:
+        """lifetime是这条最多能留多久（TTL + 允许过期后再用的时间）"""
+        if key in self._entries:
+            self._drop(key)
+        tags = tuple(dict.fromkeys(tags))
+        now = time.monotonic()
+        self._entries[key] = (body, now, now + lifetime, tags)
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+
+    def purge_now(self, tags: Iterable[str]) -> int:
+        purged = 0
+        for tag in tags:
+            for key in list(self._tags.get(tag, ())):
+                self._drop(key)
+                purged += 1
+        return purged
+
+    async def purge(self, tags: Iterable[str]) -> int:
+        return self.purge_now(tags)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._tags.clear()
+        self.evictions = 0
+        self.expirations = 0
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "tags": len(self._tags), "evictions": self.evictions,
+                "expirations": self.expirations}
+
+
+class RespError(Exception):
+    """Redis返回的错误（-ERR ...）"""
+
+
+class RespClient:
+    """极简Redis协议（RESP2）客户端：一条连接，命令排队一个个发，断了下次重连"""
+
+    def __init__(self, url: str, timeout: float = 1.0):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.timeout = timeout
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._lock = asyncio.Lock()
+
+    @staticmethod
+    def _encode(args: Tuple) -> bytes:
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode("utf-8")
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        return b"".join(parts)
+
+    async def _read(self):
+        line = await self._reader.readline()
+        if not line:
+            raise ConnectionError("Redis连接断了")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode()
+        if kind == b"-":
+            raise RespError(rest.decode())
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            size = int(rest)
+            if size < 0:
+                return None
+            return (await self._reader.readexactly(size + 2))[:-2]
+        if kind == b"*":
+            size = int(rest)
+            return None if size < 0 else [await self._read() for _ in range(size)]
+        raise ConnectionError(f"看不懂的Redis回复: {line!r}")
+
+    async def _send(self, *args):
+        self._writer.write(self._encode(args))
+        await self._writer.drain()
+        return await self._read()
+
+    async def execute(self, *args):
+        async with self._lock:
+            try:
+                if self._writer is None:
+                    self._reader, self._writer = await asyncio.wait_for(
+                        asyncio.open_connection(self.host, self.port), self.timeout
+                    )
+                    if self.password:
+                        await self._send("AUTH", self.password)
+                    if self.db:
+                        await self._send("SELECT", self.db)
+                return await asyncio.wait_for(self._send(*args), self.timeout)
+            except (OSError, ConnectionError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+                await self._close()
+                raise
+
+    async def _close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except OSError:
+                pass
+        self._reader = self._writer = None
+
+    async def close(self) -> None:
+        async with self._lock:
+            await self._close()
+
+
+class RedisBackend:
+    """Redis后端：响应体连同存入时间存JSON带EX过期，每个标签一个集合记着挂在它下面的键"""
+
+    def __init__(self, url: str, prefix: str):
+        self.client = RespClient(url)
+        self.prefix = prefix
+        self.evictions = 0  # Redis自己淘汰的看 INFO stats 里的 evicted_keys，这里拿不到
+        self.expirations = 0
+        self._pending: Set[asyncio.Task] = set()
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}r:{key}"
+
+    def _tag(self, tag: str) -> str:
+        return f"{self.prefix}t:{tag}"
+
+    async def get(self, key: str) -> Optional[Tuple[dict, float]]:
+        raw = await self.client.execute("GET", self._key(key))
+        if raw is None:
+            return None
+        entry = loads(raw)
+        return entry["b"], time.time() - entry["t"]  # 多个worker共享，只能用墙上时间
+
+    async def set(self, key: str, body: dict, tags: Iterable[str], lifetime: float) -> None:
+        seconds = max(1, math.ceil(lifetime))
+        value = dumps({"t": time.time(), "b": body})  # 响应体里可能带datetime
+        await self.client.execute("SET", self._key(key), value, "EX", seconds)
+        for tag in dict.fromkeys(tags):
+            await self.client.execute("SADD", self._tag(tag), self._key(key))
+            await self.client.execute("EXPIRE", self._tag(tag), seconds)
+
+    async def purge(self, tags: Iterable[str]) -> int:
+        purged = 0
+        for tag in dict.fromkeys(tags):
+            keys = await self.client.execute("SMEMBERS", self._tag(tag)) or []
+            if keys:
+                purged += await self.client.execute("DEL", *keys)
+            await self.client.execute("DEL", self._tag(tag))
+        return purged
+
+    def purge_now(self, tags: Iterable[str]) -> None:
+        """钩子里是同步的，扔个后台任务去清（别的worker也是通过Redis看到的）"""
+        task = asyncio.get_running_loop().create_task(self.purge(list(tags)))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def drain(self) -> None:
+        """等还没清完的后台任务（测试、关机用）"""
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+
+    def clear(self) -> None:
+        """Redis里的键不动（别的worker还在用），只清计数；要清空就按前缀删"""
+        self.evictions = 0
+        self.expirations = 0
+
+    def stats(self) -> dict:
+        return {"url": f"redis://{self.client.host}:{self.client.port}/{self.client.db}", "prefix": self.prefix}
+
+
+class ResponseCache:
+    """响应缓存门面：命中/未命中计数、算的过程中有写入就不存、后端出错当没命中、过期了后台刷新"""
+
+    def __init__(self, backend, ttl: float, stale: float = 0.0):
+        self.backend = backend
+        self.ttl = ttl
+        self.stale = stale
+        # 每清一次加一，算响应前后不一样就说明中间有写入提交了
+        self._generation = 0
+        # 后台刷新用的Session工厂，start()之前没有（测试、脚本），过期了就同步重算
+        self._session_factory: Optional[async_sessionmaker[AsyncSession]] = None
+        self._refreshing: Dict[str, asyncio.Task] = {}
+        self.reset_stats()
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    @staticmethod
+    def key(route: str, **params) -> str:
+        """路由名 + 排好序的参数，None的不算"""
+        items = sorted((k, v) for k, v in params.items() if v is not None)
+        return f"{route}?{urlencode(items)}" if items else route
+
+    async def get_or_set(
+        self,
+        key: str,
+        tags: Callable[[dict], Iterable[str]],
+        produce: Callable[[Optional[AsyncSession]], Awaitable[dict]],
+        stale_ok: bool = False,
+    ) -> Tuple[dict, str]:
+        """
+        命中直接返回缓存的响应体，否则produce(None)用请求自己的Session算一个存起来；返回(响应体, HIT/MISS/STALE)
+        tags拿响应体算出这条缓存挂哪些标签；produce抛异常（比如404）不缓存
+        stale_ok时过了TTL、还在允许期限内的直接返回（STALE），后台用新开的只读Session调produce(session)刷新
+        """
+        if not self.enabled:
+            return await produce(None), CACHE_MISS
+        try:
+            entry = await self.backend.get(key)
+        except Exception as e:
+            self._error(e)
+            entry = None
+        if entry is not None:
+            body, age = entry
+            if age < self.ttl:
+                self.hits += 1
+                return body, CACHE_HIT
+            if stale_ok and self._session_factory is not None and age < self.ttl + self.stale:
+                self.stale_hits += 1
+                self._refresh(key, tags, produce)
+                return body, CACHE_STALE
+        self.misses += 1
+        return await self._compute(key, tags, produce, None), CACHE_MISS
+
+    async def _compute(self, key: str, tags, produce, session: Optional[AsyncSession]) -> dict:
+        generation = self._generation
+        body = await produce(session)
+        if generation == self._generation:
+            try:
+                await self.backend.set(key, body, tags(body), self.ttl + self.stale)
+            except Exception as e:
+                self._error(e)
+        return body
+
+    def _refresh(self, key: str, tags, produce) -> None:
+        """后台重算一份换上，同一个键同时只刷一次"""
+        if key in self._refreshing:
+            return
+
+        async def run() -> None:
+            try:
+                async with self._session_factory() as session:
+                    await self._compute(key, tags, produce, session)
+                self.refreshes += 1
+            except Exception as e:
+                self.refresh_errors += 1
+                self._error(e)
+            finally:
+                self._refreshing.pop(key, None)
+
+        self._refreshing[key] = asyncio.get_running_loop().create_task(run())
+
+    def _error(self, e: Exception) -> None:
+        self.errors += 1
+        self.last_error = str(e)
+
+    def start(self, session_factory: async_sessionmaker[AsyncSession]) -> None:
+        """lifespan里调用，给后台刷新用的Session工厂（用只读引擎）"""
+        self._session_factory = session_factory
+
+    async def stop(self) -> None:
+        """等正在跑的后台刷新结束，关机时调"""
+        if self._refreshing:
+            await asyncio.gather(*self._refreshing.values(), return_exceptions=True)
+        if isinstance(self.backend, RedisBackend):
+            await self.backend.drain()
+            await self.backend.client.close()
+
+    def invalidate(self, tags: Iterable[str], views_only: bool = False) -> None:
+        """
+        按标签清缓存（同步，提交钩子里调）
+        views_only：只是浏览量写回，只清这几篇的详情，不加代数——每个写回周期都作废全部正在算的结果的话，
+        正常读流量下single-flight、后台刷新算出来的全白算。代价是写回那一刻正好在算的详情可能少算这一批浏览量，
+        这篇再被看、下一次写回时又会清掉
+        """
+        tags = list(tags)
+        if not tags or not self.enabled:
+            return
+        if not views_only:
+            self._generation += 1
+        self.purges += 1
+        self.backend.purge_now(tags)
+
+    def reset_stats(self) -> None:
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self.purges = 0
+        self.errors = 0
+        self.last_error: Optional[str] = None
+
+    def reset(self) -> None:
+        """清空缓存和计数（测试用）"""
+        if self.enabled:
+            self.backend.clear()
+        self.reset_stats()
+
+    def stats(self) -> dict:
+        total = self.hits + self.stale_hits + self.misses
+        stats = {
+            "backend": settings.RESPONSE_CACHE_BACKEND if self.enabled else BACKEND_OFF,
+            "ttl": self.ttl,
+            "stale": self.stale,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "hit_ratio": round((self.hits + self.stale_hits) / total, 4) if total else 0.0,
+            "refreshing": len(self._refreshing),
+            "refreshes": self.refreshes,
+            "refresh_errors": self.refresh_errors,
+            "purges": self.purges,
+            "errors": self.errors,
+            "last_error": self.last_error,
+        }
+        if self.enabled:
+            stats.update(self.backend.stats())
+        return stats
+
+
+def make_backend(kind: str):
+    if kind == BACKEND_MEMORY:
+        return MemoryBackend(settings.RESPONSE_CACHE_MAX_ENTRIES)
+    if kind == BACKEND_REDIS:
+        return RedisBackend(settings.RESPONSE_CACHE_REDIS_URL, settings.RESPONSE_CACHE_PREFIX)
+    if kind == BACKEND_OFF:
+        return None
+    raise ValueError(f"未知的响应缓存后端: {kind}，可选 memory / redis / off")
+
+
+# 全局实例
+response_cache = ResponseCache(
+    make_backend(settings.RESPONSE_CACHE_BACKEND), settings.RESPONSE_CACHE_TTL, settings.RESPONSE_CACHE_STALE
+)
+
+
+def _slugs(session: Session, model, ids: Set[int]) -> List[str]:
+    """id -> slug：先看Session里已经加载的对象，没有的再查一次"""
+    slugs, missing = [], []
+    for pk in ids:
+        obj = session.identity_map.get(identity_key(model, pk))
+        slug = obj.__dict__.get("slug") if obj is not None else None
+        if slug is None:
+            missing.append(pk)
+        else:
+            slugs.append(slug)
+    if missing:
+        slugs.extend(session.connection().execute(select(model.slug).where(model.id.in_(missing))).scalars())
+    return slugs
+
+
+def affected_tags(session: Session, changes: List[ArticleChange]) -> List[str]:
+    """
+    一次flush里的文章变更影响哪些标签：它自己的详情、所有不筛分类标签的列表、改之前和之后的分类、标签下的列表
+    同一次flush的多个钩子都要用，算一次记在session.info里
+    """
+    memo = session.info.get(_AFFECTED_KEY)
+    if memo is not None and memo[0] is changes:
+        return memo[1]
+    tags = [TAG_LISTS]
+    category_ids: Set[int] = set()
+    tag_ids: Set[int] = set()
+    for change in changes:
+        tags.append(article_tag(change.article_id))
+        for snapshot in (change.before, change.after):
+            if snapshot is not None:
+                if snapshot.category_id is not None:
+                    category_ids.add(snapshot.category_id)
+                tag_ids |= snapshot.tag_ids
+    tags.extend(category_tag(slug) for slug in _slugs(session, Category, category_ids))
+    tags.extend(tag_tag(slug) for slug in _slugs(session, Tag, tag_ids))
+    session.info[_AFFECTED_KEY] = (changes, tags)
+    return tags
+
+
+@on_flush
+def _collect_purge_tags(session: Session, changes: List[ArticleChange]) -> None:
+    if response_cache.enabled:
+        session.info.setdefault(_PURGE_KEY, []).extend(affected_tags(session, changes))
+
+
+@event.listens_for(Session, "after_commit")
+def _purge_committed(session: Session) -> None:
+    if not outermost(session):
+        return
+    session.info.pop(_AFFECTED_KEY, None)
+    tags = session.info.pop(_PURGE_KEY, None)
+    if tags:
+        response_cache.invalidate(dict.fromkeys(tags))
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_purge(session: Session) -> None:
+    if not outermost(session):
+        return
+    session.info.pop(_AFFECTED_KEY, None)
+    session.info.pop(_PURGE_KEY, None)
+
+
+@view_counter.add_listener
+def _purge_viewed(batch: Dict[int, int]) -> None:
+    """浏览量写回了，详情缓存里的views就旧了"""
+    response_cache.invalidate((article_tag(article_id) for article_id in batch), views_only=True)
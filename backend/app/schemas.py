@@ -84,6 +84,9 @@ class ArticleCreateSchema(BaseModel):
     author_avatar: Optional[str] = Field(None, description="作者头像URL")
     is_original: bool = Field(True, description="是否原创")
     status: str = Field("published", description="状态: draft 或 published")
+    original_url: Optional[str] = Field(
+        None, max_length=2000, description="资讯原文链接，同一链接重复推送只建一篇（当作幂等键）"
+    )
 
     # 媒体项（图片/视频）
     media_items: List[dict] = Field(
@@ -94,6 +97,15 @@ class ArticleCreateSchema(BaseModel):
     published_at: Optional[datetime] = Field(None, description="发布时间，不填则用当前时间")
 
 
+class ArticleBulkCreateSchema(BaseModel):
+    """批量创建文章（n8n批量推送用）"""
+    items: List[dict] = Field(
+        ..., min_length=1,
+        description="文章列表，每一项的字段同ArticleCreateSchema；单项校验不过只报这一项，不影响整批",
+    )
+    chunk_size: Optional[int] = Field(None, ge=1, le=1000, description="每多少篇一个事务，不填用BULK_CHUNK_SIZE")
+
+
 class ArticleUpdateSchema(BaseModel):
     """更新文章的Schema"""
     title: Optional[str] = Field(None, min_length=1, max_length=255)
@@ -119,6 +131,9 @@ class PaginatedResponse(BaseModel):
     page: int
     page_size: int
     total_pages: int
+    next_cursor: Optional[str] = Field(None, description="下一页游标，没有下一页时为空")
+    has_more: bool = Field(False, description="是否还有下一页")
+    count_strategy: str = Field("exact", description="total的来源: exact / has_more（只是下界） / cached")
 
 
 # ========== API响应Schema ==========
@@ -0,0 +1,307 @@
+"""
+全文搜索 - SQLite FTS5
+articles_fts虚拟表按文章id（rowid）存标题、摘要、标签名和正文，
+文章增删改时在同一个事务里同步（见hooks.py），搜索走MATCH + bm25排序。
+中文分词在Python里做（见tokenizer.py）：写进FTS的是切好、用空格拼起来的token，
+FTS5只用unicode61按空格切；查询词也用同一个分词器切成短语。
+分好词的文本没法直接给人看，所以另存一列去掉HTML的正文（body，不建索引），
+高亮和摘要片段在Python里对当前页那几行现算。
+SQLite没编译FTS5、或者关键词切不出能查索引的词时，退回老的LIKE全表扫。
+
+老库第一次启动会自动回填索引（表结构是旧的也会重建）；
+数据对不上或者换了分词词典，手动跑：python -m app.search rebuild
+"""
+import asyncio
+import hashlib
+import html
+import re
+import weakref
+from typing import Iterable, List, Optional, Pattern, Tuple
+
+from sqlalchemy import Select, column, delete, event, func, insert, literal_column, select, table
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from .database import Base
+from .hooks import ArticleChange, on_flush
+from .listing import list_row_query
+from .models import Article, Tag, article_tag_table
+from .pagination import KeysetOrder
+from .tokenizer import is_cjk, normalize, tokenizer
+
+FTS_TABLE = "articles_fts"
+FTS_MODULE = "fts5(title, summary, tags, content, body UNINDEXED, tokenize='unicode61')"
+
+# bm25权重：标题 > 摘要 > 标签 > 正文，body不建索引
+BM25_WEIGHTS = (10.0, 4.0, 6.0, 1.0, 0.0)
+
+fts = table(
+    FTS_TABLE, column("rowid"), column("title"), column("summary"), column("tags"), column("content"), column("body")
+)
+
+_TAG_RE = re.compile(r"<[^>]+>")
+_SPACE_RE = re.compile(r"\s+")
+
+# 每个引擎查一次FTS表在不在，别每次搜索都查sqlite_master
+_available: "weakref.WeakKeyDictionary[Engine, bool]" = weakref.WeakKeyDictionary()
+
+
+def strip_html(content: Optional[str]) -> str:
+    """去掉HTML标签和实体，只留纯文本"""
+    if not content:
+        return ""
+    return _SPACE_RE.sub(" ", html.unescape(_TAG_RE.sub(" ", content))).strip()
+
+
+@event.listens_for(Base.metadata, "after_create")
+def _create_fts_table(target, connection: Connection, **kw) -> None:
+    """建表时顺带建FTS虚拟表，没有FTS5就算了，搜索会自动退回LIKE"""
+    if connection.dialect.name != "sqlite":
+        return
+    try:
+        connection.exec_driver_sql(f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING {FTS_MODULE}")
+    except Exception as e:
+        print(f"FTS5不可用，搜索退回LIKE：{e}")
+    _available.pop(connection.engine, None)
+
+
+def fts_available(conn: Connection) -> bool:
+    """当前库里有没有FTS表"""
+    engine = conn.engine
+    if engine not in _available:
+        if conn.dialect.name != "sqlite":
+            _available[engine] = False
+        else:
+            found = conn.exec_driver_sql(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (FTS_TABLE,)
+            ).first()
+            _available[engine] = found is not None
+    return _available[engine]
+
+
+def _fts_schema_current(conn: Connection) -> bool:
+    """FTS表是不是当前这版结构（老库可能还是trigram分词那版）"""
+    row = conn.exec_driver_sql("SELECT sql FROM sqlite_master WHERE name = ?", (FTS_TABLE,)).first()
+    return row is not None and row[0].split("USING", 1)[-1].strip() == FTS_MODULE
+
+
+def _recreate_fts_table(conn: Connection) -> None:
+    conn.exec_driver_sql(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+    conn.exec_driver_sql(f"CREATE VIRTUAL TABLE {FTS_TABLE} USING {FTS_MODULE}")
+
+
+def index_row(title: str, summary: Optional[str], tags: str, content: Optional[str]) -> dict:
+    """一篇文章对应的FTS行（不含rowid）"""
+    body = strip_html(content)
+    return {
+        "title": tokenizer.index_text(title),
+        "summary": tokenizer.index_text(summary),
+        "tags": tokenizer.index_text(tags),
+        "content": tokenizer.index_text(body),
+        "body": body,
+    }
+
+
+def _index_rows(conn: Connection, rows: Iterable[Tuple[int, str, Optional[str], str, Optional[str]]]) -> None:
+    """写入/覆盖索引行：(id, title, summary, tags, html_content)"""
+    rows = list(rows)
+    if not rows:
+        return
+    conn.execute(delete(fts).where(fts.c.rowid.in_([r[0] for r in rows])))
+    conn.execute(insert(fts), [{"rowid": row[0], **index_row(*row[1:])} for row in rows])
+
+
+@on_flush
+def _sync_search_index(session: Session, changes: List[ArticleChange]) -> None:
+    """文章增删改时同步FTS索引，和文章写入同一个事务"""
+    conn = session.connection()
+    if not fts_available(conn):
+        return
+    removed = [c.article_id for c in changes if c.after is None]
+    if removed:
+        conn.execute(delete(fts).where(fts.c.rowid.in_(removed)))
+    _index_rows(conn, (
+        (a.id, a.title, a.summary, " ".join(t.name for t in a.tags), a.content)
+        for a in (c.article for c in changes if c.after is not None and c.touches("title", "summary", "content", "tags"))
+    ))
+
+
+async def rebuild_search_index(db: AsyncSession, batch_size: int = 500) -> int:
+    """按文章表全量重建FTS索引，返回索引的文章数"""
+    conn = await db.connection()
+    if not await conn.run_sync(fts_available):
+        return 0
+    await db.execute(delete(fts))
+
+    total = 0
+    last_id = 0
+    while True:
+        result = await db.execute(
+            select(Article.id, Article.title, Article.summary, Article.content)
+            .where(Article.id > last_id).order_by(Article.id).limit(batch_size)
+        )
+        batch = result.all()
+        if not batch:
+            break
+        ids = [r.id for r in batch]
+        tag_result = await db.execute(
+            select(article_tag_table.c.article_id, Tag.name)
+            .join(Tag, Tag.id == article_tag_table.c.tag_id)
+            .where(article_tag_table.c.article_id.in_(ids))
+        )
+        tags: dict = {}
+        for article_id, name in tag_result:
+            tags.setdefault(article_id, []).append(name)
+        await conn.run_sync(_index_rows, [
+            (r.id, r.title, r.summary, " ".join(tags.get(r.id, [])), r.content) for r in batch
+        ])
+        total += len(batch)
+        last_id = ids[-1]
+    await db.commit()
+    return total
+
+
+async def backfill_search_index(db: AsyncSession) -> int:
+    """FTS表是旧结构、或者是空的但有文章（老库刚升级），就全量建一次"""
+    conn = await db.connection()
+    if not await conn.run_sync(fts_available):
+        return 0
+    if not await conn.run_sync(_fts_schema_current):
+        await conn.run_sync(_recreate_fts_table)
+        return await rebuild_search_index(db)
+    indexed = (await db.execute(select(func.count()).select_from(fts))).scalar()
+    if indexed:
+        return 0
+    if not (await db.execute(select(Article.id).limit(1))).first():
+        return 0
+    return await rebuild_search_index(db)
+
+
+# ========== 查询 ==========
+def build_match_query(keyword: str, prefix: bool = False, column_name: Optional[str] = None) -> Optional[str]:
+    """
+    把用户输入转成MATCH表达式：按空白切词，每个词用分词器切成token组成一个短语
+    （token都是字母数字和汉字，不会混进FTS语法），多个词之间是AND。
+    prefix=True时最后一个词的最后一个token按前缀匹配，给边输边搜用。
+    有词切不出token、或者只剩一个孤零零的汉字（索引里是bigram，单字查不到），返回None走LIKE。
+    """
+    phrases = []
+    terms = keyword.split()
+    for i, term in enumerate(terms):
+        tokens = tokenizer.tokenize(term)
+        is_last = i == len(terms) - 1
+        if not tokens:
+            return None
+        if len(tokens) == 1 and len(tokens[0]) == 1 and is_cjk(tokens[0]) and not (prefix and is_last):
+            return None
+        phrase = '"' + " ".join(tokens) + '"'
+        phrases.append(phrase + " *" if prefix and is_last else phrase)
+    if not phrases:
+        return None
+    expr = " ".join(phrases)
+    return f"{column_name} : ({expr})" if column_name else expr
+
+
+def highlight_pattern(keyword: str) -> Optional[Pattern]:
+    """高亮用的正则：原样匹配每个查询词，忽略大小写"""
+    terms = sorted({normalize(t) for t in keyword.split()}, key=len, reverse=True)
+    if not terms:
+        return None
+    return re.compile("|".join(re.escape(t) for t in terms), re.IGNORECASE)
+
+
+def mark(text: str, pattern: Optional[Pattern]) -> str:
+    """HTML转义后把命中的词包上<mark>"""
+    if not text or pattern is None:
+        return html.escape(text or "")
+    parts = []
+    last = 0
+    for m in pattern.finditer(text):
+        parts.append(html.escape(text[last:m.start()]))
+        parts.append(f"<mark>{html.escape(m.group())}</mark>")
+        last = m.end()
+    parts.append(html.escape(text[last:]))
+    return "".join(parts)
+
+
+def make_snippet(text: str, pattern: Optional[Pattern], width: int = 80) -> str:
+    """截取第一个命中附近width个字符的片段并高亮，没命中就取开头"""
+    if not text:
+        return ""
+    first = pattern.search(text) if pattern is not None else None
+    start = max(0, first.start() - width // 4) if first else 0
+    end = min(len(text), start + width)
+    start = max(0, end - width)
+    return ("…" if start > 0 else "") + mark(text[start:end], pattern) + ("…" if end < len(text) else "")
+
+
+class SearchHits:
+    """
+    一次FTS查询：hits子查询只算(id, score)，列表列和高亮片段分开取，
+    高亮片段只对当前页那几行算，不会对所有命中都生成一遍。
+    """
+
+    def __init__(self, keyword: str, match: str):
+        self.match = match
+        self.pattern = highlight_pattern(keyword)
+        fts_ref = literal_column(FTS_TABLE)
+        self.hits = (
+            select(fts.c.rowid.label("id"), (-func.bm25(fts_ref, *BM25_WEIGHTS)).label("score"))
+            .where(fts_ref.op("MATCH")(match))
+            .subquery("hits")
+        )
+        # 游标和关键词绑定，换了关键词旧游标直接作废
+        digest = hashlib.sha1(keyword.encode()).hexdigest()[:8]
+        self.order = KeysetOrder(f"fts:{digest}", self.hits.c.score, Article.id)
+
+    def page_query(self) -> Select:
+        """命中的已发布文章列表行，带score（越大越相关）"""
+        return (
+            list_row_query()
+            .add_columns(self.hits.c.score)
+            .join(self.hits, self.hits.c.id == Article.id)
+            .where(Article.status == "published")
+        )
+
+    async def highlights(self, db: AsyncSession, rows: List[Tuple[int, str]]) -> dict:
+        """当前页的标题高亮和正文片段，rows是(id, title)，返回 {id: (title_highlight, snippet)}"""
+        if not rows:
+            return {}
+        result = await db.execute(select(fts.c.rowid, fts.c.body).where(fts.c.rowid.in_([r[0] for r in rows])))
+        bodies = dict(result.all())
+        return {
+            id_: (mark(title, self.pattern), make_snippet(bodies.get(id_, ""), self.pattern))
+            for id_, title in rows
+        }
+
+
+def title_hits(keyword: str) -> Optional[Select]:
+    """标题前缀匹配的文章id子查询（边输边搜），关键词切不出token返回None"""
+    match = build_match_query(keyword, prefix=True, column_name="title")
+    if match is None:
+        return None
+    return select(fts.c.rowid).where(literal_column(FTS_TABLE).op("MATCH")(match))
+
+
+async def fts_ready(db: AsyncSession) -> bool:
+    conn = await db.connection()
+    return await conn.run_sync(fts_available)
+
+
+async def _main(argv: List[str]) -> None:
+    from .database import AsyncSessionLocal, init_db
+
+    if argv[:1] != ["rebuild"]:
+        print("用法: python -m app.search rebuild")
+        return
+    await init_db()
+    async with AsyncSessionLocal() as db:
+        total = await rebuild_search_index(db)
+    print(f"articles_fts rebuilt: {total} articles")
+
+
+if __name__ == "__main__":
+    import sys
+
+    asyncio.run(_main(sys.argv[1:]))
@@ -0,0 +1,103 @@
+"""
+读请求合并（single-flight）
+新文章一发布、缓存一清，几十个一模一样的 /api/articles?page=1 同时没命中，一起去查SQLite。
+现在幂等的GET接口按 路由 + 规范化参数 合并：同一个键已经有请求在算，后来的就等它的结果，
+库只查一次。和响应缓存叠着用：套在“查缓存 + 没命中就算”外面，冷缓存下一群请求只有领头的那个去查库。
+
+- 哪些路由合并由 SINGLE_FLIGHT_ROUTES 配（路由名，见main.py里cached()的第一个参数）
+- 领头的请求出错（比如404），等着的拿到同一个异常
+- 领头的请求被取消（客户端断开），等着的里面挑一个重新领头，不会跟着一起失败
+- 结果是共享的同一个对象，别在上面原地改
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Iterable, TypeVar
+
+from .config import settings
+
+T = TypeVar("T")
+
+
+class _LeaderCancelled(Exception):
+    """领头的请求被取消了，等着的重新来"""
+
+
+class _Flight:
+    __slots__ = ("future", "waiters")
+
+    def __init__(self, future: asyncio.Future):
+        self.future = future
+        self.waiters = 0
+
+
+class SingleFlight:
+    """键 -> 正在算的那一次；按路由统计领头次数和合并掉的请求数"""
+
+    def __init__(self, routes: Iterable[str]):
+        self.routes = set(routes)
+        self._flights: Dict[str, _Flight] = {}
+        self.reset()
+
+    def enabled_for(self, route: str) -> bool:
+        return route in self.routes
+
+    async def do(self, route: str, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        """同键的并发调用只执行一次fn，大家拿同一个结果；路由没开合并就直接执行"""
+        if route not in self.routes:
+            return await fn()
+        while True:
+            flight = self._flights.get(key)
+            if flight is None:
+                break
+            flight.waiters += 1
+            self.coalesced += 1
+            self._route(route)["coalesced"] += 1
+            try:
+                return await asyncio.shield(flight.future)
+            except _LeaderCancelled:
+                continue
+
+        flight = _Flight(asyncio.get_running_loop().create_future())
+        self._flights[key] = flight
+        self.leaders += 1
+        self._route(route)["leaders"] += 1
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            flight.future.set_exception(_LeaderCancelled())
+            raise
+        except BaseException as e:
+            flight.future.set_exception(e)
+            raise
+        else:
+            flight.future.set_result(result)
+            return result
+        finally:
+            del self._flights[key]
+            self.max_waiters = max(self.max_waiters, flight.waiters)
+            if not flight.waiters and flight.future.done() and not flight.future.cancelled():
+                flight.future.exception()  # 没人等，标记异常已读，免得asyncio报“never retrieved”
+
+    def _route(self, route: str) -> Dict[str, int]:
+        return self.per_route.setdefault(route, {"leaders": 0, "coalesced": 0})
+
+    def reset(self) -> None:
+        """清空统计（测试用）"""
+        self.leaders = 0
+        self.coalesced = 0
+        self.max_waiters = 0
+        self.per_route: Dict[str, Dict[str, int]] = {}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "routes": sorted(self.routes),
+            "in_flight": len(self._flights),
+            "waiting": sum(flight.waiters for flight in self._flights.values()),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "max_waiters": self.max_waiters,
+            "per_route": self.per_route,
+        }
+
+
+# 全局实例
+single_flight = SingleFlight(settings.single_flight_routes)
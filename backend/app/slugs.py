@@ -0,0 +1,253 @@
+"""
+文章slug：怎么从标题生成（策略）+ 撞了怎么编号（分配器）
+
+生成策略（SLUG_STRATEGY）：
+- title：老办法，标题转小写、去标点，中文原样保留
+- pinyin：中文转拼音（pypinyin，多音字按词组取音），英文数字原样，截到SLUG_MAX_LENGTH
+- hash：标题里的英文数字词 + 8位短哈希，纯中文标题就只有哈希，基本不撞
+- date：发布日期前缀 + 标题slug，同一天的同名资讯才会撞
+
+分配器：以前撞了就 slug-1、slug-2…一个一个SELECT试，AI资讯标题大同小异，经常试到两位数。
+现在slug_counters表里记着每个基础slug用到的最大编号，一条
+UPDATE slug_counters SET last = last + n WHERE base = ? RETURNING last
+就拿到n个没用过的编号。SQLite的写事务是串行的，UPDATE一开始就拿写锁，并发创建也不会分到同一个号。
+某个基础slug第一次用时按slug唯一索引范围扫一次已有的 base、base-N 作为起点。
+计数器只管自动编号，手动指定的slug（比如 foo-2）、别的标题生成出来的基础slug（标题就叫“Foo 2”）
+可能正好占了后面的号：拿到号之后一条IN查一下，占了的跳过、计数器接着往后拿，不然插入失败、
+计数跟着回滚，这个基础slug以后每次都分到同一个被占的号。
+
+计数表乱了（比如直接往库里灌了数据）就跑：python -m app.slugs rebuild，清空后按需重新起算。
+"""
+import asyncio
+import base64
+import hashlib
+import re
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import bindparam, delete, or_, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .config import settings
+from .models import Article, SlugCounter
+
+STRATEGY_TITLE = "title"
+STRATEGY_PINYIN = "pinyin"
+STRATEGY_HASH = "hash"
+STRATEGY_DATE = "date"
+
+_ASCII_WORD_RE = re.compile(r"[a-z0-9]+")
+
+# 批量起算时一条语句里最多几个基础slug的范围扫描
+_RANGE_CHUNK = 200
+
+# 查编号是否被占时一条IN最多几个slug
+_TAKEN_CHUNK = 500
+
+
+def generate_slug(title: str) -> str:
+    """生成URL友好的slug，老王我亲自写的！"""
+    # 转小写，替换空格和特殊字符为连字符
+    slug = re.sub(r"[^\w\s-]", "", title.lower())
+    slug = re.sub(r"[-\s]+", "-", slug)
+    return slug.strip("-")
+
+
+def _truncate(slug: str, max_length: int) -> str:
+    """按连字符截断，别把一个词切一半"""
+    if len(slug) <= max_length:
+        return slug
+    head = slug[:max_length]
+    if slug[max_length] != "-" and "-" in head:
+        head = head.rsplit("-", 1)[0]
+    return head.strip("-")
+
+
+def _short_hash(text: str) -> str:
+    digest = hashlib.blake2b(text.encode("utf-8"), digest_size=5).digest()
+    return base64.b32encode(digest).decode("ascii").lower()
+
+
+def pinyin_slug(title: str) -> str:
+    """中文转拼音，其余字符照老办法处理"""
+    from pypinyin import lazy_pinyin  # 词典加载要几百毫秒，用到才导入
+
+    # 中文一个字一个拼音，英文数字整段原样，空格隔开再交给generate_slug
+    return generate_slug(" ".join(lazy_pinyin(title.lower())))
+
+
+def hash_slug(title: str) -> str:
+    """英文数字词（最多40个字符）+ 短哈希"""
+    words = _truncate("-".join(_ASCII_WORD_RE.findall(title.lower())), 40)
+    digest = _short_hash(title.strip())
+    return f"{words}-{digest}" if words else digest
+
+
+def date_slug(title: str, when: Optional[datetime] = None) -> str:
+    """发布日期前缀 + 标题slug"""
+    return f"{(when or datetime.utcnow()):%Y%m%d}-{generate_slug(title)}".strip("-")
+
+
+_STRATEGIES: Dict[str, Callable[..., str]] = {
+    STRATEGY_TITLE: lambda title, when: generate_slug(title),
+    STRATEGY_PINYIN: lambda title, when: pinyin_slug(title),
+    STRATEGY_HASH: lambda title, when: hash_slug(title),
+    STRATEGY_DATE: date_slug,
+}
+STRATEGIES = tuple(_STRATEGIES)
+
+
+def article_base_slug(title: str, when: Optional[datetime] = None, strategy: Optional[str] = None) -> str:
+    """按配置的策略从标题生成基础slug（还没去重）"""
+    strategy = strategy or settings.SLUG_STRATEGY
+    if strategy not in _STRATEGIES:
+        raise ValueError(f"未知的slug策略: {strategy}，可选 {', '.join(STRATEGIES)}")
+    slug = _truncate(_STRATEGIES[strategy](title, when), settings.SLUG_MAX_LENGTH)
+    return slug or _short_hash(title)
+
+
+def numbered(base: str, n: int) -> str:
+    """第0号就是基础slug本身"""
+    return base if n == 0 else f"{base}-{n}"
+
+
+async def _highest_used(db: AsyncSession, base: str) -> int:
+    """库里已经用到的最大编号：base本身算0，一个都没有是-1。按slug唯一索引范围扫（'-'的下一个字符是'.'）"""
+    result = await db.execute(
+        select(Article.slug).where(
+            or_(Article.slug == base, (Article.slug > f"{base}-") & (Article.slug < f"{base}."))
+        )
+    )
+    highest = -1
+    prefix = len(base) + 1
+    for slug in result.scalars():
+        if slug == base:
+            highest = max(highest, 0)
+        elif slug[prefix:].isdigit():
+            highest = max(highest, int(slug[prefix:]))
+    return highest
+
+
+async def _taken(db: AsyncSession, slugs: Iterable[str]) -> Set[str]:
+    """这些slug里哪些已经被文章占了（按slug唯一索引IN查，分块）"""
+    slugs = list(slugs)
+    taken: Set[str] = set()
+    for start in range(0, len(slugs), _TAKEN_CHUNK):
+        result = await db.execute(select(Article.slug).where(Article.slug.in_(slugs[start:start + _TAKEN_CHUNK])))
+        taken.update(result.scalars())
+    return taken
+
+
+async def allocate_slugs(db: AsyncSession, base: str, count: int = 1) -> List[str]:
+    """
+    给基础slug分配count个没用过的slug，在调用方的事务里执行，跟文章一起提交
+    常见情况一条UPDATE ... RETURNING加一条IN；基础slug第一次出现时多一次范围扫描；
+    拿到的号被手动指定的slug占了就跳过，计数器接着往后拿
+    """
+    slugs: List[str] = []
+    while len(slugs) < count:
+        need = count - len(slugs)
+        last = await _advance(db, base, need)
+        candidates = [numbered(base, n) for n in range(last - need + 1, last + 1)]
+        taken = await _taken(db, candidates)
+        slugs.extend(slug for slug in candidates if slug not in taken)
+    return slugs
+
+
+async def _advance(db: AsyncSession, base: str, count: int) -> int:
+    """计数器加count，返回加完之后的值"""
+    table = SlugCounter.__table__
+    result = await db.execute(
+        update(table).where(table.c.base == base).values(last=table.c.last + count).returning(table.c.last)
+    )
+    last = result.scalar()
+    if last is None:
+        seed = await _highest_used(db, base)
+        stmt = sqlite_insert(table).values(base=base, last=seed + count)
+        stmt = stmt.on_conflict_do_update(index_elements=[table.c.base], set_={"last": table.c.last + count})
+        last = (await db.execute(stmt.returning(table.c.last))).scalar()
+    return last
+
+
+async def _highest_used_many(db: AsyncSession, bases: List[str]) -> Dict[str, int]:
+    """_highest_used的批量版：一条语句里每个基础slug一段范围扫描（分块，别超了SQLite表达式深度）"""
+    highest = {base: -1 for base in bases}
+    for start in range(0, len(bases), _RANGE_CHUNK):
+        chunk = bases[start:start + _RANGE_CHUNK]
+        result = await db.execute(select(Article.slug).where(or_(
+            Article.slug.in_(chunk),
+            *((Article.slug > f"{base}-") & (Article.slug < f"{base}.") for base in chunk),
+        )))
+        for slug in result.scalars():
+            if slug in highest:
+                highest[slug] = max(highest[slug], 0)
+            base, _, suffix = slug.rpartition("-")
+            if base in highest and suffix.isdigit():
+                highest[base] = max(highest[base], int(suffix))
+    return highest
+
+
+async def allocate_slug_batches(db: AsyncSession, counts: Dict[str, int]) -> Dict[str, List[str]]:
+    """
+    一次给很多个基础slug分配编号，返回 基础slug -> slug列表（批量导入用，标题各不相同时不用每个标题几条语句）
+    先一条executemany的UPDATE把已有的计数全加上（顺带拿到写锁），一条IN读回来；
+    计数表里还没有的按文章表批量起算，一条executemany插进去；
+    拿到的号一起IN查一遍，被占了的那几个基础slug再单独补（allocate_slugs）
+    """
+    if not counts:
+        return {}
+    table = SlugCounter.__table__
+    await db.execute(
+        update(table).where(table.c.base == bindparam("b_base")).values(last=table.c.last + bindparam("b_count")),
+        [{"b_base": base, "b_count": count} for base, count in counts.items()],
+    )
+    result = await db.execute(select(table.c.base, table.c.last).where(table.c.base.in_(list(counts))))
+    last = dict(result.all())
+    missing = [base for base in counts if base not in last]
+    if missing:
+        seeds = await _highest_used_many(db, missing)
+        rows = [{"base": base, "last": seeds[base] + counts[base]} for base in missing]
+        await db.execute(sqlite_insert(table), rows)
+        last.update((row["base"], row["last"]) for row in rows)
+    allocated = {
+        base: [numbered(base, n) for n in range(last[base] - count + 1, last[base] + 1)]
+        for base, count in counts.items()
+    }
+    taken = await _taken(db, (slug for slugs in allocated.values() for slug in slugs))
+    if taken:
+        for base, slugs in allocated.items():
+            free = [slug for slug in slugs if slug not in taken]
+            if len(free) < len(slugs):
+                free.extend(await allocate_slugs(db, base, len(slugs) - len(free)))
+                allocated[base] = free
+    return allocated
+
+
+async def allocate_slug(db: AsyncSession, base: str) -> str:
+    return (await allocate_slugs(db, base))[0]
+
+
+async def rebuild_slug_counters(db: AsyncSession) -> int:
+    """清空计数表，下次用到哪个基础slug再按文章表重新起算，返回清掉的行数"""
+    result = await db.execute(delete(SlugCounter))
+    await db.commit()
+    return result.rowcount
+
+
+async def _main(argv: list[str]) -> None:
+    from .database import AsyncSessionLocal, init_db
+
+    if argv[:1] != ["rebuild"]:
+        print("用法: python -m app.slugs rebuild")
+        return
+    await init_db()
+    async with AsyncSessionLocal() as db:
+        cleared = await rebuild_slug_counters(db)
+    print(f"slug_counters cleared: {cleared} rows")
+
+
+if __name__ == "__main__":
+    import sys
+
+    asyncio.run(_main(sys.argv[1:]))
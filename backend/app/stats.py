@@ -0,0 +1,204 @@
+"""
+首页统计快照
+以前 /api/stats 每次都是五条查询（已发布数、分类数、标签数、浏览量总和、最新5篇），首页每访问一次跑一遍。
+现在算一次放内存里，TTL内直接返回：
+- 四个聚合数一条SQL（标量子查询）一次往返算完，最新5篇走列表行（不读content）
+- 文章增删改提交后（hooks.on_commit）、新建分类后作废，下次请求重算
+- 浏览量写回后不作废，直接把增量加到快照上，和库里保持一致
+- 多进程部署时别的进程的写入只能靠TTL兜底
+- stale-while-revalidate：过了TTL还在 RESPONSE_CACHE_STALE 秒内，先把旧快照返回，后台开只读Session重算；
+  被作废的快照不会再返回（没有启动后台刷新时照旧同步重算）
+
+接口返回里带snapshot_age（秒），监控能看到数据有多旧。
+"""
+import asyncio
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import desc, func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from .config import settings
+from .fastjson import list_items
+from .hooks import ArticleChange, on_commit
+from .listing import fetch_list_rows, list_row_query
+from .models import Article, Category, Tag
+from .view_counter import view_counter
+
+LATEST_LIMIT = 5
+
+
+def aggregates_query():
+    """已发布数、分类数、标签数、浏览量总和，一条SQL"""
+    return select(
+        select(func.count(Article.id)).where(Article.status == "published").scalar_subquery().label("article_count"),
+        select(func.count(Category.id)).scalar_subquery().label("category_count"),
+        select(func.count(Tag.id)).scalar_subquery().label("tag_count"),
+        select(func.coalesce(func.sum(Article.views), 0)).scalar_subquery().label("total_views"),
+    )
+
+
+class StatsSnapshot:
+    """统计数据的内存快照，过期或被作废了才重算"""
+
+    def __init__(self, ttl: float, stale: float = 0.0):
+        self.ttl = ttl
+        self.stale = stale
+        self._data: Optional[dict] = None
+        self._computed_at = 0.0  # time.monotonic()
+        self._generated_at: Optional[datetime] = None
+        # 每作废一次加一，算的过程中被作废了，算出来的结果就不存
+        self._generation = 0
+        self._lock = asyncio.Lock()
+        self._session_factory: Optional[async_sessionmaker[AsyncSession]] = None
+        self._refreshing: Optional[asyncio.Task] = None
+
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self.invalidations = 0
+
+    @property
+    def age(self) -> Optional[float]:
+        """快照算出来多少秒了，没有快照时为空"""
+        if self._data is None:
+            return None
+        return time.monotonic() - self._computed_at
+
+    def _fresh(self) -> bool:
+        return self._data is not None and time.monotonic() - self._computed_at < self.ttl
+
+    def _usable_stale(self) -> bool:
+        """过期了但还能先顶着用（有后台刷新、没超期限）"""
+        return (
+            self._data is not None
+            and self._session_factory is not None
+            and time.monotonic() - self._computed_at < self.ttl + self.stale
+        )
+
+    def invalidate(self) -> None:
+        """作废快照，下次请求重算"""
+        self._generation += 1
+        if self._data is not None:
+            self._data = None
+            self.invalidations += 1
+
+    def apply_views(self, batch: Dict[int, int]) -> None:
+        """浏览量写回后把增量补到快照上（view_counter的监听器）"""
+        if self._data is None:
+            return
+        self._data["total_views"] += sum(batch.values())
+        for item in self._data["latest_articles"]:
+            item["views"] += batch.get(item["id"], 0)
+
+    async def _compute(self, db: AsyncSession) -> dict:
+        row = (await db.execute(aggregates_query())).one()
+        latest = await fetch_list_rows(
+            db,
+            list_row_query()
+            .where(Article.status == "published")
+            .order_by(desc(Article.published_at))
+            .limit(LATEST_LIMIT),
+        )
+        return {
+            "article_count": row.article_count or 0,
+            "category_count": row.category_count or 0,
+            "tag_count": row.tag_count or 0,
+            "total_views": row.total_views or 0,
+            "latest_articles": list_items(latest),
+        }
+
+    async def get(self, db: AsyncSession) -> dict:
+        """取快照（返回的是副本），并发的请求只有一个去算"""
+        if not self._fresh():
+            if self._usable_stale():
+                self.stale_hits += 1
+                self._refresh()
+                return self._response(self._data, self.age)
+            async with self._lock:
+                if not self._fresh():
+                    self.misses += 1
+                    return self._response(await self._recompute(db), 0.0)
+        self.hits += 1
+        return self._response(self._data, self.age)
+
+    async def _recompute(self, db: AsyncSession) -> dict:
+        """重算；算的过程中被作废了就不存"""
+        generation = self._generation
+        data = await self._compute(db)
+        if generation == self._generation:
+            self._data = data
+            self._computed_at = time.monotonic()
+            self._generated_at = datetime.utcnow()
+        return data
+
+    def _refresh(self) -> None:
+        """后台开只读Session重算，同时只跑一个"""
+        if self._refreshing is not None:
+            return
+
+        async def run() -> None:
+            try:
+                async with self._lock:
+                    if not self._fresh():
+                        async with self._session_factory() as session:
+                            await self._recompute(session)
+            finally:
+                self._refreshing = None
+
+        self._refreshing = asyncio.get_running_loop().create_task(run())
+
+    def start(self, session_factory: async_sessionmaker[AsyncSession]) -> None:
+        """lifespan里调用，给后台刷新用的Session工厂（用只读引擎）"""
+        self._session_factory = session_factory
+
+    async def stop(self) -> None:
+        """等正在跑的后台刷新结束，关机时调"""
+        if self._refreshing is not None:
+            await asyncio.gather(self._refreshing, return_exceptions=True)
+
+    @staticmethod
+    def _response(data: dict, age: float) -> dict:
+        response = {**data, "latest_articles": [dict(item) for item in data["latest_articles"]]}
+        response["total_views"] += view_counter.pending_total  # 加上还没写回的
+        response["snapshot_age"] = round(age, 3)
+        return response
+
+    def reset(self) -> None:
+        """清掉快照和统计（测试用）"""
+        self._data = None
+        self._computed_at = 0.0
+        self._generated_at = None
+        self._generation += 1
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self.invalidations = 0
+
+    def stats(self) -> dict:
+        age = self.age
+        return {
+            "ttl": self.ttl,
+            "stale": self.stale,
+            "age": round(age, 3) if age is not None else None,
+            "generated_at": self._generated_at.isoformat() if self._data is not None else None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale_hits": self.stale_hits,
+            "invalidations": self.invalidations,
+        }
+
+
+# 全局实例
+stats_snapshot = StatsSnapshot(
+    settings.STATS_SNAPSHOT_TTL,
+    settings.RESPONSE_CACHE_STALE if "stats" in settings.stale_while_revalidate_routes else 0.0,
+)
+view_counter.add_listener(stats_snapshot.apply_views)
+
+
+@on_commit
+def _invalidate_stats(changes: List[ArticleChange]) -> None:
+    """文章有任何增删改都作废，最新5篇里的标题、分类这些也可能变了"""
+    stats_snapshot.invalidate()
@@ -0,0 +1,311 @@
+"""
+即时搜索建议的内存索引
+搜索框每敲一个键就打一次/api/search/articles，以前每次都是一条ILIKE全表扫。
+现在启动时把已发布文章的标题和标签名读进内存，建一个字符n-gram倒排（单字 + 相邻两字），
+查询时挑命中文章最少的那个gram当候选集，逐个确认包含关键词，再按浏览量取前k条，全程不碰数据库。
+- 前缀和中间匹配都支持（"大"、"模型"都能搜到"大模型推理"）
+- 文章增删改提交后通过hooks.on_commit增量更新，浏览量写回后跟着更新权重；
+  提交时对象上没加载全的（提交后不能再发SQL）记成过期，下次查询前按ID从库里补读
+- 倒排用array('I')存文章ID省内存；删改时不去数组里挖，旧ID留着由查询时的确认步骤过滤，
+  垃圾攒多了整体压缩一次
+
+内存占用和查询延迟见 benchmarks/bench_suggest.py
+"""
+import heapq
+import time
+from array import array
+from collections import defaultdict
+from itertools import islice
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .hooks import ArticleChange, on_commit
+from .models import Article, Tag, article_tag_table
+from .tokenizer import normalize
+from .view_counter import view_counter
+
+# 候选集到了这么大才考虑求交集、按浏览量顺序往下扫，再小直接逐个确认更快
+WALK_MIN_POSTINGS = 256
+# 按浏览量顺序最多扫这么多篇，还凑不够k条就回到候选集精确算
+WALK_LIMIT = 2000
+# 只有浏览量变了的话，最多隔这么久才重排一次
+RESORT_INTERVAL = 30.0
+# 倒排里的垃圾ID超过这个比例就压缩
+GARBAGE_RATIO = 0.25
+
+# (id, title, slug, summary, views, [标签名])
+SuggestionRow = Tuple[int, str, str, Optional[str], int, Iterable[str]]
+
+
+class _Entry:
+    __slots__ = ("id", "title", "slug", "summary", "views", "text")
+
+    def __init__(self, id_: int, title: str, slug: str, summary: Optional[str], views: int, text: str):
+        self.id = id_
+        self.title = title
+        self.slug = slug
+        self.summary = summary
+        self.views = views
+        self.text = text
+
+    def to_dict(self) -> dict:
+        return {"id": self.id, "title": self.title, "slug": self.slug, "summary": self.summary}
+
+
+def _match_text(title: str, tag_names: Iterable[str]) -> str:
+    """参与匹配的文本：标题和各个标签名，用换行隔开，gram不跨段"""
+    return "\n".join(normalize(part) for part in (title, *tag_names))
+
+
+def _grams(text: str) -> Set[str]:
+    grams = set()
+    previous = ""
+    for char in text:
+        if char.isspace():
+            previous = ""
+            continue
+        grams.add(char)
+        if previous:
+            grams.add(previous + char)
+        previous = char
+    return grams
+
+
+def _term_grams(term: str) -> List[str]:
+    if len(term) == 1:
+        return [term]
+    return [term[i:i + 2] for i in range(len(term) - 1)]
+
+
+class SuggestionIndex:
+    """标题 + 标签名的n-gram倒排，按浏览量排序取前k"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        """清空索引，回到未就绪状态（测试用）"""
+        self.ready = False
+        # 提交时没能同步的文章ID，等refresh()从库里补读
+        self._stale: Set[int] = set()
+        self._entries: Dict[int, _Entry] = {}
+        self._postings: Dict[str, array] = defaultdict(lambda: array("I"))
+        # 删掉但ID还留在倒排里的文章 {id: 原来的匹配文本}，压缩时清空
+        self._ghosts: Dict[int, str] = {}
+        self._posted = 0
+        self._garbage = 0
+        self._ranked: Optional[List[_Entry]] = None
+        self._sorted_at = 0.0
+        self._views_changed = False
+        self.built_at: Optional[float] = None
+        self.lookups = 0
+
+    # ========== 构建和维护 ==========
+    def load(self, rows: Iterable[SuggestionRow]) -> int:
+        """整体替换索引内容，返回条目数"""
+        self.reset()
+        for id_, title, slug, summary, views, tag_names in rows:
+            entry = _Entry(id_, title, slug, summary, views or 0, _match_text(title, tag_names))
+            self._entries[id_] = entry
+            self._post(id_, _grams(entry.text))
+        self.ready = True
+        self.built_at = time.time()
+        return len(self._entries)
+
+    @staticmethod
+    async def _read(db: AsyncSession, ids: Optional[Set[int]] = None) -> List[SuggestionRow]:
+        """从数据库读已发布文章（给了ids就只读这几篇）"""
+        condition = Article.status == "published"
+        if ids is not None:
+            condition = condition & Article.id.in_(ids)
+        result = await db.execute(
+            select(Article.id, Article.title, Article.slug, Article.summary, Article.views).where(condition)
+        )
+        articles = result.all()
+        tag_result = await db.execute(
+            select(article_tag_table.c.article_id, Tag.name)
+            .join(Tag, Tag.id == article_tag_table.c.tag_id)
+            .join(Article, Article.id == article_tag_table.c.article_id)
+            .where(condition)
+        )
+        tags: Dict[int, List[str]] = defaultdict(list)
+        for article_id, name in tag_result:
+            tags[article_id].append(name)
+        return [(a.id, a.title, a.slug, a.summary, a.views, tags.get(a.id, ())) for a in articles]
+
+    async def build(self, db: AsyncSession) -> int:
+        """从数据库读已发布文章建索引，启动时调用"""
+        return self.load(await self._read(db))
+
+    @property
+    def stale(self) -> bool:
+        return bool(self._stale)
+
+    def mark_stale(self, id_: int) -> None:
+        """这篇提交时没能同步，下次查询前补读"""
+        self._stale.add(id_)
+
+    async def refresh(self, db: AsyncSession) -> int:
+        """把过期的那几篇从库里重新读进来（不再是已发布的就移除），返回处理的篇数"""
+        # 先摘下来：读的时候又有提交标了过期的，留着下次再读
+        ids, self._stale = self._stale, set()
+        try:
+            rows = await self._read(db, ids)
+        except Exception:
+            self._stale |= ids
+            raise
+        for row in rows:
+            self.upsert(*row)
+        for id_ in ids.difference(row[0] for row in rows):
+            self.remove(id_)
+        return len(ids)
+
+    def _post(self, id_: int, grams: Iterable[str]) -> None:
+        for gram in grams:
+            self._postings[gram].append(id_)
+            self._posted += 1
+
+    def upsert(self, id_: int, title: str, slug: str, summary: Optional[str], views: int, tag_names: Iterable[str]) -> None:
+        """新增或更新一篇已发布文章"""
+        text = _match_text(title, tag_names)
+        old = self._entries.get(id_)
+        old_text = old.text if old is not None else self._ghosts.pop(id_, None)
+        if old_text is not None:
+            old_grams, new_grams = _grams(old_text), _grams(text)
+            self._post(id_, new_grams - old_grams)
+            if old is None:
+                # 删掉又回来的，原来留在倒排里的ID又有用了
+                self._garbage -= len(old_grams & new_grams)
+            else:
+                self._garbage += len(old_grams - new_grams)
+        else:
+            self._post(id_, _grams(text))
+        self._entries[id_] = _Entry(id_, title, slug, summary, views or 0, text)
+        self._ranked = None
+        self._maybe_compact()
+
+    def remove(self, id_: int) -> None:
+        """文章删了或者不再是已发布"""
+        entry = self._entries.pop(id_, None)
+        if entry is None:
+            return
+        self._ghosts[id_] = entry.text
+        self._garbage += len(_grams(entry.text))
+        self._ranked = None
+        self._maybe_compact()
+
+    def apply_views(self, batch: Dict[int, int]) -> None:
+        """浏览量写回后加上增量（view_counter的回调）"""
+        for id_, n in batch.items():
+            entry = self._entries.get(id_)
+            if entry is not None:
+                entry.views += n
+                self._views_changed = True
+
+    def _maybe_compact(self) -> None:
+        if self._posted and self._garbage > self._posted * GARBAGE_RATIO:
+            self.compact()
+
+    def compact(self) -> None:
+        """按当前条目重建倒排，把删改留下的旧ID清掉"""
+        self._postings = defaultdict(lambda: array("I"))
+        self._posted = 0
+        self._garbage = 0
+        self._ghosts.clear()
+        for entry in self._entries.values():
+            self._post(entry.id, _grams(entry.text))
+
+    # ========== 查询 ==========
+    def _ranking(self) -> List[_Entry]:
+        """按浏览量倒序的全部条目；有增删时马上重排，只是浏览量变了就隔一阵再排"""
+        now = time.monotonic()
+        if self._ranked is None or (self._views_changed and now - self._sorted_at > RESORT_INTERVAL):
+            self._ranked = sorted(self._entries.values(), key=lambda e: (e.views, e.id), reverse=True)
+            self._sorted_at = now
+            self._views_changed = False
+        return self._ranked
+
+    def suggest(self, keyword: str, limit: int = 5) -> List[dict]:
+        """标题或标签名包含全部关键词（空白分隔）的文章，按浏览量取前limit条"""
+        self.lookups += 1
+        terms = normalize(keyword).split()
+        if not terms or limit <= 0:
+            return []
+        # 每个词挑命中文章最少的那个gram
+        postings = []
+        for term in terms:
+            found = [self._postings.get(gram) for gram in _term_grams(term)]
+            if not all(found):
+                return []
+            postings.append(min(found, key=len))
+        postings.sort(key=len)
+
+        def matches(entry: Optional[_Entry]) -> bool:
+            return entry is not None and all(term in entry.text for term in terms)
+
+        # 估一下命中多少篇（各词相互独立），够密的话按浏览量从高往低扫，扫不了几篇就能凑够limit条
+        total = len(self._entries) or 1
+        estimate = total
+        for found in postings:
+            estimate *= len(found) / total
+        if len(postings[0]) >= WALK_MIN_POSTINGS and estimate * WALK_LIMIT > limit * total:
+            hits = []
+            for entry in islice(self._ranking(), WALK_LIMIT):
+                if matches(entry):
+                    hits.append(entry)
+                    if len(hits) == limit:
+                        break
+            if len(hits) == limit or total <= WALK_LIMIT:
+                hits.sort(key=lambda e: (e.views, e.id), reverse=True)
+                return [e.to_dict() for e in hits]
+
+        candidates = postings[0]
+        if len(postings) > 1 and len(candidates) >= WALK_MIN_POSTINGS:
+            # 多个词、候选还很多：各词的倒排求交集（C层面的集合运算），少确认几篇
+            candidates = set(candidates).intersection(*postings[1:])
+        hits = {id_: entry for id_ in candidates if matches(entry := self._entries.get(id_))}
+        top = heapq.nlargest(limit, hits.values(), key=lambda e: (e.views, e.id))
+        return [e.to_dict() for e in top]
+
+    def stats(self) -> dict:
+        return {
+            "ready": self.ready,
+            "stale": self.stale,
+            "entries": len(self._entries),
+            "grams": len(self._postings),
+            "postings": self._posted,
+            "garbage_postings": self._garbage,
+            "lookups": self.lookups,
+            "built_at": self.built_at,
+        }
+
+
+# 全局实例
+suggestion_index = SuggestionIndex()
+
+
+@on_commit
+def _sync_suggestions(changes: List[ArticleChange]) -> None:
+    """文章提交后增量更新；索引还没建（比如测试里）就不管"""
+    if not suggestion_index.ready:
+        return
+    for change in changes:
+        if change.after is None or change.after.status != "published":
+            suggestion_index.remove(change.article_id)
+            continue
+        if not change.touches("title", "slug", "summary", "tags", "status", "views"):
+            continue
+        # 只读已经加载在对象上的值，提交后不能再发SQL
+        state = change.article.__dict__
+        if not all(key in state for key in ("title", "slug", "views", "tags")):
+            suggestion_index.mark_stale(change.article_id)
+            continue
+        suggestion_index.upsert(
+            change.article_id, state["title"], state["slug"], state.get("summary"), state["views"],
+            [tag.name for tag in state["tags"]],
+        )
+
+
+view_counter.add_listener(suggestion_index.apply_views)
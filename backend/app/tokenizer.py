@@ -0,0 +1,106 @@
+"""
+中文分词 - 纯Python，不依赖jieba之类的C扩展
+我们的语料基本全是中文，按空白切词等于没切，trigram又要求至少3个字。
+规则很土但够用：
+- 中日韩连续字符切成重叠的二元组（bigram）："大模型推理" -> 大模 模型 型推 推理
+- 字母数字按词切，统一转小写："GPT-4o" -> gpt 4o
+- 单独一个汉字（两边都是标点/英文）原样保留
+- 配了词典（SEARCH_DICTIONARY_PATH，一行一个词）就先按正向最大匹配切出词典词，
+  剩下没匹配上的再切bigram。词典只在精度上加分：查"模型"就匹配不到索引里整词切出来的"大模型"，
+  所以换词典后必须重建索引：python -m app.search rebuild
+
+建索引和查询必须用同一个分词器，不然对不上。
+"""
+import re
+import unicodedata
+from pathlib import Path
+from typing import FrozenSet, Iterable, List, Optional
+
+from .config import settings
+
+# 中日韩统一表意文字（含扩展A和兼容区）、日文假名、韩文音节
+_CJK_RANGES = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff"
+_CJK_CHAR_RE = re.compile(f"[{_CJK_RANGES}]")
+# 一段连续的中日韩字符，或者一个不含中日韩字符的字母数字词
+_RUN_RE = re.compile(f"([{_CJK_RANGES}]+)|([^\\W_{_CJK_RANGES}]+)")
+
+
+def is_cjk(char: str) -> bool:
+    return _CJK_CHAR_RE.match(char) is not None
+
+
+def normalize(text: str) -> str:
+    """全角转半角、统一小写，索引和查询都先过一遍"""
+    return unicodedata.normalize("NFKC", text).lower()
+
+
+def _bigrams(run: str) -> List[str]:
+    if len(run) < 2:
+        return [run] if run else []
+    return [run[i:i + 2] for i in range(len(run) - 1)]
+
+
+class CJKTokenizer:
+    """bigram + 英文词的分词器，可选词典正向最大匹配"""
+
+    def __init__(self, dictionary: Optional[Iterable[str]] = None, max_word_length: int = 8):
+        words = {normalize(w.strip()) for w in dictionary or () if len(w.strip()) >= 2}
+        self.dictionary: FrozenSet[str] = frozenset(words)
+        self.max_word_length = min(max_word_length, max((len(w) for w in words), default=0))
+
+    def _segment(self, run: str) -> List[str]:
+        """词典正向最大匹配，没匹配上的部分切bigram"""
+        tokens: List[str] = []
+        rest_start = 0
+        i = 0
+        n = len(run)
+        while i < n:
+            for length in range(min(self.max_word_length, n - i), 1, -1):
+                word = run[i:i + length]
+                if word in self.dictionary:
+                    tokens.extend(_bigrams(run[rest_start:i]))
+                    tokens.append(word)
+                    i += length
+                    rest_start = i
+                    break
+            else:
+                i += 1
+        tokens.extend(_bigrams(run[rest_start:]))
+        return tokens
+
+    def tokenize(self, text: Optional[str]) -> List[str]:
+        """切成token列表，顺序和原文一致（短语查询靠这个）"""
+        if not text:
+            return []
+        tokens: List[str] = []
+        segment = self._segment if self.dictionary else _bigrams
+        for cjk, word in _RUN_RE.findall(normalize(text)):
+            if cjk:
+                tokens.extend(segment(cjk))
+            else:
+                tokens.append(word)
+        return tokens
+
+    def index_text(self, text: Optional[str]) -> str:
+        """写进FTS表的文本：token用空格拼起来，交给unicode61按空格切"""
+        return " ".join(self.tokenize(text))
+
+
+def load_dictionary(path: str) -> List[str]:
+    """读词典文件，一行一个词，#开头是注释；兼容jieba词典的“词 词频 词性”格式"""
+    words = []
+    for line in Path(path).read_text(encoding="utf-8").splitlines():
+        line = line.strip()
+        if line and not line.startswith("#"):
+            words.append(line.split()[0])
+    return words
+
+
+def _default_tokenizer() -> CJKTokenizer:
+    if settings.SEARCH_DICTIONARY_PATH:
+        return CJKTokenizer(load_dictionary(settings.SEARCH_DICTIONARY_PATH))
+    return CJKTokenizer()
+
+
+# 全局分词器
+tokenizer = _default_tokenizer()
@@ -0,0 +1,163 @@
+"""
+浏览量写回缓冲（write-behind）
+以前每看一次详情页就 views += 1 再 commit 一次，详情页成了SQLite最大的写入户。
+现在先在内存里按文章ID攒着，定时或攒够数量后一个事务批量
+UPDATE articles SET views = views + ? WHERE id = ? 写回去。
+接口返回的views = 库里的值 + 还没写回的增量，写回窗口内最终一致。
+"""
+import asyncio
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Set
+
+from sqlalchemy import bindparam, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from .config import settings
+from .models import Article
+from .writer import WriteCoordinator
+
+FlushListener = Callable[[Dict[int, int]], None]
+
+
+class ViewCounter:
+    """按文章ID缓冲浏览量增量，批量写回数据库"""
+
+    def __init__(self, flush_interval: float, flush_threshold: int):
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self._pending: Dict[int, int] = {}
+        self._pending_total = 0
+        self._session_factory: Optional[async_sessionmaker[AsyncSession]] = None
+        self._writer: Optional[WriteCoordinator] = None
+        self._task: Optional[asyncio.Task] = None
+        self._flushing: Set[asyncio.Task] = set()  # 攒够阈值提前写回的任务，留着引用别被回收
+        self._flush_lock = asyncio.Lock()
+        self._listeners: List[FlushListener] = []
+
+        self.flushed_total = 0
+        self.flush_count = 0
+        self.failed_flushes = 0
+        self.last_flush_at: Optional[datetime] = None
+
+    def add_listener(self, fn: FlushListener) -> FlushListener:
+        """写回成功后回调，参数是 {文章ID: 增量}"""
+        self._listeners.append(fn)
+        return fn
+
+    def record(self, article_id: int, n: int = 1) -> None:
+        """记一次浏览，攒够阈值就提前写回"""
+        self._pending[article_id] = self._pending.get(article_id, 0) + n
+        self._pending_total += n
+        if (
+            self._task is not None and self._pending_total >= self.flush_threshold
+            and not self._flushing and not self._flush_lock.locked()
+        ):
+            task = asyncio.get_running_loop().create_task(self._flush_logged())
+            self._flushing.add(task)
+            task.add_done_callback(self._flushing.discard)
+
+    def pending_for(self, article_id: int) -> int:
+        """某篇文章还没写回的浏览量"""
+        return self._pending.get(article_id, 0)
+
+    @property
+    def pending_total(self) -> int:
+        return self._pending_total
+
+    async def flush(self) -> int:
+        """把缓冲的增量一次性写回，返回写回的浏览次数"""
+        async with self._flush_lock:
+            if not self._pending or self._session_factory is None:
+                return 0
+            batch, self._pending, self._pending_total = self._pending, {}, 0
+
+            table = Article.__table__
+            stmt = (
+                update(table)
+                .where(table.c.id == bindparam("b_id"))
+                # 显式带上updated_at，别让onupdate把它刷成现在
+                .values(views=table.c.views + bindparam("b_views"), updated_at=table.c.updated_at)
+            )
+            async def write(session: AsyncSession) -> None:
+                await session.execute(stmt, [{"b_id": k, "b_views": v} for k, v in batch.items()])
+
+            try:
+                if self._writer is not None and self._writer.running:
+                    # 和接口的写入一起排队，合进同一个事务提交
+                    await self._writer.submit(write)
+                else:
+                    async with self._session_factory() as session:
+                        await write(session)
+                        await session.commit()
+            except Exception:
+                # 写失败了把增量还回去，下次再试
+                for article_id, n in batch.items():
+                    self._pending[article_id] = self._pending.get(article_id, 0) + n
+                    self._pending_total += n
+                self.failed_flushes += 1
+                raise
+
+            flushed = sum(batch.values())
+            self.flushed_total += flushed
+            self.flush_count += 1
+            self.last_flush_at = datetime.utcnow()
+        for listener in self._listeners:
+            listener(batch)
+        return flushed
+
+    async def _flush_logged(self) -> None:
+        """后台写回：失败了增量已经还回去，打个日志等下次"""
+        try:
+            await self.flush()
+        except Exception as e:
+            print(f"浏览量写回失败，下次重试：{e}")
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self._flush_logged()
+
+    def start(self, session_factory: async_sessionmaker[AsyncSession], writer: Optional[WriteCoordinator] = None) -> None:
+        """启动定时写回任务，lifespan里调用；给了写入协调器就通过它写"""
+        self._session_factory = session_factory
+        self._writer = writer
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        """停掉定时任务并把剩下的全部写回，关机前必须调！"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._flushing:
+            await asyncio.gather(*self._flushing, return_exceptions=True)
+        await self.flush()
+
+    def reset(self) -> None:
+        """清空缓冲和统计（测试用）"""
+        self._pending.clear()
+        self._pending_total = 0
+        self.flushed_total = 0
+        self.flush_count = 0
+        self.failed_flushes = 0
+        self.last_flush_at = None
+
+    def stats(self) -> dict:
+        return {
+            "pending_views": self._pending_total,
+            "pending_articles": len(self._pending),
+            "flushed_views": self.flushed_total,
+            "flushes": self.flush_count,
+            "failed_flushes": self.failed_flushes,
+            "last_flush_at": self.last_flush_at.isoformat() if self.last_flush_at else None,
+            "flush_interval": self.flush_interval,
+            "flush_threshold": self.flush_threshold,
+        }
+
+
+# 全局实例
+view_counter = ViewCounter(settings.VIEW_FLUSH_INTERVAL, settings.VIEW_FLUSH_THRESHOLD)
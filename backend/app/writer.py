@@ -0,0 +1,182 @@
+"""
+单写者协调器（group commit）
+SQLite同一时刻只有一个写者：建文章、改文章、浏览量写回一起上来时抢写锁，慢的那个等到busy_timeout报database is locked，
+延迟也一抖一抖的。现在所有写接口把“写入单元”（拿Session干活、不提交的协程函数）丢进队列，
+一个后台任务独占写连接，一次从队列里捞一批：
+- 一批一个事务（SQLite上BEGIN IMMEDIATE，一上来就拿写锁），每个单元包一层SAVEPOINT，
+  某个单元出错只回滚它自己，错误原样交给它的调用方，同一批别的单元照常提交
+- 整批提交成功后才把结果交给各自的调用方；提交本身失败就把这批拆开逐个重来
+- 提交一次fsync，攒得越多每篇越便宜：写得越忙，一批就越大
+
+没启动（测试、命令行脚本）时run()直接在调用方给的Session上执行单元再提交，行为和以前一样。
+写入单元里别commit/rollback，要拿自增ID就flush。
+"""
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, List, Optional, Tuple, TypeVar
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from .config import settings
+
+T = TypeVar("T")
+WriteUnit = Callable[[AsyncSession], Awaitable[T]]
+
+
+class _Job:
+    __slots__ = ("unit", "future")
+
+    def __init__(self, unit: WriteUnit, future: asyncio.Future):
+        self.unit = unit
+        self.future = future
+
+
+class WriteCoordinator:
+    """独占写连接的后台任务，把排队的写入单元攒成一个事务提交"""
+
+    def __init__(self, batch_max: int, batch_window: float, queue_max: int):
+        self.batch_max = batch_max
+        self.batch_window = batch_window
+        self.queue_max = queue_max
+        self._queue: Optional[asyncio.Queue] = None
+        self._session_factory: Optional[async_sessionmaker[AsyncSession]] = None
+        self._task: Optional[asyncio.Task] = None
+        self.reset()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    async def run(self, db: AsyncSession, unit: Callable[[AsyncSession], Awaitable[T]]) -> T:
+        """
+        执行一个写入单元，返回它的结果（提交之后才返回）
+        协调器在跑就排队等它提交，db不会被用到（也就不占写连接）；没在跑就在db上执行并提交
+        """
+        if self.running:
+            return await self.submit(unit)
+        try:
+            result = await unit(db)
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+        return result
+
+    async def submit(self, unit: Callable[[AsyncSession], Awaitable[T]]) -> T:
+        """排队，等所在的那批提交；单元抛的异常原样抛给调用方。队列满了就在这里等"""
+        if not self.running:
+            raise RuntimeError("写入协调器没有启动")
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put(_Job(unit, future))
+        return await future
+
+    async def _run(self) -> None:
+        while True:
+            job = await self._queue.get()
+            if job is None:
+                return
+            if self.batch_window:
+                await asyncio.sleep(self.batch_window)
+            jobs = [job]
+            stopping = False
+            while len(jobs) < self.batch_max and not self._queue.empty():
+                job = self._queue.get_nowait()
+                if job is None:
+                    stopping = True
+                    break
+                jobs.append(job)
+            await self._execute(jobs)
+            if stopping:
+                return
+
+    async def _execute(self, jobs: List[_Job]) -> None:
+        """一批单元一个事务；单元自己的错误只回滚它自己的SAVEPOINT"""
+        started = time.perf_counter()
+        done: List[Tuple[_Job, Any]] = []
+        try:
+            async with self._session_factory() as db:
+                if db.bind.dialect.name == "sqlite":
+                    # pysqlite不会在SAVEPOINT前面自动BEGIN，不先开事务的话每个SAVEPOINT释放时就各自提交了
+                    await db.execute(text("BEGIN IMMEDIATE"))
+                for job in jobs:
+                    if job.future.done():  # 调用方已经不等了（比如客户端断开）
+                        continue
+                    try:
+                        async with db.begin_nested():
+                            result = await job.unit(db)
+                    except Exception as e:
+                        self.failed_units += 1
+                        job.future.set_exception(e)
+                        continue
+                    done.append((job, result))
+                await db.commit()
+        except Exception as e:
+            if len(done) > 1:
+                # 提交失败不知道是谁的错，拆开一个一个来
+                self.split_batches += 1
+                for job, _ in done:
+                    await self._execute([job])
+                return
+            # 连不上库、提交失败：这批还没给出结果的都报这个错
+            for job in jobs:
+                if not job.future.done():
+                    job.future.set_exception(e)
+                    self.failed_units += 1
+            return
+
+        self.batches += 1
+        self.units += len(done)
+        self.last_batch = len(done)
+        self.max_batch = max(self.max_batch, len(done))
+        self.commit_seconds += time.perf_counter() - started
+        for job, result in done:
+            if not job.future.done():
+                job.future.set_result(result)
+
+    def start(self, session_factory: async_sessionmaker[AsyncSession]) -> None:
+        """启动后台任务，lifespan里调用；session_factory要用写引擎"""
+        self._session_factory = session_factory
+        if self._task is None:
+            self._queue = asyncio.Queue(self.queue_max)
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        """把已经排队的写完再停，关机时调"""
+        if self._task is None:
+            return
+        await self._queue.put(None)
+        try:
+            await self._task
+        finally:
+            self._task = None
+            self._queue = None
+
+    def reset(self) -> None:
+        """清空统计（测试用）"""
+        self.batches = 0
+        self.units = 0
+        self.failed_units = 0
+        self.split_batches = 0
+        self.last_batch = 0
+        self.max_batch = 0
+        self.commit_seconds = 0.0
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "batches": self.batches,
+            "units": self.units,
+            "avg_batch": round(self.units / self.batches, 2) if self.batches else 0.0,
+            "last_batch": self.last_batch,
+            "max_batch": self.max_batch,
+            "failed_units": self.failed_units,
+            "split_batches": self.split_batches,
+            "avg_batch_ms": round(self.commit_seconds / self.batches * 1000, 2) if self.batches else 0.0,
+            "batch_max": self.batch_max,
+        }
+
+
+# 全局实例
+write_coordinator = WriteCoordinator(settings.WRITE_BATCH_MAX, settings.WRITE_BATCH_WINDOW, settings.WRITE_QUEUE_MAX)
@@ -0,0 +1,99 @@
+"""
+近似重复检测基准测试：算签名的吞吐 + 大库里查一次重复要多久
+库里灌N篇随机签名（签名表 + 16段键表，Core批量插入），再拿一批“改过几个位置”的签名（命中）
+和全新的签名（不命中）去查，看每次查询耗时和候选数。
+
+用法（在backend目录下）：
+    python -m benchmarks.bench_dedup --articles 1000000 --lookups 200
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+import numpy as np
+from sqlalchemy import event, insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.database import Base
+from app.dedup import NUM_PERM, band_keys, find_duplicate, fingerprint, signature_bytes
+from app.models import ArticleFingerprint, ArticleFingerprintBand
+
+_SENTENCE = "某公司发布了新一代人工智能模型，推理能力和多模态理解都有明显提升，开发者可以通过接口调用。"
+
+
+def _bench_fingerprint(rounds: int) -> None:
+    rng = np.random.default_rng(1)
+    chars = np.array(list(_SENTENCE))
+    docs = ["".join(rng.choice(chars, 1500)) for _ in range(rounds)]
+    start = time.perf_counter()
+    for doc in docs:
+        fingerprint("标题", doc)
+    elapsed = time.perf_counter() - start
+    print(f"fingerprint: 1500-char article, {elapsed / rounds * 1000:.3f} ms each, {rounds / elapsed:,.0f} articles/s")
+
+
+async def _fill(engine, signatures: np.ndarray, batch: int = 20000) -> None:
+    """签名和段键用Core批量插入"""
+    async with engine.begin() as conn:
+        for start in range(0, len(signatures), batch):
+            rows, band_rows = [], []
+            for i in range(start, min(start + batch, len(signatures))):
+                rows.append({"article_id": i + 1, "signature": signature_bytes(signatures[i])})
+                band_rows.extend({"key": key, "article_id": i + 1} for key in band_keys(signatures[i]))
+            await conn.execute(insert(ArticleFingerprint), rows)
+            await conn.execute(insert(ArticleFingerprintBand), band_rows)
+
+
+async def main(articles: int, lookups: int, rounds: int) -> None:
+    _bench_fingerprint(rounds)
+
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    rng = np.random.default_rng(2)
+    signatures = rng.integers(0, 2 ** 32, size=(articles, NUM_PERM), dtype=np.uint32)
+    start = time.perf_counter()
+    await _fill(engine, signatures)
+    print(f"filled {articles:,} signatures ({articles * 16:,} band rows) in {time.perf_counter() - start:.1f} s, "
+          f"db {os.path.getsize(path) / 1024 / 1024:,.0f} MB")
+
+    # 命中：拿库里的签名改几个位置（相似度约0.9）；不命中：全新的随机签名
+    near = signatures[rng.integers(0, articles, lookups)].copy()
+    for row in near:
+        row[rng.choice(NUM_PERM, 6, replace=False)] ^= 1
+    fresh = rng.integers(0, 2 ** 32, size=(lookups, NUM_PERM), dtype=np.uint32)
+
+    statements = []
+    event.listen(engine.sync_engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with factory() as db:
+        for name, queries in (("near-duplicate", near), ("unique", fresh)):
+            timings, hits = [], 0
+            statements.clear()
+            for signature in queries:
+                start = time.perf_counter()
+                match = await find_duplicate(db, signature)
+                timings.append((time.perf_counter() - start) * 1000)
+                hits += match is not None
+            print(
+                f"{name:>15}: {hits}/{len(queries)} matched, {len(statements) / len(queries):.0f} statement each, "
+                f"median {statistics.median(timings):.2f} ms, p95 {sorted(timings)[int(len(timings) * 0.95) - 1]:.2f} ms"
+            )
+
+    await engine.dispose()
+    os.unlink(path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--articles", type=int, default=100000)
+    parser.add_argument("--lookups", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=500)
+    args = parser.parse_args()
+    asyncio.run(main(args.articles, args.lookups, args.rounds))
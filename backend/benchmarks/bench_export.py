@@ -0,0 +1,96 @@
+"""
+全量导出基准测试：NDJSON流式导出的吞吐（行/秒、MB/秒）和内存峰值
+顺带对比老办法——/api/articles式的OFFSET翻页，翻到最后一页要多久。
+
+用法（在backend目录下）：
+    python -m benchmarks.bench_export --articles 100000 --body-kb 2
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from app.database import Base
+from app.export import export_query, ndjson_stream
+from app.models import Article, Category, Media, Tag, article_tag_table
+
+
+async def _fill(engine, articles: int, body_kb: int, batch: int = 10000) -> None:
+    """用Core批量插入灌数据"""
+    unit = "<p>人工智能大模型资讯，AI行业动态速递。</p>"
+    body = unit * max(1, body_kb * 1024 // len(unit.encode()))
+    now = datetime(2026, 1, 1)
+    async with engine.begin() as conn:
+        await conn.execute(insert(Category), [{"id": i, "name": f"分类{i}", "slug": f"cat-{i}"} for i in range(1, 6)])
+        await conn.execute(insert(Tag), [{"id": i, "name": f"标签{i}", "slug": f"tag-{i}"} for i in range(1, 31)])
+        for start in range(1, articles + 1, batch):
+            ids = range(start, min(start + batch, articles + 1))
+            await conn.execute(insert(Article), [
+                {
+                    "id": i, "title": f"文章标题{i}", "slug": f"article-{i}", "summary": f"摘要{i}", "content": body,
+                    "category_id": i % 5 + 1, "status": "published", "published_at": now + timedelta(minutes=i),
+                }
+                for i in ids
+            ])
+            await conn.execute(insert(article_tag_table), [
+                {"article_id": i, "tag_id": t} for i in ids for t in {i % 30 + 1, (i * 7) % 30 + 1}
+            ])
+            await conn.execute(insert(Media), [
+                {"article_id": i, "type": "image", "url": f"http://img/{i}.png", "order_index": 0} for i in ids if i % 2
+            ])
+
+
+async def _export(engine, batch_size: int) -> None:
+    tracemalloc.start()
+    rows = size = 0
+    start = time.perf_counter()
+    async for chunk in ndjson_stream(engine, export_query(), batch_size):
+        rows += chunk.count(b"\n")
+        size += len(chunk)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(
+        f"ndjson export (batch {batch_size}): {rows:,} rows, {size / 1024 / 1024:,.1f} MB in {elapsed:.2f} s -> "
+        f"{rows / elapsed:,.0f} rows/s, {size / 1024 / 1024 / elapsed:,.1f} MB/s, peak memory {peak / 1024 / 1024:.1f} MB"
+    )
+
+
+async def _offset_pages(engine, articles: int, page_size: int) -> None:
+    """OFFSET翻页：第一页和最后一页各查一次"""
+    async with AsyncSession(engine) as db:
+        for label, offset in (("first", 0), ("last", max(0, articles - page_size))):
+            start = time.perf_counter()
+            await db.execute(select(Article).order_by(Article.id).offset(offset).limit(page_size))
+            print(f"OFFSET paging, {label} page (offset {offset:,}): {(time.perf_counter() - start) * 1000:.1f} ms")
+
+
+async def main(articles: int, body_kb: int, batch_size: int) -> None:
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    await _fill(engine, articles, body_kb)
+    print(f"{articles:,} articles, {body_kb} KB body, db {os.path.getsize(path) / 1024 / 1024:,.0f} MB")
+
+    await _export(engine, batch_size)
+    await _offset_pages(engine, articles, 20)
+
+    await engine.dispose()
+    os.unlink(path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--articles", type=int, default=100000)
+    parser.add_argument("--body-kb", type=int, default=2)
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+    asyncio.run(main(args.articles, args.body_kb, args.batch_size))
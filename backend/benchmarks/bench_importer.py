@@ -0,0 +1,115 @@
+"""
+JSONL导入基准测试：生成N行文章（带标签、媒体，正文够长会算重复检测签名），灌进空库，看每秒多少行
+顺带和老办法比一下：同样的数据走 bulk_create_articles（ORM + 钩子，一块一个事务）。
+
+用法（在backend目录下）：
+    python -m benchmarks.bench_importer --articles 100000 --workers 4
+    python -m benchmarks.bench_importer --articles 1000000 --workers 8 --skip-bulk
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.database import Base
+from app.importer import _import_engine, import_file
+from app.ingest import bulk_create_articles
+from app.models import Article, Category
+
+_SENTENCES = [
+    "某公司发布了新一代人工智能模型，推理能力和多模态理解都有明显提升。",
+    "开发者可以通过接口调用，价格比上一代下降了一半。",
+    "多家云服务商宣布接入，企业客户下个月可以开始试用。",
+    "业内人士认为推理成本的下降比能力提升更值得关注。",
+    "国内厂商也在加快迭代节奏，开源社区反应积极。",
+]
+
+
+def _line(i: int, body_sentences: int) -> str:
+    body = "".join(_SENTENCES[(i + n) % len(_SENTENCES)] for n in range(body_sentences))
+    return json.dumps({
+        "title": f"AI资讯第{i}期：大模型动态速递",
+        "summary": f"第{i}期摘要",
+        "content": f"<p>编号{i}。{body}</p>",
+        "category_id": i % 5 + 1,
+        "tags": [f"标签{i % 50}", f"标签{i * 7 % 50}"],
+        "status": "draft" if i % 10 == 0 else "published",
+        "media_items": [{"type": "image", "url": f"http://img/{i}.png"}] if i % 3 == 0 else [],
+    }, ensure_ascii=False)
+
+
+async def _empty_db(path: str):
+    engine = _import_engine(f"sqlite+aiosqlite:///{path}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(insert(Category), [{"id": i, "name": f"分类{i}", "slug": f"cat-{i}"} for i in range(1, 6)])
+    return engine
+
+
+async def _bench_import(source: str, articles: int, batch_size: int, workers: int) -> None:
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    engine = await _empty_db(path)
+    start = time.perf_counter()
+    report = await import_file(
+        engine, source, batch_size=batch_size, workers=workers,
+        errors_path=f"{path}.errors.jsonl", restart=True,
+    )
+    elapsed = time.perf_counter() - start
+    print(
+        f"importer (batch {batch_size}, {workers} workers): {report.created:,} created, {report.error:,} errors "
+        f"in {elapsed:.1f} s -> {articles / elapsed:,.0f} rows/s "
+        f"(1M rows ~ {1_000_000 / (articles / elapsed) / 60:.1f} min), db {os.path.getsize(path) / 1024 / 1024:,.0f} MB"
+    )
+    await engine.dispose()
+    for leftover in (path, f"{path}.errors.jsonl"):
+        os.unlink(leftover)
+
+
+async def _bench_bulk(source: str, articles: int) -> None:
+    """老办法：读进来按BULK_MAX_ITEMS一组交给批量创建接口的实现"""
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    engine = await _empty_db(path)
+    start = time.perf_counter()
+    async with AsyncSession(engine, expire_on_commit=False) as db:
+        with open(source, encoding="utf-8") as f:
+            items = [json.loads(line) for line in f]
+        for n in range(0, len(items), settings.BULK_MAX_ITEMS):
+            await bulk_create_articles(db, items[n:n + settings.BULK_MAX_ITEMS], settings.BULK_CHUNK_SIZE)
+        count = (await db.execute(select(func.count()).select_from(Article))).scalar()
+    elapsed = time.perf_counter() - start
+    print(f"bulk_create_articles (chunk {settings.BULK_CHUNK_SIZE}): {count:,} created in {elapsed:.1f} s -> "
+          f"{articles / elapsed:,.0f} rows/s")
+    await engine.dispose()
+    os.unlink(path)
+
+
+async def main(articles: int, body_sentences: int, batch_size: int, workers: int, skip_bulk: bool) -> None:
+    fd, source = tempfile.mkstemp(suffix=".jsonl")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        for i in range(articles):
+            f.write(_line(i, body_sentences) + "\n")
+    print(f"{articles:,} lines, {os.path.getsize(source) / 1024 / 1024:,.0f} MB")
+
+    await _bench_import(source, articles, batch_size, workers)
+    if not skip_bulk:
+        await _bench_bulk(source, articles)
+    os.unlink(source)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--articles", type=int, default=100000)
+    parser.add_argument("--body-sentences", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--skip-bulk", action="store_true", help="不跑bulk_create_articles对比（它慢，大数据量时跳过）")
+    args = parser.parse_args()
+    asyncio.run(main(args.articles, args.body_sentences, args.batch_size, args.workers, args.skip_bulk))
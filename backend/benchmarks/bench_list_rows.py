@@ -0,0 +1,121 @@
+"""
+列表读取路径基准测试：select(Article) 整行ORM加载 vs 只查列表列的 ArticleListRow
+每篇文章正文50KB，对比一页列表读出来的字节数和耗时。
+
+用法（在backend目录下）：
+    python -m benchmarks.bench_list_rows --articles 2000 --page-size 20 --rounds 50
+"""
+import argparse
+import asyncio
+import os
+import sqlite3
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import desc, event, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.database import Base
+from app.listing import fetch_list_rows, list_row_query
+from app.models import Article, Category, Tag, article_tag_table
+
+
+async def _fill(engine, articles: int, body_kb: int) -> None:
+    """用Core批量插入灌数据，比一篇篇走ORM快得多"""
+    unit = "<p>人工智能大模型资讯，AI行业动态速递。</p>"
+    body = unit * (body_kb * 1024 // len(unit.encode()))
+    now = datetime(2026, 1, 1)
+    async with engine.begin() as conn:
+        await conn.execute(insert(Category), [{"id": i, "name": f"分类{i}", "slug": f"cat-{i}"} for i in range(1, 6)])
+        await conn.execute(insert(Tag), [{"id": i, "name": f"标签{i}", "slug": f"tag-{i}"} for i in range(1, 31)])
+        await conn.execute(insert(Article), [
+            {
+                "id": i, "title": f"文章标题{i}", "slug": f"article-{i}", "summary": f"摘要{i}", "content": body,
+                "category_id": i % 5 + 1, "status": "published", "views": i % 997,
+                "published_at": now + timedelta(minutes=i),
+            }
+            for i in range(1, articles + 1)
+        ])
+        await conn.execute(insert(article_tag_table), [
+            {"article_id": i, "tag_id": t} for i in range(1, articles + 1) for t in {i % 30 + 1, (i * 7) % 30 + 1}
+        ])
+
+
+class _Recorder:
+    """记下执行的SQL，事后用sqlite3重放一遍统计结果集字节数"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.executed = []
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.executed.append((statement, parameters))
+
+    def bytes_read(self) -> int:
+        conn = sqlite3.connect(self.path)
+        total = 0
+        for statement, parameters in self.executed:
+            for row in conn.execute(statement, parameters):
+                for value in row:
+                    if value is not None:
+                        total += len(value.encode()) if isinstance(value, str) else 8
+        conn.close()
+        return total
+
+
+async def _orm_page(db: AsyncSession, page_size: int) -> list:
+    """老路径：select(Article)，默认加载策略，再to_list_dict()"""
+    result = await db.execute(
+        select(Article).where(Article.status == "published").order_by(desc(Article.published_at)).limit(page_size)
+    )
+    return [a.to_list_dict() for a in result.scalars().all()]
+
+
+async def _row_page(db: AsyncSession, page_size: int) -> list:
+    """新路径：只查列表列"""
+    query = list_row_query().where(Article.status == "published").order_by(desc(Article.published_at)).limit(page_size)
+    return [a.to_list_dict() for a in await fetch_list_rows(db, query)]
+
+
+async def main(articles: int, page_size: int, rounds: int, body_kb: int) -> None:
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    await _fill(engine, articles, body_kb)
+    factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    print(f"{articles} articles, {body_kb} KB body, page_size={page_size}, rounds={rounds}")
+    for name, fn in (("select(Article)", _orm_page), ("ArticleListRow", _row_page)):
+        recorder = _Recorder(path)
+        event.listen(engine.sync_engine, "before_cursor_execute", recorder)
+        async with factory() as db:
+            await fn(db, page_size)
+        event.remove(engine.sync_engine, "before_cursor_execute", recorder)
+
+        timings = []
+        for _ in range(rounds):
+            async with factory() as db:
+                start = time.perf_counter()
+                await fn(db, page_size)
+                timings.append((time.perf_counter() - start) * 1000)
+        print(
+            f"{name:>16}: {len(recorder.executed)} statements, {recorder.bytes_read() / 1024:,.1f} KB read, "
+            f"median {statistics.median(timings):.2f} ms, p95 {sorted(timings)[int(len(timings) * 0.95) - 1]:.2f} ms"
+        )
+
+    await engine.dispose()
+    os.unlink(path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--articles", type=int, default=2000)
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=50)
+    parser.add_argument("--body-kb", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.articles, args.page_size, args.rounds, args.body_kb))
@@ -0,0 +1,167 @@
+"""
+搜索基准测试：合成中文语料上测分词/建索引吞吐和查询延迟
+语料是从常见AI资讯词里随机拼出来的中文标题和正文（夹着少量英文词），默认10万篇。
+- 分词：纯Python CJKTokenizer每秒能切多少篇
+- 建索引：rebuild_search_index全量重建（分词 + 写FTS5）每秒多少篇
+- 查询：/api/search同款路径（MATCH + bm25排序 + 一页列表行 + 高亮片段）的延迟，顺带对比老的LIKE
+
+用法（在backend目录下）：
+    python -m benchmarks.bench_search --articles 100000 --queries 200
+    python -m benchmarks.bench_search --dictionary words.txt   # 带词典分词
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app import search
+from app.database import Base
+from app.listing import hydrate_list_rows, list_row_query
+from app.models import Article
+from app.pagination import KeysetOrder, fetch_page
+from app.tokenizer import CJKTokenizer, load_dictionary
+
+WORDS = (
+    "人工智能 大模型 推理 训练 芯片 算力 开源 发布 融资 估值 机器人 自动驾驶 智能体 多模态 数据中心 "
+    "云计算 半导体 英伟达 创业公司 产品经理 用户增长 商业化 监管 政策 隐私 安全 视频生成 语音识别 "
+    "图像理解 搜索引擎 推荐系统 知识库 向量数据库 微调 蒸馏 量化 部署 边缘计算 手机厂商 操作系统 "
+    "编程助手 代码生成 教育 医疗 金融 电商 内容创作 版权 标注 评测 基准 排行榜 参数量 上下文 长文本 "
+    "幻觉 对齐 强化学习 开发者 生态 平台 接口 价格战 订阅 广告 硬件 传感器 激光雷达 新能源 出海"
+).split()
+ASCII_WORDS = "AI GPT OpenAI Transformer API GPU Agent RAG LLM Sora 36氪".split()
+FILLERS = "的 了 在 和 与 对 将 是 也 都 还 被 把 让 正在 已经 宣布 表示 认为 据悉".split()
+
+
+def sentence(rng: random.Random, words: int) -> str:
+    parts = []
+    for _ in range(words):
+        if rng.random() < 0.08:
+            parts.append(rng.choice(ASCII_WORDS))
+        else:
+            parts.append(rng.choice(WORDS))
+        if rng.random() < 0.5:
+            parts.append(rng.choice(FILLERS))
+    return "".join(parts) + "。"
+
+
+def _article(rng: random.Random, i: int, body_sentences: int) -> dict:
+    body = "".join(f"<p>{sentence(rng, 12)}</p>" for _ in range(body_sentences))
+    return {
+        "id": i, "title": sentence(rng, 4)[:-1], "slug": f"article-{i}", "summary": sentence(rng, 8),
+        "content": body, "status": "published", "views": rng.randrange(10000),
+        "published_at": datetime(2026, 1, 1) + timedelta(minutes=i),
+    }
+
+
+async def _fill(engine, articles: int, body_sentences: int, seed: int) -> float:
+    """Core批量插入（不走ORM钩子，所以不会顺带建索引），返回语料字符数（百万）"""
+    rng = random.Random(seed)
+    chars = 0
+    async with engine.begin() as conn:
+        for start in range(1, articles + 1, 5000):
+            batch = [_article(rng, i, body_sentences) for i in range(start, min(start + 5000, articles + 1))]
+            chars += sum(len(a["title"]) + len(a["summary"]) + len(a["content"]) for a in batch)
+            await conn.execute(insert(Article), batch)
+    return chars / 1e6
+
+
+def _percentiles(timings: list) -> str:
+    timings = sorted(timings)
+    return f"median {statistics.median(timings):.2f} ms, p95 {timings[int(len(timings) * 0.95) - 1]:.2f} ms"
+
+
+def _queries(rng: random.Random, n: int) -> list:
+    """一半单个词，一半两个词组合，少量英文"""
+    queries = []
+    for _ in range(n):
+        roll = rng.random()
+        if roll < 0.1:
+            queries.append(rng.choice(ASCII_WORDS))
+        elif roll < 0.55:
+            queries.append(rng.choice(WORDS))
+        else:
+            queries.append(f"{rng.choice(WORDS)} {rng.choice(WORDS)}")
+    return queries
+
+
+async def _fts_page(db: AsyncSession, keyword: str, page_size: int) -> int:
+    match = search.build_match_query(keyword)
+    hits = search.SearchHits(keyword, match)
+    rows, _ = await fetch_page(db, hits.page_query(), hits.order, page_size)
+    items = await hydrate_list_rows(db, rows)
+    await hits.highlights(db, [(item.id, item.title) for item in items])
+    return len(items)
+
+
+async def _like_page(db: AsyncSession, keyword: str, page_size: int) -> int:
+    like = f"%{keyword}%"
+    query = list_row_query().where(
+        Article.status == "published", Article.title.ilike(like) | Article.content.ilike(like)
+    )
+    order = KeysetOrder("latest", Article.published_at, Article.created_at, Article.id, nullable=[0])
+    rows, _ = await fetch_page(db, query, order, page_size)
+    return len(await hydrate_list_rows(db, rows))
+
+
+async def main(args: argparse.Namespace) -> None:
+    if args.dictionary:
+        search.tokenizer = CJKTokenizer(load_dictionary(args.dictionary))
+
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    million_chars = await _fill(engine, args.articles, args.body_sentences, args.seed)
+    factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    print(f"{args.articles} articles, {million_chars:.1f}M chars, dictionary={'yes' if args.dictionary else 'no'}")
+
+    # 纯分词
+    rng = random.Random(args.seed)
+    sample = [_article(rng, i, args.body_sentences) for i in range(min(args.articles, 5000))]
+    start = time.perf_counter()
+    for a in sample:
+        search.index_row(a["title"], a["summary"], "", a["content"])
+    elapsed = time.perf_counter() - start
+    print(f"    tokenize: {len(sample) / elapsed:,.0f} articles/s (strip_html + 4 columns)")
+
+    # 全量建索引
+    async with factory() as db:
+        start = time.perf_counter()
+        indexed = await search.rebuild_search_index(db, batch_size=1000)
+        elapsed = time.perf_counter() - start
+    print(f"       index: {indexed / elapsed:,.0f} articles/s ({indexed} articles in {elapsed:.1f} s)")
+
+    # 查询延迟
+    queries = _queries(random.Random(args.seed + 1), args.queries)
+    for name, fn, n in (("fts5", _fts_page, len(queries)), ("like", _like_page, min(len(queries), args.like_queries))):
+        timings = []
+        found = 0
+        for keyword in queries[:n]:
+            async with factory() as db:
+                start = time.perf_counter()
+                found += await fn(db, keyword, args.page_size) > 0
+                timings.append((time.perf_counter() - start) * 1000)
+        print(f"{name:>12}: {n} queries, {found} with hits, {_percentiles(timings)}")
+
+    await engine.dispose()
+    os.unlink(path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--articles", type=int, default=100_000)
+    parser.add_argument("--body-sentences", type=int, default=8)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--like-queries", type=int, default=20)
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--dictionary", default="")
+    parser.add_argument("--seed", type=int, default=42)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,97 @@
+"""
+响应序列化基准测试：一页列表（默认20篇）从行到响应bytes要多少微秒
+- 老路径：to_list_dict()手工isoformat -> PaginatedResponse -> jsonable_encoder -> json.dumps（Starlette的JSONResponse）
+- 新路径：预编译的list_item -> 普通字典 -> orjson
+另外单独比缓存命中时只渲染缓存里的字典（json.dumps vs orjson）。不碰数据库，行对象在内存里造好。
+
+用法（在backend目录下）：
+    python -m benchmarks.bench_serialization --page-size 20 --rounds 20000
+"""
+import argparse
+import json
+import statistics
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from fastapi.encoders import jsonable_encoder
+
+from app.fastjson import dumps, list_items, page_body
+from app.listing import ArticleListRow
+from app.schemas import PaginatedResponse
+
+
+def _rows(page_size: int) -> list:
+    now = datetime(2026, 1, 1, 8, 0, 0, 123456)
+    rows = []
+    for i in range(1, page_size + 1):
+        row = ArticleListRow(SimpleNamespace(
+            id=i, title=f"大模型资讯标题{i}，AI行业动态速递", slug=f"article-{i}", summary="摘要" * 40,
+            cover_image=f"https://example.com/cover/{i}.jpg", category_id=i % 5 + 1,
+            author_name="老王", author_avatar=None, views=i * 37,
+            published_at=now - timedelta(minutes=i), created_at=now - timedelta(minutes=i, seconds=30),
+        ))
+        row.category = {"id": i % 5 + 1, "name": f"分类{i % 5 + 1}", "slug": f"cat-{i % 5 + 1}"}
+        row.tags = [{"id": t, "name": f"标签{t}", "slug": f"tag-{t}"} for t in (i % 30 + 1, (i * 7) % 30 + 1)]
+        rows.append(row)
+    return rows
+
+
+def _starlette(content) -> bytes:
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def _old_page(rows: list) -> bytes:
+    page = PaginatedResponse(
+        items=[row.to_list_dict() for row in rows], total=1000, page=1, page_size=len(rows), total_pages=50,
+        next_cursor="cursor", has_more=True, count_strategy="exact",
+    )
+    return _starlette(jsonable_encoder(page))
+
+
+def _new_page(rows: list) -> bytes:
+    return dumps(page_body(
+        items=list_items(rows), total=1000, page=1, page_size=len(rows), total_pages=50,
+        next_cursor="cursor", has_more=True, count_strategy="exact",
+    ))
+
+
+def _measure(fn, arg, rounds: int, repeat: int = 5) -> float:
+    """跑repeat轮，取每轮平均的中位数，单位微秒"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(rounds):
+            fn(arg)
+        timings.append((time.perf_counter() - start) / rounds * 1e6)
+    return statistics.median(timings)
+
+
+def main(page_size: int, rounds: int) -> None:
+    rows = _rows(page_size)
+    assert json.loads(_old_page(rows)) == json.loads(_new_page(rows))
+    old_body = jsonable_encoder(PaginatedResponse(
+        items=[row.to_list_dict() for row in rows], total=1000, page=1, page_size=page_size, total_pages=50,
+    ))
+    new_body = page_body(items=list_items(rows), total=1000, page=1, page_size=page_size, total_pages=50)
+
+    print(f"page_size={page_size}, rounds={rounds}, {len(_new_page(rows)):,} bytes per page")
+    cases = [
+        ("miss  old: to_list_dict+pydantic+jsonable_encoder+json", _old_page, rows),
+        ("miss  new: list_item+orjson", _new_page, rows),
+        ("hit   old: json.dumps(cached dict)", _starlette, old_body),
+        ("hit   new: orjson(cached dict)", dumps, new_body),
+    ]
+    results = {name: _measure(fn, arg, rounds) for name, fn, arg in cases}
+    for name, us in results.items():
+        print(f"{name:<55} {us:8.1f} µs/page")
+    names = list(results)
+    print(f"speedup: miss {results[names[0]] / results[names[1]]:.1f}x, hit {results[names[2]] / results[names[3]]:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=20000)
+    args = parser.parse_args()
+    main(args.page_size, args.rounds)
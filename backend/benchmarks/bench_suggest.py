@@ -0,0 +1,82 @@
+"""
+搜索建议内存索引基准测试：内存占用和查询延迟
+标题和标签用bench_search同一套合成中文语料，纯内存，不建数据库。
+- 内存：tracemalloc统计建好后的索引占用（条目 + 倒排），折算成每10万标题
+- 查询：单字前缀、两字、中间词、多词、英文、查不到 几类关键词的延迟（微秒）
+
+用法（在backend目录下）：
+    python -m benchmarks.bench_suggest --titles 100000 --queries 2000
+"""
+import argparse
+import random
+import statistics
+import time
+import tracemalloc
+
+from app.suggest import SuggestionIndex
+
+from .bench_search import ASCII_WORDS, WORDS, sentence
+
+
+def _rows(titles: int, seed: int):
+    rng = random.Random(seed)
+    tags = WORDS[:30] + ASCII_WORDS
+    for i in range(1, titles + 1):
+        title = sentence(rng, 4)[:-1]
+        yield i, title, f"article-{i}", sentence(rng, 8), rng.randrange(10000), rng.sample(tags, 2)
+
+
+def _queries(rng: random.Random, n: int) -> dict:
+    """按类别生成关键词"""
+    def infix(word: str) -> str:
+        return word[1:] if len(word) > 2 else word
+
+    return {
+        "1 char": [rng.choice(rng.choice(WORDS)) for _ in range(n)],
+        "2 chars": [rng.choice(WORDS)[:2] for _ in range(n)],
+        "infix": [infix(rng.choice(WORDS)) for _ in range(n)],
+        "2 terms": [f"{rng.choice(WORDS)} {rng.choice(WORDS)}" for _ in range(n)],
+        "ascii": [rng.choice(ASCII_WORDS)[:3].lower() for _ in range(n)],
+        "no hit": [f"{rng.choice(WORDS)}不存在{rng.randrange(1000)}" for _ in range(n)],
+    }
+
+
+def main(titles: int, queries: int, limit: int, seed: int) -> None:
+    rows = list(_rows(titles, seed))
+
+    index = SuggestionIndex()
+    tracemalloc.start()
+    start = time.perf_counter()
+    index.load(rows)
+    build_seconds = time.perf_counter() - start
+    index.suggest("大")  # 第一次查询会排一次序，也算进内存
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    stats = index.stats()
+    per_100k = current / titles * 100_000 / 1024 / 1024
+    print(f"{titles} titles, {stats['grams']} grams, {stats['postings']} postings, built in {build_seconds:.2f} s")
+    print(f"memory: {current / 1024 / 1024:.1f} MB (peak {peak / 1024 / 1024:.1f} MB), {per_100k:.1f} MB per 100k titles")
+
+    for name, keywords in _queries(random.Random(seed + 1), queries).items():
+        timings = []
+        hits = 0
+        for keyword in keywords:
+            start = time.perf_counter()
+            hits += bool(index.suggest(keyword, limit))
+            timings.append((time.perf_counter() - start) * 1e6)
+        timings.sort()
+        print(
+            f"{name:>8}: {hits}/{len(keywords)} with hits, median {statistics.median(timings):.0f} us, "
+            f"p99 {timings[int(len(timings) * 0.99) - 1]:.0f} us, max {timings[-1]:.0f} us"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--titles", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--limit", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    main(args.titles, args.queries, args.limit, args.seed)
@@ -3,6 +3,7 @@ pytest配置和测试夹具
 老王说：写测试就像喝酒，准备工作必须到位！
 """
 import asyncio
+import re
 import pytest
 import tempfile
 import os
@@ -10,12 +11,21 @@ from pathlib import Path
 from typing import AsyncGenerator, Generator
 from datetime import datetime
 
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from httpx import AsyncClient, ASGITransport
 
 from app.main import app
 from app.models import Base, Article, Category, Tag, Media
-from app.database import get_db
+from app.database import get_db, get_read_db
+from app.view_counter import view_counter
+from app.suggest import suggestion_index
+from app.stats import stats_snapshot
+from app.idempotency import idempotency_store
+from app.ingest import tag_cache
+from app.response_cache import response_cache
+from app.singleflight import single_flight
+from app.conditional import revalidation
 
 
 # ========== 测试数据库配置 ==========
@@ -87,6 +97,8 @@ async def client(db_session: AsyncSession) -> AsyncGenerator[AsyncClient, None]:
 
     # 替换数据库依赖
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
+    response_cache.reset()
 
     async with AsyncClient(
         transport=ASGITransport(app=app),
@@ -94,8 +106,57 @@ async def client(db_session: AsyncSession) -> AsyncGenerator[AsyncClient, None]:
     ) as ac:
         yield ac
 
-    # 清理依赖覆盖
+    # 清理依赖覆盖和进程内的状态，别串到下一个测试
     app.dependency_overrides.clear()
+    view_counter.reset()
+    suggestion_index.reset()
+    stats_snapshot.reset()
+    tag_cache.reset()
+    idempotency_store.reset()
+    response_cache.reset()
+    single_flight.reset()
+    revalidation.reset()
+
+
+class QueryLog:
+    """记录引擎上执行过的SQL，用来卡接口的查询预算"""
+
+    def __init__(self):
+        self.statements: list[str] = []
+
+    def clear(self):
+        self.statements.clear()
+
+    def selects_column(self, column: str) -> bool:
+        """SELECT列表里有没有读某一列（WHERE里用到不算）"""
+        for sql in self.statements:
+            # 每个SELECT到紧跟着的FROM之间就是它的列表，子查询也算
+            for select_list in re.findall(r"SELECT\s(.*?)\sFROM\s", sql, flags=re.S):
+                if column in select_list:
+                    return True
+        return False
+
+
+@pytest.fixture(scope="function")
+def query_log(test_db_engine) -> Generator[QueryLog, None, None]:
+    """挂在测试引擎上的SQL记录器"""
+    log = QueryLog()
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        log.statements.append(statement)
+
+    event.listen(test_db_engine.sync_engine, "before_cursor_execute", record)
+    yield log
+    event.remove(test_db_engine.sync_engine, "before_cursor_execute", record)
+
+
+def assert_query_budget(log: QueryLog, max_statements: int, forbidden_columns: tuple = ("articles.content",)):
+    """断言语句数不超预算，并且没有SELECT不该读的列"""
+    assert len(log.statements) <= max_statements, (
+        f"执行了{len(log.statements)}条SQL，预算{max_statements}条:\n" + "\n".join(log.statements)
+    )
+    for column in forbidden_columns:
+        assert not log.selects_column(column), f"不该读取{column}:\n" + "\n".join(log.statements)
 
 
 # ========== 测试数据工厂 ==========
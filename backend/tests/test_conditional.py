@@ -0,0 +1,102 @@
+"""
+条件GET测试 - 老王说客户端手里的是新的就别再传一遍了，旧的也别骗人家说是新的！
+"""
+from datetime import timedelta
+from email.utils import format_datetime, parsedate_to_datetime
+
+import pytest
+from httpx import AsyncClient
+
+from app.config import settings
+from app.view_counter import view_counter
+
+from tests.conftest import assert_query_budget
+from tests.test_dedup import REPOST, STORY, _item
+
+
+@pytest.mark.api
+async def test_article_detail_revalidation(client: AsyncClient, test_article, query_log):
+    """测试详情没改过回304（一次索引查询、不带响应体、照样记浏览量），改过之后换ETag"""
+    response = await client.get(f"/api/articles/{test_article.slug}")
+    etag, last_modified = response.headers["ETag"], response.headers["Last-Modified"]
+    assert etag.startswith('W/"')
+
+    query_log.clear()
+    response = await client.get(f"/api/articles/{test_article.id}", headers={"If-None-Match": etag})
+    assert response.status_code == 304 and response.content == b""
+    assert response.headers["ETag"] == etag
+    assert_query_budget(query_log, 1)
+    assert "articles.updated_at" in query_log.statements[0] and "articles.content" not in query_log.statements[0]
+    assert view_counter.pending_for(test_article.id) == 2
+
+    # 多个ETag、强比较写法都认；If-None-Match不匹配时不看If-Modified-Since
+    headers = {"If-None-Match": f'"nope", {etag.removeprefix("W/")}'}
+    assert (await client.get(f"/api/articles/{test_article.id}", headers=headers)).status_code == 304
+    headers = {"If-None-Match": '"nope"', "If-Modified-Since": last_modified}
+    assert (await client.get(f"/api/articles/{test_article.id}", headers=headers)).status_code == 200
+    assert (await client.get(
+        f"/api/articles/{test_article.id}", headers={"If-Modified-Since": last_modified}
+    )).status_code == 304
+    earlier = format_datetime(parsedate_to_datetime(last_modified) - timedelta(seconds=1), usegmt=True)
+    assert (await client.get(
+        f"/api/articles/{test_article.id}", headers={"If-Modified-Since": earlier}
+    )).status_code == 200
+
+    await client.put(f"/api/articles/{test_article.id}", json={"title": "改过了"})
+    response = await client.get(f"/api/articles/{test_article.id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200 and response.headers["ETag"] != etag
+    assert response.json()["data"]["title"] == "改过了"
+
+    assert (await client.get("/api/articles/99999", headers={"If-None-Match": etag})).status_code == 404
+
+
+@pytest.mark.api
+async def test_collection_versions_follow_writes(client: AsyncClient, test_article, test_category, query_log):
+    """测试列表按标签版本号校验：只有受影响的列表换ETag，304只查一次版本表"""
+    urls = ["/api/articles", "/api/articles?category=test-category", "/api/categories", "/api/tags/popular"]
+    etags = {url: (await client.get(url)).headers["ETag"] for url in urls}
+    assert len(set(etags.values())) == len(urls)
+    assert (await client.get("/api/articles?page=2")).headers["ETag"] != etags["/api/articles"]
+
+    query_log.clear()
+    response = await client.get("/api/articles", headers={"If-None-Match": etags["/api/articles"]})
+    assert response.status_code == 304
+    assert response.headers["Cache-Control"].startswith("public, max-age=")
+    assert_query_budget(query_log, 1)
+    assert "cache_versions" in query_log.statements[0]
+
+    # 不带分类的新文章：总列表、热门标签变了，分类下的列表和分类列表没变
+    await client.post("/api/articles", json={"title": "新文章", "content": "x", "tags": ["新标签"]})
+    changed = {url for url in urls if (await client.get(url, headers={"If-None-Match": etags[url]})).status_code == 200}
+    assert changed == {"/api/articles", "/api/tags/popular"}
+
+    await client.post("/api/categories", json={"name": "新分类", "slug": "fresh"})
+    response = await client.get("/api/categories", headers={"If-None-Match": etags["/api/categories"]})
+    assert response.status_code == 200 and len(response.json()["data"]["items"]) == 2
+
+    await client.delete(f"/api/articles/{test_article.id}")
+    response = await client.get(
+        "/api/articles?category=test-category", headers={"If-None-Match": etags["/api/articles?category=test-category"]}
+    )
+    assert response.status_code == 200 and response.json()["total"] == 0
+
+    stats = (await client.get("/api/metrics")).json()["data"]["conditional"]
+    assert stats["checks"] == 7 and stats["not_modified"] == 3
+
+
+@pytest.mark.api
+async def test_merge_changes_detail_validator(client: AsyncClient, monkeypatch):
+    """测试重复稿合并只补了标签、媒体也换ETag；什么都没补的合并不换"""
+    original = (await client.post("/api/articles", json=_item("OpenAI发布新模型", STORY, summary="摘要"))).json()["data"]
+    etag = (await client.get(f"/api/articles/{original['id']}")).headers["ETag"]
+
+    monkeypatch.setattr(settings, "DEDUP_POLICY", "merge")
+    await client.post("/api/articles", json=_item("转载", REPOST, summary="摘要"))
+    assert (await client.get(f"/api/articles/{original['id']}", headers={"If-None-Match": etag})).status_code == 304
+
+    await client.post("/api/articles", json=_item(
+        "转载", REPOST, tags=["大模型"], media_items=[{"type": "image", "url": "http://img/gpt.png"}],
+    ))
+    response = await client.get(f"/api/articles/{original['id']}", headers={"If-None-Match": etag})
+    assert response.status_code == 200 and response.headers["ETag"] != etag
+    assert [t["name"] for t in response.json()["data"]["tags"]] == ["大模型"]
@@ -0,0 +1,103 @@
+"""
+计数表测试 - 老王说计数对不上比没有计数还坑人！
+"""
+import pytest
+from sqlalchemy import delete, select, update
+
+from app.models import Article, ArticleCounter, Tag
+from app.counters import backfill_counters, cached_count, popular_tags_query, rebuild_counters
+
+
+async def _all_counters(db_session) -> dict:
+    result = await db_session.execute(select(ArticleCounter))
+    return {(c.status, c.category_id, c.tag_id): c.count for c in result.scalars() if c.count}
+
+
+@pytest.mark.unit
+async def test_counters_follow_orm_writes(db_session, test_article, test_category, test_tag):
+    """测试通过ORM新建文章后计数表跟着变"""
+    assert await cached_count(db_session, "published") == 1
+    assert await cached_count(db_session, "published", test_category.slug) == 1
+    assert await cached_count(db_session, "published", test_category.slug, test_tag.slug) == 1
+    assert await cached_count(db_session, "published", tag_slug=test_tag.slug) == 1
+    assert await cached_count(db_session, "draft") == 0
+    assert await cached_count(db_session, "published", "no-such-category") == 0
+
+
+@pytest.mark.unit
+async def test_counters_status_and_tag_changes(db_session, test_article, test_tag):
+    """测试改状态、换标签、删文章时计数正确"""
+    other = Tag(name="另一个标签", slug="other-tag")
+    db_session.add(other)
+    test_article.status = "draft"
+    test_article.tags = [other]
+    await db_session.commit()
+
+    assert await cached_count(db_session, "published") == 0
+    assert await cached_count(db_session, "draft") == 1
+    assert await cached_count(db_session, "draft", tag_slug=test_tag.slug) == 0
+    assert await cached_count(db_session, "draft", tag_slug="other-tag") == 1
+
+    await db_session.delete(test_article)
+    await db_session.commit()
+    assert await _all_counters(db_session) == {}
+
+
+@pytest.mark.unit
+async def test_rebuild_counters(db_session, test_article, test_articles_batch):
+    """测试重建计数表和增量维护的结果一致"""
+    before = await _all_counters(db_session)
+    await rebuild_counters(db_session)
+    assert await _all_counters(db_session) == before
+    assert await cached_count(db_session, "published") == 26
+
+
+@pytest.mark.unit
+async def test_backfill_counters_on_startup(db_session, test_article, test_articles_batch, test_tag):
+    """测试老库（计数表空的）、只记了升级后增量的库启动时自动重建，对得上就不动"""
+    expected = await _all_counters(db_session)
+    assert not await backfill_counters(db_session)
+
+    await db_session.execute(delete(ArticleCounter))
+    await db_session.commit()
+    assert await backfill_counters(db_session)
+    assert await _all_counters(db_session) == expected
+
+    # 升级后才开始记增量：只有新写入的那几格
+    await db_session.execute(delete(ArticleCounter))
+    await db_session.execute(update(Article).where(Article.id == test_article.id).values(status="draft"))
+    await db_session.commit()
+    test_article.status = "published"
+    await db_session.commit()
+    result = await db_session.execute(popular_tags_query(10))
+    assert [(row.slug, row.article_count) for row in result] == [(test_tag.slug, 1)]
+    assert await backfill_counters(db_session)
+    assert await _all_counters(db_session) == expected
+
+
+@pytest.mark.unit
+async def test_popular_tags_from_counters(db_session, test_article, test_tag):
+    """测试热门标签按已发布文章数排，草稿不算，改状态/换标签/删文章跟着变"""
+    async def popular() -> list:
+        result = await db_session.execute(popular_tags_query(10))
+        return [(row.slug, row.article_count) for row in result]
+
+    hot = Tag(name="热门", slug="hot")
+    draft = Article(title="草稿", slug="draft-x", content="", status="draft", tags=[test_tag, hot])
+    second = Article(title="第二篇", slug="second-x", content="", status="published", tags=[hot])
+    third = Article(title="第三篇", slug="third-x", content="", status="published", tags=[hot])
+    db_session.add_all([hot, draft, second, third])
+    await db_session.commit()
+    assert await popular() == [("hot", 2), (test_tag.slug, 1)]
+
+    test_article.status = "draft"
+    third.tags = []
+    await db_session.commit()
+    assert await popular() == [("hot", 1)]
+
+    await db_session.delete(second)
+    await db_session.commit()
+    assert await popular() == []
+
+    await rebuild_counters(db_session)
+    assert await popular() == []
@@ -0,0 +1,58 @@
+"""
+读写分离测试 - 老王说GET接口别再占着写连接了！
+"""
+import asyncio
+
+import pytest
+from fastapi.routing import APIRoute
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from app.config import settings
+from app.database import get_db, get_read_db, make_engine
+from app.main import app
+
+
+@pytest.mark.unit
+async def test_reader_is_query_only_and_not_blocked_by_writer(tmp_path):
+    """测试写连接开WAL，读连接只读，写事务没提交时读连接照样能读到已提交的数据"""
+    url = f"sqlite+aiosqlite:///{tmp_path / 'split.db'}"
+    writer = make_engine(url, pool_size=1)
+    reader = make_engine(url, pool_size=2, readonly=True)
+    try:
+        async with writer.begin() as conn:
+            assert (await conn.execute(text("PRAGMA journal_mode"))).scalar() == "wal"
+            assert (await conn.execute(text("PRAGMA synchronous"))).scalar() == 1  # NORMAL
+            await conn.execute(text("CREATE TABLE t (n INTEGER)"))
+            await conn.execute(text("INSERT INTO t VALUES (1)"))
+
+        async with reader.connect() as conn:
+            assert (await conn.execute(text("PRAGMA query_only"))).scalar() == 1
+            assert (await conn.execute(text("PRAGMA mmap_size"))).scalar() == settings.SQLITE_MMAP_SIZE
+            with pytest.raises(OperationalError):
+                await conn.execute(text("INSERT INTO t VALUES (2)"))
+
+        async with writer.connect() as conn:
+            await conn.execute(text("INSERT INTO t VALUES (3)"))  # 写事务开着不提交
+            async with reader.connect() as read_conn:
+                rows = await asyncio.wait_for(read_conn.execute(text("SELECT n FROM t")), timeout=1)
+                assert rows.scalars().all() == [1]
+            await conn.commit()
+
+        assert writer.pool.size() == 1 and reader.pool.size() == 2
+    finally:
+        await writer.dispose()
+        await reader.dispose()
+
+
+@pytest.mark.unit
+def test_get_routes_use_read_sessions():
+    """测试所有GET接口都走只读Session，写接口走写Session"""
+    for route in app.routes:
+        if not isinstance(route, APIRoute):
+            continue
+        calls = {dep.call for dep in route.dependant.dependencies}
+        if "GET" in route.methods:
+            assert get_db not in calls, route.path
+        elif calls & {get_db, get_read_db}:
+            assert get_read_db not in calls, route.path
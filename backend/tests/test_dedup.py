@@ -0,0 +1,194 @@
+"""
+近似重复检测测试 - 老王说同一条新闻换个来源也别想再进一次库！
+"""
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import select
+
+from app.config import settings
+from app.dedup import BANDS, band_keys, find_duplicate, fingerprint, rebuild_fingerprints, similarity
+from app.models import Article, ArticleFingerprint, ArticleFingerprintBand
+
+from tests.conftest import assert_query_budget
+
+STORY = "".join(f"<p>{s}</p>" for s in (
+    "OpenAI今天发布了新一代大模型，推理能力比上一代提升明显，在数学和代码基准测试上全面领先。",
+    "官方表示新模型将首先向付费用户开放，企业版客户下个月可以通过接口调用，价格和上一代保持一致。",
+    "多家研究机构已经拿到测试资格，初步评测结果显示长文本理解和工具调用也有不少进步。",
+    "发布会上，公司首席执行官演示了模型自动编写网页、分析财报表格以及规划旅行路线的能力。",
+    "新模型的上下文窗口扩大到二十万个词元，可以一次读完一本中篇小说或者一整个代码仓库。",
+    "安全团队介绍，模型上线前经过了数月的红队测试，重点评估了生物、网络安全和说服力方面的风险。",
+    "业内人士认为，这次更新将进一步拉开头部厂商与追赶者之间的差距，国内厂商也在加快迭代节奏。",
+    "有分析师指出，推理成本的下降比能力提升更值得关注，这意味着更多中小企业可以负担得起大模型应用。",
+    "开发者社区的反应总体积极，不过也有人担心接口限流和数据隐私问题，希望官方尽快给出说明。",
+    "公司同时宣布将在年底前开放模型微调功能，并推出面向教育和医疗行业的专门版本。",
+))
+# 换个开头、改几个字，正文主体一样
+REPOST = STORY.replace("OpenAI今天", "据外媒报道，OpenAI今日").replace("下个月", "下月")
+OTHER = (
+    "<p>国内一家创业公司完成新一轮融资，资金将主要用于自动驾驶芯片研发和量产线建设，"
+    "公司创始人此前在多家头部车企负责感知算法团队，目前产品已经进入几家整车厂的供应链名单，"
+    "预计明年第二季度开始小批量交付，后续还会拓展到机器人和无人机等场景。</p>"
+)
+CHIP = (
+    "<p>某芯片厂商发布了面向数据中心的新一代推理加速卡，单卡显存提升到一百四十四吉字节，"
+    "能效比上一代提高了将近一倍，首批产品已经交付给几家云服务商，明年初全面上市。</p>"
+)
+ROBOT = (
+    "<p>一家机器人公司展示了能在仓库里自主分拣包裹的人形机器人，现场连续工作了八个小时没有出错，"
+    "公司计划今年在三个物流园区试点部署，并开放开发者平台让合作伙伴编写新的技能。</p>"
+)
+
+
+def _item(title: str, content: str, **extra) -> dict:
+    return {"title": title, "content": content, "status": "published", **extra}
+
+
+@pytest.mark.unit
+def test_minhash_near_and_far():
+    """测试换个开头改几个字的转载很像，不相关的不像，短文不算签名"""
+    a = fingerprint("OpenAI发布新模型", STORY)
+    b = fingerprint("外媒：OpenAI发布新模型", REPOST)
+    c = fingerprint("创业公司融资", OTHER)
+    assert similarity(a, fingerprint("OpenAI发布新模型", STORY)) == 1.0
+    assert similarity(a, b) >= settings.DEDUP_THRESHOLD
+    assert similarity(a, c) < 0.2
+    assert fingerprint("短", "<p>太短了</p>") is None
+    # 标点、空白、大小写、HTML标签不影响签名
+    assert similarity(a, fingerprint("openai 发布新模型！", f"<div>{STORY}</div>")) == 1.0
+
+    # 改了一段签名只影响那一段的键
+    keys = band_keys(a)
+    changed = a.copy()
+    changed[0] ^= 1
+    assert len(keys) == BANDS
+    assert [x == y for x, y in zip(keys, band_keys(changed))] == [False] + [True] * (BANDS - 1)
+
+
+@pytest.mark.api
+async def test_create_links_duplicate(client: AsyncClient, db_session, query_log, monkeypatch):
+    """测试link策略：重复稿照样入库但状态是duplicate，记下原文，查重只一条查询"""
+    monkeypatch.setattr(settings, "DEDUP_POLICY", "link")
+    original = (await client.post("/api/articles", json=_item("OpenAI发布新模型", STORY))).json()["data"]
+    assert "duplicate_of" not in original
+
+    query_log.clear()
+    response = await client.post("/api/articles", json=_item("外媒：OpenAI发布新模型", REPOST))
+    data = response.json()["data"]
+    assert response.status_code == 201
+    assert data["duplicate_of"] == original["id"]
+    assert data["status"] == "duplicate"
+    assert sum("FROM article_fingerprint_bands" in sql for sql in query_log.statements) == 1
+
+    # 重复的重复，归到最早那篇
+    third = (await client.post("/api/articles", json=_item("再转一次", REPOST + "。"))).json()["data"]
+    assert third["duplicate_of"] == original["id"]
+
+    listed = (await client.get("/api/articles")).json()["items"]
+    assert [a["id"] for a in listed] == [original["id"]]
+
+    other = (await client.post("/api/articles", json=_item("创业公司融资", OTHER))).json()["data"]
+    assert "duplicate_of" not in other
+
+
+@pytest.mark.api
+async def test_create_reject_and_merge(client: AsyncClient, monkeypatch):
+    """测试reject返回409；merge不建新文章，把新标签和媒体补到原文上"""
+    original = (await client.post("/api/articles", json=_item("OpenAI发布新模型", STORY, tags=["OpenAI"]))).json()["data"]
+
+    monkeypatch.setattr(settings, "DEDUP_POLICY", "reject")
+    response = await client.post("/api/articles", json=_item("转载", REPOST))
+    assert response.status_code == 409
+    assert str(original["id"]) in response.json()["message"]
+
+    monkeypatch.setattr(settings, "DEDUP_POLICY", "merge")
+    response = await client.post("/api/articles", json=_item(
+        "转载", REPOST, tags=["OpenAI", "大模型"], summary="新摘要",
+        media_items=[{"type": "image", "url": "http://img/gpt.png"}],
+    ))
+    data = response.json()["data"]
+    assert data["id"] == original["id"]
+    assert data["title"] == "OpenAI发布新模型"
+    assert {t["name"] for t in data["tags"]} == {"OpenAI", "大模型"}
+    assert data["summary"] == "新摘要"
+    assert [m["url"] for m in data["media_items"]] == ["http://img/gpt.png"]
+
+    monkeypatch.undo()  # 默认off：和以前一样照常创建
+    assert settings.DEDUP_POLICY == "off"
+    response = await client.post("/api/articles", json=_item("转载", REPOST))
+    assert "duplicate_of" not in response.json()["data"]
+    assert response.json()["data"]["status"] == "published"
+
+
+@pytest.mark.api
+async def test_bulk_dedup_policies(client: AsyncClient, db_session, monkeypatch):
+    """测试批量：库里的和同一块里的重复都能查出来，三种策略结果对"""
+    monkeypatch.setattr(settings, "DEDUP_POLICY", "link")
+    existing = (await client.post("/api/articles", json=_item("创业公司融资", OTHER))).json()["data"]
+
+    items = [
+        _item("OpenAI发布新模型", STORY),
+        _item("外媒：OpenAI发布新模型", REPOST, tags=["转载"]),
+        _item("融资转载", OTHER.replace("新一轮", "最新一轮")),
+    ]
+    data = (await client.post("/api/articles/bulk", json={"items": items})).json()["data"]
+    assert [r["status"] for r in data["items"]] == ["created", "created", "created"]
+    assert "duplicate_of" not in data["items"][0]
+    assert data["items"][1]["duplicate_of"] == data["items"][0]["id"]
+    assert data["items"][2]["duplicate_of"] == existing["id"]
+    story_id = data["items"][0]["id"]
+
+    monkeypatch.setattr(settings, "DEDUP_POLICY", "reject")
+    items = [_item("再来一次", REPOST + "！"), _item("全新", CHIP)]
+    data = (await client.post("/api/articles/bulk", json={"items": items})).json()["data"]
+    assert [r["status"] for r in data["items"]] == ["duplicate", "created"]
+    assert data["items"][0]["id"] == story_id
+
+    monkeypatch.setattr(settings, "DEDUP_POLICY", "merge")
+    fresh = ROBOT
+    items = [_item("新闻A", fresh), _item("新闻A转载", fresh + "。", tags=["补充"], cover_image="http://img/a.png")]
+    data = (await client.post("/api/articles/bulk", json={"items": items})).json()["data"]
+    assert [r["status"] for r in data["items"]] == ["created", "merged"]
+    assert data["merged"] == 1
+    assert data["items"][1]["id"] == data["items"][0]["id"]
+    merged = (await client.get(f"/api/articles/{data['items'][0]['id']}")).json()["data"]
+    assert [t["name"] for t in merged["tags"]] == ["补充"]
+    assert merged["cover_image"] == "http://img/a.png"
+
+
+@pytest.mark.unit
+async def test_fingerprints_maintained_and_rebuilt(db_session, query_log):
+    """测试改正文重算指纹、删原文解除关系、rebuild保留关系"""
+    a = Article(title="原文", slug="a", content=STORY)
+    b = Article(title="转载", slug="b", content=REPOST)
+    db_session.add_all([a, b])
+    await db_session.commit()
+    a_id, b_id = a.id, b.id
+
+    match = await find_duplicate(db_session, fingerprint("原文", STORY))
+    assert match.article_id == a.id and match.similarity == 1.0
+
+    query_log.clear()
+    await find_duplicate(db_session, fingerprint("原文", STORY))
+    assert_query_budget(query_log, 1)
+
+    row = await db_session.get(ArticleFingerprint, b.id)
+    row.duplicate_of = a.id
+    await db_session.commit()
+
+    assert await rebuild_fingerprints(db_session) == 2
+    db_session.expire_all()
+    assert (await db_session.get(ArticleFingerprint, b_id)).duplicate_of == a_id
+    await db_session.refresh(a)
+    await db_session.refresh(b)
+
+    b.content = OTHER
+    await db_session.commit()
+    assert (await find_duplicate(db_session, fingerprint("转载", REPOST))).article_id == a_id
+    assert (await find_duplicate(db_session, fingerprint("转载", OTHER))).article_id == b_id
+
+    b.content = "短"
+    await db_session.delete(a)
+    await db_session.commit()
+    assert (await db_session.execute(select(ArticleFingerprint.article_id))).scalars().all() == []
+    assert (await db_session.execute(select(ArticleFingerprintBand.key))).scalars().all() == []
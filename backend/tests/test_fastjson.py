@@ -0,0 +1,59 @@
+"""
+快速序列化测试 - 老王说换了序列化器，吐出来的JSON一个字都不能跟原来不一样！
+"""
+import json
+from datetime import datetime
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.fastjson import article_detail, dumps, envelope, list_items, loads
+from app.listing import fetch_list_rows, list_row_query
+from app.main import get_article_by_id_or_slug
+from app.models import Article
+from app.schemas import ApiResponse
+
+
+def _old_json(obj) -> bytes:
+    """原来的渲染方式（Starlette的JSONResponse）"""
+    return json.dumps(obj, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+@pytest.mark.unit
+async def test_serializers_match_to_dict(db_session: AsyncSession, test_article, test_articles_batch, test_media):
+    """测试预编译的序列化器和to_list_dict() / to_dict()输出逐字节一样（带微秒、不带微秒、空时间都有）"""
+    test_article.published_at = datetime(2024, 5, 6, 7, 8, 9, 123)
+    test_articles_batch[0].published_at = None
+    await db_session.commit()
+
+    rows = await fetch_list_rows(db_session, list_row_query().order_by(Article.id))
+    assert len(rows) == len(test_articles_batch) + 1
+    assert dumps(list_items(rows)) == _old_json([row.to_list_dict() for row in rows])
+
+    article = await get_article_by_id_or_slug(db_session, test_article.id)
+    assert article.media_items and article.tags and article.category
+    assert dumps(envelope(article_detail(article))) == _old_json(
+        ApiResponse(code=0, message="success", data=article.to_dict()).model_dump(mode="json")
+    )
+    assert loads(dumps(article_detail(article)))["published_at"] == "2024-05-06T07:08:09.000123"
+
+
+@pytest.mark.api
+async def test_fast_path_keeps_openapi(client: AsyncClient, test_article):
+    """测试列表、详情走orjson渲染，结构不变；OpenAPI里的响应模型照旧"""
+    response = await client.get("/api/articles")
+    assert response.headers["content-type"] == "application/json"
+    body = response.json()
+    assert list(body) == ["items", "total", "page", "page_size", "total_pages", "next_cursor", "has_more", "count_strategy"]
+    assert body["items"][0]["tags"][0]["slug"] == "test-tag"
+    assert response.content == (await client.get("/api/articles")).content  # 命中缓存的和现算的一样
+
+    detail = (await client.get(f"/api/articles/{test_article.id}")).json()
+    assert list(detail) == ["code", "message", "data"] and detail["data"]["category"]["slug"] == "test-category"
+
+    spec = (await client.get("/api/openapi.json")).json()
+    schema = lambda path: spec["paths"][path]["get"]["responses"]["200"]["content"]["application/json"]["schema"]  # noqa: E731
+    assert schema("/api/articles") == {"$ref": "#/components/schemas/PaginatedResponse"}
+    assert schema("/api/articles/{id_or_slug}") == {"$ref": "#/components/schemas/ApiResponse"}
+    assert "next_cursor" in spec["components"]["schemas"]["PaginatedResponse"]["properties"]
@@ -0,0 +1,100 @@
+"""
+幂等创建测试 - 老王说n8n重试一百遍也只能有一篇！
+"""
+import asyncio
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import func, select
+
+from app.idempotency import IdempotencyStore, idempotency_store
+from app.models import Article
+
+
+def _item(title: str, **extra) -> dict:
+    return {"title": title, "content": "<p>正文</p>", **extra}
+
+
+@pytest.mark.unit
+async def test_store_ttl_lru_and_inflight():
+    """测试过期、容量淘汰、同键并发只执行一次、失败不记"""
+    store = IdempotencyStore(max_size=2, ttl=0.05)
+    store.put("a", 201, {"n": 1})
+    assert store.get("a") == (201, {"n": 1})
+    await asyncio.sleep(0.06)
+    assert store.get("a") is None
+
+    store.ttl = 60
+    for key in "abc":
+        store.put(key, 201, {"key": key})
+    assert store.get("a") is None and store.get("c") == (201, {"key": "c"})
+    assert store.stats()["evictions"] == 1
+
+    calls = []
+
+    async def produce():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return 201, {"id": len(calls)}
+
+    results = await asyncio.gather(*(store.run(["x"], produce) for _ in range(5)))
+    assert len(calls) == 1
+    assert [r[1] for r in results] == [{"id": 1}] * 5
+    assert [r[2] for r in results] == [False, True, True, True, True]
+
+    async def fail():
+        return 400, {"message": "坏了"}
+
+    assert await store.run(["y"], fail) == (400, {"message": "坏了"}, False)
+    assert store.get("y") is None
+
+
+@pytest.mark.api
+async def test_create_replays_by_header(client: AsyncClient, db_session, query_log):
+    """测试同一个Idempotency-Key重试：原样返回第一次的响应，一条SQL都不发"""
+    headers = {"Idempotency-Key": "n8n-run-42"}
+    first = await client.post("/api/articles", json=_item("重试", tags=["AI"]), headers=headers)
+    assert first.status_code == 201
+    assert "Idempotent-Replayed" not in first.headers
+
+    query_log.clear()
+    again = await client.post("/api/articles", json=_item("重试", tags=["AI"]), headers=headers)
+    assert again.status_code == 201
+    assert again.headers["Idempotent-Replayed"] == "true"
+    assert again.json() == first.json()
+    assert query_log.statements == []
+
+    # 换个键就是新请求
+    other = await client.post("/api/articles", json=_item("重试"), headers={"Idempotency-Key": "n8n-run-43"})
+    assert other.json()["data"]["slug"] == "重试-1"
+    # 批量接口的键和单篇的分开算
+    bulk = await client.post("/api/articles/bulk", json={"items": [_item("批量")]}, headers=headers)
+    assert bulk.json()["data"]["created"] == 1
+    assert (await db_session.execute(select(func.count()).select_from(Article))).scalar() == 3
+
+
+@pytest.mark.api
+async def test_create_replays_by_original_url(client: AsyncClient, db_session):
+    """测试同一个original_url推两次只建一篇；并发重试也只建一篇；失败的不记"""
+    url = "https://36kr.com/p/3638686789454983?f=rss"
+    first = await client.post("/api/articles", json=_item("36氪快讯", original_url=url))
+    again = await client.post("/api/articles", json=_item("36氪快讯（更新）", original_url=url))
+    assert again.json() == first.json()
+
+    responses = await asyncio.gather(*(
+        client.post("/api/articles", json=_item("并发", original_url="https://example.com/a")) for _ in range(4)
+    ))
+    assert len({r.json()["data"]["id"] for r in responses}) == 1
+    assert idempotency_store.stats()["waits"] + idempotency_store.stats()["hits"] >= 3
+
+    bad = await client.post("/api/articles", json=_item("坏", category_id=999, original_url="https://example.com/b"))
+    assert bad.status_code == 400
+    good = await client.post("/api/articles", json=_item("好", original_url="https://example.com/b"))
+    assert good.status_code == 201
+
+    # 批量里单篇推过的链接直接报duplicate
+    items = [_item("36氪快讯", original_url=url), _item("新的", original_url="https://example.com/c")]
+    data = (await client.post("/api/articles/bulk", json={"items": items})).json()["data"]
+    assert [r["status"] for r in data["items"]] == ["duplicate", "created"]
+    assert data["items"][0]["id"] == first.json()["data"]["id"]
+    assert (await db_session.execute(select(func.count()).select_from(Article))).scalar() == 4
@@ -0,0 +1,202 @@
+"""
+批量入库测试 - 老王说一篇坏了不能把整批都带沟里！
+"""
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app import ingest
+from app.counters import cached_count
+from app.ingest import tag_cache
+from app.models import Article, Tag
+
+from tests.conftest import assert_query_budget
+
+
+def _item(title: str, **extra) -> dict:
+    return {"title": title, "content": "<p>正文</p>", **extra}
+
+
+@pytest.mark.api
+async def test_bulk_create_articles(client: AsyncClient, db_session, test_article, test_category, test_tag):
+    """测试批量创建：slug自动编号、标签复用和新建、媒体、计数表都对"""
+    items = [
+        _item("测试文章", tags=[test_tag.name, "新标签"], category_id=test_category.id,
+              media_items=[{"type": "image", "url": "http://img/1.png"}]),
+        _item("测试文章", tags=["新标签", " 新标签 ", ""]),
+        _item("全新标题", slug="brand-new", status="draft"),
+    ]
+    response = await client.post("/api/articles/bulk", json={"items": items})
+    assert response.status_code == 200
+    data = response.json()["data"]
+    assert (data["created"], data["duplicate"], data["error"]) == (3, 0, 0)
+    assert [r["slug"] for r in data["items"]] == ["测试文章", "测试文章-1", "brand-new"]
+    assert [r["index"] for r in data["items"]] == [0, 1, 2]
+
+    first = (await client.get(f"/api/articles/{data['items'][0]['id']}")).json()["data"]
+    assert [t["name"] for t in first["tags"]] == [test_tag.name, "新标签"]
+    assert first["media_items"][0]["url"] == "http://img/1.png"
+    assert (await db_session.execute(select(func.count()).where(Tag.name == "新标签"))).scalar() == 1
+
+    assert await cached_count(db_session, "published") == 3
+    assert await cached_count(db_session, "published", tag_slug=test_tag.slug) == 2
+    assert await cached_count(db_session, "draft") == 1
+
+
+@pytest.mark.api
+async def test_bulk_reports_per_item_results(client: AsyncClient, test_article):
+    """测试重复slug、校验失败、分类不存在只影响那一项"""
+    items = [
+        _item("一", slug=test_article.slug),
+        _item("二", slug="twin"),
+        _item("三", slug="twin"),
+        {"title": "没有正文"},
+        _item("四", category_id=99999),
+        _item("五"),
+    ]
+    data = (await client.post("/api/articles/bulk", json={"items": items, "chunk_size": 2})).json()["data"]
+    statuses = [r["status"] for r in data["items"]]
+    assert statuses == ["duplicate", "created", "duplicate", "error", "error", "created"]
+    assert data["items"][0]["id"] == test_article.id
+    assert "content" in data["items"][3]["error"]
+    assert data["items"][4]["error"] == "分类不存在"
+    assert (data["created"], data["duplicate"], data["error"]) == (2, 2, 2)
+
+    response = await client.post("/api/articles/bulk", json={"items": []})
+    assert response.status_code == 422
+
+
+@pytest.mark.api
+async def test_bulk_chunk_failure_retries_items(client: AsyncClient, test_db_engine, db_session, monkeypatch):
+    """测试分好slug之后被并发写入抢了，整块回滚逐篇重试，只有撞车那篇报重复"""
+    assign = ingest.assign_slugs
+    raced = []
+
+    async def assign_then_race(db, entries):
+        slugs = await assign(db, entries)
+        if not raced:
+            raced.append(True)
+            factory = async_sessionmaker(test_db_engine, class_=AsyncSession, expire_on_commit=False)
+            async with factory() as other:
+                other.add(Article(title="抢先", slug="contested", content="x", status="published"))
+                await other.commit()
+        return slugs
+
+    monkeypatch.setattr(ingest, "assign_slugs", assign_then_race)
+    items = [_item("甲", slug="jia", tags=["并发"]), _item("乙", slug="contested"), _item("丙", slug="bing", tags=["并发"])]
+    data = (await client.post("/api/articles/bulk", json={"items": items})).json()["data"]
+    assert [r["status"] for r in data["items"]] == ["created", "duplicate", "created"]
+    assert (await db_session.execute(select(func.count()).where(Tag.name == "并发"))).scalar() == 1
+
+
+@pytest.mark.api
+async def test_bulk_non_integrity_errors_reported_per_item(client: AsyncClient, db_session, monkeypatch):
+    """测试别的错误（标签建不出来、锁等超时）也是整块回滚逐篇重试，坏的那篇报error，前后的块照常入库"""
+    resolve = ingest.resolve_tags
+
+    async def flaky_resolve(db, names):
+        names = list(names)
+        if "坏标签" in names:
+            raise RuntimeError("标签创建失败: ['坏标签']")
+        return await resolve(db, names)
+
+    monkeypatch.setattr(ingest, "resolve_tags", flaky_resolve)
+    items = [_item("甲"), _item("乙"), _item("丙", tags=["坏标签"]), _item("丁", tags=["好标签"])]
+    response = await client.post("/api/articles/bulk", json={"items": items, "chunk_size": 2})
+    assert response.status_code == 200
+    data = response.json()["data"]
+    assert [r["status"] for r in data["items"]] == ["created", "created", "error", "created"]
+    assert data["items"][2]["error"] == "标签创建失败: ['坏标签']"
+    assert data["created"] == 3 and data["error"] == 1
+    assert (await db_session.execute(select(func.count()).select_from(Article))).scalar() == 3
+
+
+@pytest.mark.api
+async def test_bulk_query_budget(client: AsyncClient, test_category, query_log):
+    """测试解析slug/标签/分类的查询数不随篇数涨"""
+    async def selects_for(n: int) -> int:
+        items = [
+            _item(f"批量{i % 3}", category_id=test_category.id, tags=["甲", "乙", f"丙{i % 4}"],
+                  media_items=[{"url": f"http://img/{i}.png"}])
+            for i in range(n)
+        ]
+        query_log.clear()
+        data = (await client.post("/api/articles/bulk", json={"items": items})).json()["data"]
+        assert data["created"] == n
+        assert_query_budget(query_log, 4 * n + 20)
+        return sum(sql.lstrip().startswith("SELECT") for sql in query_log.statements)
+
+    few = await selects_for(10)
+    assert await selects_for(40) <= few
+
+
+@pytest.mark.api
+async def test_tags_resolved_in_batch_and_cached(client: AsyncClient, test_tag, query_log):
+    """测试标签一批解析：已有的一条IN，新的一条upsert，提交后进缓存，再用就不查标签表"""
+    query_log.clear()
+    response = await client.post(
+        "/api/articles", json=_item("打标签", tags=[test_tag.name, "新一", "新二", "新一"])
+    )
+    assert [t["name"] for t in response.json()["data"]["tags"]] == [test_tag.name, "新一", "新二"]
+    tag_sql = [sql for sql in query_log.statements if "FROM tags \nWHERE" in sql or "INTO tags" in sql]
+    assert len(tag_sql) == 4  # IN查名字 + 查slug占用 + INSERT ON CONFLICT + IN查回
+    assert tag_cache.stats()["size"] == 3
+
+    article_id = response.json()["data"]["id"]
+    query_log.clear()
+    response = await client.put(f"/api/articles/{article_id}", json={"tags": ["新二", test_tag.name]})
+    assert {t["name"] for t in response.json()["data"]["tags"]} == {"新二", test_tag.name}
+    assert not any("tags.name IN" in sql or "INTO tags" in sql for sql in query_log.statements)
+    assert tag_cache.stats()["hits"] == 2
+
+
+@pytest.mark.unit
+async def test_tag_resolution_races_and_invalidation(test_db_engine, db_session, monkeypatch):
+    """测试别人抢先建了同名标签就用别人的；回滚的不进缓存；改名作废缓存"""
+    free_slugs = ingest._free_slugs
+
+    async def free_slugs_then_race(db, names):
+        slugs = await free_slugs(db, names)
+        factory = async_sessionmaker(test_db_engine, class_=AsyncSession, expire_on_commit=False)
+        async with factory() as other:
+            other.add(Tag(name="抢", slug="qiang"))
+            await other.commit()
+        return slugs
+
+    monkeypatch.setattr(ingest, "_free_slugs", free_slugs_then_race)
+    tags = await ingest.get_or_create_tags(db_session, ["抢", "不抢"])
+    monkeypatch.undo()
+    assert [t.slug for t in tags] == ["qiang", "不抢"]
+    await db_session.rollback()
+    assert tag_cache.get("抢") is None
+
+    tags = await ingest.get_or_create_tags(db_session, ["抢"])
+    await db_session.commit()
+    assert tag_cache.get("抢") == (tags[0].id, "qiang")
+
+    tags[0].name = "抢到了"
+    await db_session.commit()
+    assert tag_cache.get("抢") is None
+    tag_cache.reset()
+
+
+@pytest.mark.unit
+async def test_failed_flush_evicts_cached_tags(db_session):
+    """测试用了缓存里的标签、后面flush失败回滚（SAVEPOINT也算）的，那个标签从缓存里作废"""
+    tag = (await ingest.get_or_create_tags(db_session, ["缓存的"]))[0]
+    db_session.add(Article(title="占位", slug="taken", content=""))
+    await db_session.commit()
+    assert tag_cache.get("缓存的") == (tag.id, tag.slug)
+
+    with pytest.raises(Exception, match="UNIQUE"):
+        async with db_session.begin_nested():
+            tags = await ingest.get_or_create_tags(db_session, ["缓存的"])
+            db_session.add(Article(title="撞了", slug="taken", content="", tags=tags))
+            await db_session.flush()
+    assert tag_cache.get("缓存的") is None
+
+    assert (await ingest.get_or_create_tags(db_session, ["缓存的"]))[0].id == tag.id
+    await db_session.commit()
+    assert tag_cache.get("缓存的") == (tag.id, tag.slug)
+    tag_cache.reset()
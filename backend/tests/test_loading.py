@@ -0,0 +1,102 @@
+"""
+读接口查询预算测试 - 老王说多一条SQL、多读一个content都得给我报出来！
+"""
+import pytest
+from httpx import AsyncClient
+
+from app.related import rebuild_related
+from tests.conftest import assert_query_budget
+
+
+@pytest.fixture
+async def loaded_db(test_articles_batch, test_article, test_media):
+    """25篇同分类文章 + 1篇带标签和媒体的文章"""
+    return test_article
+
+
+@pytest.mark.api
+async def test_list_articles_budget(client: AsyncClient, loaded_db, query_log):
+    """文章列表：版本号（ETag） + 计数 + 一页 + 分类 + 标签，不读content"""
+    query_log.clear()
+    response = await client.get("/api/articles?page_size=20")
+    assert response.status_code == 200
+    assert len(response.json()["items"]) == 20
+    assert_query_budget(query_log, 5)
+
+
+@pytest.mark.api
+async def test_article_detail_budget(client: AsyncClient, loaded_db, query_log):
+    """文章详情：文章 + 分类 + 标签 + 媒体"""
+    query_log.clear()
+    response = await client.get(f"/api/articles/{loaded_db.id}")
+    data = response.json()["data"]
+    assert data["content"]
+    assert len(data["media_items"]) == 1
+    assert_query_budget(query_log, 4, forbidden_columns=())
+    # 分类只要引用字段，不能把分类下的文章也带出来
+    assert not any("FROM articles" in sql and "articles.category_id IN" in sql for sql in query_log.statements)
+
+
+@pytest.mark.api
+async def test_popular_tags_budget(client: AsyncClient, loaded_db, query_log):
+    """热门标签只查版本号、计数表和标签表，不碰文章表"""
+    query_log.clear()
+    response = await client.get("/api/tags/popular")
+    assert len(response.json()["data"]["items"]) == 1
+    assert_query_budget(query_log, 2)
+    assert not any("articles" in sql.split("FROM", 1)[-1] for sql in query_log.statements)
+
+
+@pytest.mark.api
+async def test_list_categories_budget(client: AsyncClient, loaded_db, query_log):
+    """分类列表只查版本号和分类表"""
+    query_log.clear()
+    response = await client.get("/api/categories")
+    assert len(response.json()["data"]["items"]) == 1
+    assert_query_budget(query_log, 2)
+    assert not any("FROM articles" in sql for sql in query_log.statements)
+
+
+@pytest.mark.api
+async def test_category_hot_budget(client: AsyncClient, loaded_db, test_category, query_log):
+    """分类热门：版本号 + 分类 + 一页 + 分类引用 + 标签"""
+    query_log.clear()
+    response = await client.get(f"/api/categories/{test_category.slug}/hot?limit=10")
+    assert len(response.json()["data"]["items"]) == 10
+    assert_query_budget(query_log, 5)
+
+
+@pytest.mark.api
+async def test_related_articles_budget(client: AsyncClient, db_session, loaded_db, query_log):
+    """相关推荐：算好了就是 相关表 + 分类 + 标签；没算过退回现查，都不读content"""
+    query_log.clear()
+    response = await client.get(f"/api/articles/{loaded_db.id}/related")
+    assert response.status_code == 200
+    assert len(response.json()["data"]["by_category"]) == 6
+    assert_query_budget(query_log, 9)
+
+    await rebuild_related(db_session)
+    query_log.clear()
+    response = await client.get(f"/api/articles/{loaded_db.id}/related")
+    assert len(response.json()["data"]["similar"]) == 6
+    assert_query_budget(query_log, 3)
+
+
+@pytest.mark.api
+async def test_stats_and_search_never_select_content(client: AsyncClient, loaded_db, query_log):
+    """统计和搜索：content只能出现在WHERE里，不能出现在SELECT里"""
+    query_log.clear()
+    await client.get("/api/stats")
+    await client.get("/api/search?q=测试")
+    await client.get("/api/search/articles?q=测试")
+    assert_query_budget(query_log, 20)
+
+
+@pytest.mark.unit
+async def test_list_row_matches_orm_shape(db_session, test_article):
+    """列表行和ORM的to_list_dict输出完全一致"""
+    from app.listing import fetch_list_rows, list_row_query
+    from app.models import Article
+
+    rows = await fetch_list_rows(db_session, list_row_query().where(Article.id == test_article.id))
+    assert [r.to_list_dict() for r in rows] == [test_article.to_list_dict()]
@@ -434,3 +434,115 @@ async def test_get_stats(client: AsyncClient, test_article):
     assert data["data"]["category_count"] == 1
     assert data["data"]["tag_count"] == 1
     assert "total_views" in data["data"]
+
+
+# ========== 游标分页测试 ==========
+@pytest.mark.api
+async def test_list_articles_cursor(client: AsyncClient, test_articles_batch):
+    """测试游标翻页和OFFSET翻页结果一致"""
+    response = await client.get("/api/articles?page_size=10")
+    data = response.json()
+    assert data["next_cursor"]
+
+    seen = [a["id"] for a in data["items"]]
+    cursor = data["next_cursor"]
+    while cursor:
+        response = await client.get(f"/api/articles?page_size=10&cursor={cursor}")
+        assert response.status_code == 200
+        data = response.json()
+        seen.extend(a["id"] for a in data["items"])
+        cursor = data["next_cursor"]
+
+    offset_ids = []
+    for page in range(1, 4):
+        response = await client.get(f"/api/articles?page={page}&page_size=10")
+        offset_ids.extend(a["id"] for a in response.json()["items"])
+
+    assert len(seen) == 25
+    assert seen == offset_ids
+
+
+@pytest.mark.api
+async def test_list_articles_cursor_with_filter(client: AsyncClient, test_article, test_category, test_tag):
+    """测试游标分页配合分类和标签筛选"""
+    response = await client.get(f"/api/articles?category={test_category.slug}&tag={test_tag.slug}&page_size=1")
+    data = response.json()
+    assert len(data["items"]) == 1
+    assert data["next_cursor"] is None
+
+
+@pytest.mark.api
+async def test_list_articles_invalid_cursor(client: AsyncClient):
+    """测试非法游标返回400"""
+    response = await client.get("/api/articles?cursor=abc")
+    assert response.status_code == 400
+
+
+@pytest.mark.api
+async def test_category_hot_cursor(client: AsyncClient, test_articles_batch, test_category):
+    """测试分类热门文章游标翻页"""
+    response = await client.get(f"/api/categories/{test_category.slug}/hot?limit=10")
+    data = response.json()["data"]
+    seen = [a["id"] for a in data["items"]]
+    cursor = data["next_cursor"]
+    while cursor:
+        response = await client.get(f"/api/categories/{test_category.slug}/hot?limit=10&cursor={cursor}")
+        data = response.json()["data"]
+        seen.extend(a["id"] for a in data["items"])
+        cursor = data["next_cursor"]
+    assert sorted(seen) == sorted(a.id for a in test_articles_batch)
+
+
+@pytest.mark.api
+async def test_search_articles_cursor(client: AsyncClient, test_articles_batch):
+    """测试搜索接口游标翻页"""
+    response = await client.get("/api/search?q=测试文章&page_size=20")
+    data = response.json()["data"]
+    assert data["total"] == 25
+    response = await client.get(f"/api/search?q=测试文章&page_size=20&cursor={data['next_cursor']}")
+    data = response.json()["data"]
+    assert len(data["items"]) == 5
+    assert data["next_cursor"] is None
+
+
+# ========== 计数策略测试 ==========
+@pytest.mark.api
+async def test_list_articles_count_strategies(client: AsyncClient, test_articles_batch):
+    """测试三种计数策略"""
+    response = await client.get("/api/articles?page_size=10&count=exact")
+    data = response.json()
+    assert data["total"] == 25
+    assert data["count_strategy"] == "exact"
+
+    response = await client.get("/api/articles?page_size=10&count=cached")
+    data = response.json()
+    assert data["total"] == 25
+    assert data["count_strategy"] == "cached"
+
+    # has_more不计数，total只是下界
+    response = await client.get("/api/articles?page=2&page_size=10&count=has_more")
+    data = response.json()
+    assert data["has_more"] is True
+    assert data["total"] == 21
+    assert data["count_strategy"] == "has_more"
+
+    response = await client.get("/api/articles?page=3&page_size=10&count=has_more")
+    data = response.json()
+    assert data["has_more"] is False
+    assert data["total"] == 25
+
+
+@pytest.mark.api
+async def test_list_articles_invalid_count(client: AsyncClient):
+    """测试非法计数策略"""
+    response = await client.get("/api/articles?count=guess")
+    assert response.status_code == 400
+
+
+@pytest.mark.api
+async def test_search_articles_count_strategy(client: AsyncClient, test_articles_batch):
+    """测试搜索接口cached退回exact"""
+    response = await client.get("/api/search?q=测试文章&count=cached")
+    data = response.json()["data"]
+    assert data["total"] == 25
+    assert data["count_strategy"] == "exact"
@@ -0,0 +1,59 @@
+"""
+游标分页测试 - 老王说翻页翻丢一条都不行！
+"""
+import pytest
+from datetime import datetime, timedelta
+
+from app.models import Article
+from app.pagination import KeysetOrder, InvalidCursorError, encode_cursor, decode_cursor, fetch_page
+from sqlalchemy import select
+
+
+ORDER = KeysetOrder("latest", Article.published_at, Article.created_at, Article.id, nullable=[0])
+
+
+@pytest.mark.unit
+def test_cursor_roundtrip():
+    """测试游标编码解码"""
+    now = datetime(2026, 1, 14, 8, 30, 0, 123456)
+    cursor = encode_cursor("latest", [now, None, 42])
+    assert decode_cursor(cursor, "latest", 3) == [now, None, 42]
+
+
+@pytest.mark.unit
+def test_cursor_rejects_garbage():
+    """测试非法游标"""
+    with pytest.raises(InvalidCursorError):
+        decode_cursor("这不是游标", "latest", 3)
+    with pytest.raises(InvalidCursorError):
+        decode_cursor(encode_cursor("hot", [1, None, 2]), "latest", 3)
+
+
+@pytest.mark.unit
+async def test_fetch_page_walks_null_tail(db_session):
+    """测试游标翻页能把published_at为NULL的尾巴也翻出来，不重不漏"""
+    base = datetime(2026, 1, 1)
+    for i in range(7):
+        db_session.add(Article(
+            title=f"文章{i}",
+            slug=f"article-{i}",
+            content="内容",
+            status="published",
+            # 后3篇没有发布时间，排在最后
+            published_at=base + timedelta(hours=i) if i < 4 else None,
+        ))
+    await db_session.commit()
+
+    query = select(Article).where(Article.status == "published")
+    seen = []
+    cursor = None
+    while True:
+        rows, cursor = await fetch_page(db_session, query, ORDER, 2, cursor=cursor)
+        seen.extend(a.slug for a in rows)
+        if cursor is None:
+            break
+
+    expected, _ = await fetch_page(db_session, query, ORDER, 100)
+    assert seen == [a.slug for a in expected]
+    assert len(seen) == 7
+    assert seen[:4] == ["article-3", "article-2", "article-1", "article-0"]
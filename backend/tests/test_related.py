@@ -0,0 +1,168 @@
+"""
+相关文章测试 - 老王说推荐得不相关，还不如不推荐！
+"""
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.models import Article, ArticleSimilarity, Category, RelatedRefreshQueue, Tag
+from app import related
+from app.related import Doc, SimilarityModel, rebuild_related, refresh_related
+from app.writer import write_coordinator
+
+
+def _ids(items) -> list:
+    return [item[0] if isinstance(item, tuple) else item["id"] for item in items]
+
+
+async def _queue(db_session) -> set:
+    return set((await db_session.execute(select(RelatedRefreshQueue.article_id))).scalars().all())
+
+
+@pytest.fixture
+async def corpus(db_session):
+    """两个分类、三个标签、几篇主题分明的文章"""
+    ai, chips = Category(name="AI", slug="ai"), Category(name="芯片", slug="chips")
+    llm, gpu, funding = Tag(name="大模型", slug="llm"), Tag(name="GPU", slug="gpu"), Tag(name="融资", slug="funding")
+    specs = [
+        ("大模型推理加速方案", "介绍大模型推理的加速技巧", ai, [llm, gpu]),
+        ("大模型推理成本下降", "推理加速让大模型更便宜", ai, [llm]),
+        ("GPU供应紧张", "英伟达GPU芯片缺货", chips, [gpu]),
+        ("芯片公司完成融资", "一家芯片初创公司拿到融资", chips, [funding, gpu]),
+        ("大模型创业公司融资", "又一家大模型公司完成融资", ai, [llm, funding]),
+    ]
+    articles = []
+    for i, (title, summary, category, tags) in enumerate(specs):
+        article = Article(title=title, slug=f"a{i}", summary=summary, content="", status="published")
+        article.category = category
+        article.tags = tags
+        articles.append(article)
+    db_session.add_all(articles)
+    await db_session.commit()
+    return articles
+
+
+@pytest.mark.unit
+def test_similarity_model_scores():
+    """测试标签重合和文本相似都算分，分类列表只要同分类，自己不算"""
+    docs = [
+        Doc(1, 1, "大模型推理加速", (10, 11)),
+        Doc(2, 1, "大模型推理成本", (10,)),
+        Doc(3, 2, "GPU供应紧张", (11,)),
+        Doc(4, 2, "天气预报", ()),
+    ]
+    result = SimilarityModel(docs).neighbours([0, 3], top_n=3)
+
+    assert _ids(result[1]["similar"]) == [2, 3]
+    assert _ids(result[1]["tag"]) == [2, 3]
+    assert _ids(result[1]["category"]) == [2]
+    scores = dict(result[1]["similar"])
+    assert scores[2] > scores[3] > 0
+    assert result[4] == {"similar": [], "tag": [], "category": []}
+
+
+@pytest.mark.unit
+async def test_writes_queue_refresh(db_session, corpus):
+    """测试文章新建、改标题、改标签都进重算队列，改浏览量不进"""
+    assert await _queue(db_session) == {a.id for a in corpus}
+    assert await refresh_related(db_session) == len(corpus)
+    assert await _queue(db_session) == set()
+
+    corpus[0].views = 100
+    await db_session.commit()
+    assert await _queue(db_session) == set()
+
+    corpus[1].title = "换个标题"
+    await db_session.commit()
+    assert await _queue(db_session) == {corpus[1].id}
+
+
+@pytest.mark.unit
+async def test_incremental_refresh_updates_neighbours(db_session, corpus):
+    """测试新文章和改状态的文章，增量重算后会出现在/离开别人的列表里"""
+    await rebuild_related(db_session)
+    newcomer = Article(title="大模型推理加速实践", slug="new", summary="大模型推理加速", content="", status="published")
+    newcomer.category = corpus[0].category
+    newcomer.tags = list(corpus[0].tags)
+    db_session.add(newcomer)
+    await db_session.commit()
+
+    await refresh_related(db_session)
+    result = await db_session.execute(
+        select(ArticleSimilarity.neighbor_id).where(
+            ArticleSimilarity.article_id == corpus[0].id, ArticleSimilarity.kind == "similar"
+        ).order_by(ArticleSimilarity.rank)
+    )
+    assert result.scalars().first() == newcomer.id
+
+    newcomer.status = "draft"
+    await db_session.commit()
+    await refresh_related(db_session)
+    result = await db_session.execute(
+        select(ArticleSimilarity.article_id).where(
+            (ArticleSimilarity.neighbor_id == newcomer.id) | (ArticleSimilarity.article_id == newcomer.id)
+        )
+    )
+    assert result.first() is None
+
+
+@pytest.mark.unit
+async def test_rebuild_writes_in_short_units(db_session, test_db_engine, corpus, monkeypatch):
+    """测试全量重算在事务外算，结果分块经写入协调器提交；不再发布的文章的旧邻居删掉"""
+    await rebuild_related(db_session)
+    corpus[4].status = "draft"
+    await db_session.commit()
+
+    computing = []
+
+    class Model(SimilarityModel):
+        def __init__(self, docs):
+            computing.append(db_session.in_transaction())
+            super().__init__(docs)
+
+    monkeypatch.setattr(related, "SimilarityModel", Model)
+    monkeypatch.setattr(related, "WRITE_CHUNK", 2)
+    write_coordinator.start(async_sessionmaker(test_db_engine, class_=AsyncSession, expire_on_commit=False))
+    try:
+        assert await rebuild_related(db_session) == 4
+        # 4篇分两块 + 收尾（清理、出队）一块
+        assert write_coordinator.stats()["units"] == 3
+    finally:
+        await write_coordinator.stop()
+        write_coordinator.reset()
+    assert computing == [False]
+
+    result = await db_session.execute(select(ArticleSimilarity.article_id).distinct())
+    assert set(result.scalars()) == {a.id for a in corpus[:4]}
+    assert await _queue(db_session) == set()
+
+
+@pytest.mark.api
+async def test_related_endpoint_reads_precomputed_rows(client: AsyncClient, db_session, corpus):
+    """测试相关推荐接口直接读预先算好的表"""
+    await rebuild_related(db_session)
+    response = await client.get(f"/api/articles/{corpus[0].id}/related")
+    assert response.status_code == 200
+    data = response.json()["data"]
+    assert _ids(data["similar"])[0] == corpus[1].id
+    assert corpus[1].id in _ids(data["by_tag"]) and corpus[2].id in _ids(data["by_tag"])
+    assert set(_ids(data["by_category"])) <= {corpus[1].id, corpus[4].id}
+    assert data["similar"][0]["tags"] == [{"id": t.id, "name": t.name, "slug": t.slug} for t in corpus[1].tags]
+
+    # 邻居下线了，不等重算就不再返回
+    corpus[1].status = "draft"
+    await db_session.commit()
+    data = (await client.get(f"/api/articles/{corpus[0].id}/related")).json()["data"]
+    assert corpus[1].id not in _ids(data["similar"])
+
+
+@pytest.mark.api
+async def test_related_endpoint_falls_back_before_refresh(client: AsyncClient, test_article, test_articles_batch):
+    """测试还没算过的文章退回现查，similar为空"""
+    data = (await client.get(f"/api/articles/{test_article.id}/related")).json()["data"]
+    assert data["similar"] == []
+    assert len(data["by_category"]) == 6
+
+    response = await client.get("/api/articles/99999/related")
+    assert response.status_code == 404
@@ -0,0 +1,295 @@
+"""
+响应缓存测试 - 老王说缓存可以有，但写完了该清的一条都不能漏，不该清的也别乱清！
+"""
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.models import Article
+from app.response_cache import MemoryBackend, RedisBackend, ResponseCache, response_cache
+from app.view_counter import view_counter
+from app.writer import write_coordinator
+
+
+@pytest.mark.unit
+async def test_memory_backend_lru_ttl_and_tags():
+    """测试超条数淘汰最久没用的、过期不返回、按标签只清挂着的键、算的时候有写入就不存"""
+    backend = MemoryBackend(max_entries=2)
+    await backend.set("a", {"n": 1}, ["x"], lifetime=60)
+    await backend.set("b", {"n": 2}, ["x", "y"], lifetime=60)
+    assert (await backend.get("a"))[0] == {"n": 1}  # a变成最近用过的
+    await backend.set("c", {"n": 3}, ["y"], lifetime=60)
+    assert await backend.get("b") is None and backend.evictions == 1
+
+    assert backend.purge_now(["y"]) == 1
+    assert (await backend.get("a"))[0] == {"n": 1} and await backend.get("c") is None
+    await backend.set("d", {"n": 4}, [], lifetime=0)
+    assert await backend.get("d") is None and backend.expirations == 1
+
+    cache = ResponseCache(MemoryBackend(10), ttl=60)
+
+    async def produce(session):
+        cache.invalidate(["x"])  # 模拟算的时候有文章提交了
+        return {"n": 5}
+
+    assert await cache.get_or_set("k", lambda body: ["x"], produce) == ({"n": 5}, "MISS")
+    assert await cache.backend.get("k") is None
+    assert await cache.get_or_set("k", lambda body: ["x"], lambda s: asyncio.sleep(0, {"n": 6})) == ({"n": 6}, "MISS")
+    assert await cache.get_or_set("k", lambda body: ["x"], produce) == ({"n": 6}, "HIT")
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+
+
+@pytest.mark.unit
+async def test_view_flush_purges_details_only():
+    """测试浏览量写回只清那几篇的详情，正在算的别的结果照样存"""
+    cache = ResponseCache(MemoryBackend(10), ttl=60)
+    await cache.get_or_set("article?id=1", lambda body: ["article:1"], lambda s: asyncio.sleep(0, {"v": 1}))
+    await cache.get_or_set("article?id=2", lambda body: ["article:2"], lambda s: asyncio.sleep(0, {"v": 2}))
+
+    async def produce(session):
+        cache.invalidate(["article:1"], views_only=True)  # 算列表的时候浏览量写回了
+        return {"items": []}
+
+    await cache.get_or_set("articles", lambda body: ["lists"], produce)
+    assert await cache.backend.get("article?id=1") is None
+    assert (await cache.backend.get("article?id=2"))[0] == {"v": 2}
+    assert (await cache.backend.get("articles"))[0] == {"items": []}
+
+
+@pytest.mark.api
+async def test_writes_purge_only_affected_entries(client: AsyncClient, test_article, test_category, test_tag):
+    """测试改文章清详情、它所在的分类标签和总列表，别的分类和分类列表照样命中"""
+    urls = [
+        f"/api/articles/{test_article.id}",
+        "/api/articles",
+        "/api/articles?category=test-category",
+        "/api/articles?tag=test-tag",
+        "/api/categories/test-category/hot",
+        "/api/categories",
+        "/api/tags/popular",
+    ]
+    for url in urls:
+        assert (await client.get(url)).headers["X-Cache"] == "MISS"
+    for url in urls:
+        assert (await client.get(url)).headers["X-Cache"] == "HIT", url
+
+    other = (await client.post("/api/categories", json={"name": "别的分类", "slug": "other"})).json()["data"]
+    assert (await client.get("/api/categories")).headers["X-Cache"] == "MISS"
+    assert (await client.get("/api/articles?category=other")).headers["X-Cache"] == "MISS"
+
+    # 把文章挪到新分类：旧分类、新分类、标签、总列表、详情都得清
+    response = await client.put(f"/api/articles/{test_article.id}", json={"title": "改过标题", "category_id": other["id"]})
+    assert response.status_code == 200
+    for url in urls[:5] + ["/api/articles?category=other"]:
+        response = await client.get(url)
+        assert response.headers["X-Cache"] == "MISS", url
+    assert (await client.get(f"/api/articles/{test_article.id}")).json()["data"]["title"] == "改过标题"
+    assert (await client.get("/api/articles?category=other")).json()["total"] == 1
+    assert (await client.get("/api/categories")).headers["X-Cache"] == "HIT"
+
+    # 新建一篇挂别的标签的：test-tag下的列表不受影响
+    await client.post("/api/articles", json={"title": "新文章", "content": "x", "tags": ["新标签"]})
+    assert (await client.get("/api/articles?tag=test-tag")).headers["X-Cache"] == "HIT"
+    assert (await client.get("/api/articles")).json()["total"] == 2
+
+    await client.delete(f"/api/articles/{test_article.id}")
+    assert (await client.get(f"/api/articles/{test_article.id}")).status_code == 404
+    assert (await client.get("/api/articles?tag=test-tag")).json()["total"] == 0
+
+    stats = (await client.get("/api/metrics")).json()["data"]["response_cache"]
+    assert stats["backend"] == "memory" and stats["hits"] >= 8 and stats["purges"] >= 4
+
+
+@pytest.mark.api
+async def test_batched_write_purges_on_real_commit(client: AsyncClient, db_session, test_db_engine, test_article,
+                                                   monkeypatch):
+    """测试协调器在跑时，单元的SAVEPOINT释放不算提交：整批提交之前不清缓存、不加代数，提交之后才清"""
+    monkeypatch.setattr(write_coordinator, "batch_window", 0.01)
+    url = f"/api/articles/{test_article.id}"
+    await client.get(url)
+    assert (await client.get(url)).headers["X-Cache"] == "HIT"
+    await db_session.commit()
+    written, release = asyncio.Event(), asyncio.Event()
+
+    async def rename(db: AsyncSession) -> None:
+        article = await db.get(Article, test_article.id)
+        article.title = "批里改的"
+        await db.flush()
+
+    async def hold(db: AsyncSession) -> None:
+        written.set()
+        await release.wait()
+
+    write_coordinator.start(async_sessionmaker(test_db_engine, class_=AsyncSession, expire_on_commit=False))
+    try:
+        pending = [asyncio.ensure_future(write_coordinator.submit(unit)) for unit in (rename, hold)]
+        await written.wait()
+        generation, purges = response_cache._generation, response_cache.purges
+        assert (await client.get(url)).headers["X-Cache"] == "HIT"
+        await db_session.commit()
+        release.set()
+        await asyncio.gather(*pending)
+    finally:
+        release.set()
+        await write_coordinator.stop()
+        write_coordinator.reset()
+
+    assert response_cache._generation == generation + 1 and response_cache.purges == purges + 1
+    response = await client.get(url)
+    assert response.headers["X-Cache"] == "MISS" and response.json()["data"]["title"] == "批里改的"
+
+
+@pytest.mark.api
+async def test_cached_detail_counts_views(client: AsyncClient, test_article):
+    """测试命中缓存的详情也记浏览量，返回值带上没写回的增量"""
+    first = (await client.get(f"/api/articles/{test_article.id}")).json()["data"]["views"]
+    response = await client.get(f"/api/articles/{test_article.slug}")
+    assert response.headers["X-Cache"] == "MISS"  # 按slug访问是另一个键
+    response = await client.get(f"/api/articles/{test_article.id}")
+    assert response.headers["X-Cache"] == "HIT"
+    assert response.json()["data"]["views"] == first + 2
+    assert view_counter.pending_for(test_article.id) == 3
+
+
+@pytest.mark.unit
+async def test_stale_while_revalidate_bounds():
+    """测试过期后先给旧的、后台刷新换上新的；超过期限或者被清掉的不给旧的"""
+    cache = ResponseCache(MemoryBackend(10), ttl=0.05, stale=0.2)
+    sessions = []
+
+    @asynccontextmanager
+    async def session_factory():
+        sessions.append(object())
+        yield sessions[-1]
+
+    versions = iter(range(100))
+
+    async def produce(session):
+        return {"v": next(versions), "background": session is not None}
+
+    tags = lambda body: ["lists"]  # noqa: E731
+    assert await cache.get_or_set("k", tags, produce, stale_ok=True) == ({"v": 0, "background": False}, "MISS")
+    await asyncio.sleep(0.06)
+    # 没启动后台刷新：过期了同步重算
+    assert (await cache.get_or_set("k", tags, produce, stale_ok=True))[1] == "MISS"
+
+    cache.start(session_factory)
+    await asyncio.sleep(0.06)
+    assert await cache.get_or_set("k", tags, produce, stale_ok=True) == ({"v": 1, "background": False}, "STALE")
+    assert await cache.get_or_set("k", tags, produce, stale_ok=True) == ({"v": 1, "background": False}, "STALE")
+    await cache.stop()
+    assert await cache.get_or_set("k", tags, produce, stale_ok=True) == ({"v": 2, "background": True}, "HIT")
+    assert len(sessions) == 1 and cache.stats()["refreshes"] == 1
+
+    await asyncio.sleep(0.06)
+    assert (await cache.get_or_set("k", tags, produce))[1] == "MISS"  # 路由没开stale_ok
+    await asyncio.sleep(0.3)
+    assert (await cache.get_or_set("k", tags, produce, stale_ok=True))[1] == "MISS"  # 超过期限
+    await asyncio.sleep(0.06)
+    cache.invalidate(["lists"])
+    assert (await cache.get_or_set("k", tags, produce, stale_ok=True))[1] == "MISS"  # 清掉的不给旧的
+    assert cache.stats()["stale_hits"] == 2
+
+
+@pytest.mark.api
+async def test_stale_responses_and_cache_control(client: AsyncClient, test_db_engine, test_article):
+    """测试列表过期后返回STALE并在后台刷新，热门列表带Cache-Control，详情不带（浏览量要在后端记）"""
+    response_cache.start(async_sessionmaker(test_db_engine, class_=AsyncSession, expire_on_commit=False))
+    ttl, response_cache.ttl = response_cache.ttl, 0.0
+    try:
+        response = await client.get("/api/articles")
+        assert response.headers["X-Cache"] == "MISS"
+        assert response.headers["Cache-Control"] == "public, max-age=5, stale-while-revalidate=30"
+        response = await client.get("/api/articles")
+        assert response.headers["X-Cache"] == "STALE" and response.json()["total"] == 1
+        await response_cache.stop()
+        assert response_cache.stats()["refreshes"] == 1
+
+        await client.post("/api/articles", json={"title": "新文章", "content": "x"})
+        response = await client.get("/api/articles")
+        assert response.headers["X-Cache"] == "MISS" and response.json()["total"] == 2
+
+        response = await client.get(f"/api/articles/{test_article.id}")
+        assert "Cache-Control" not in response.headers
+        assert (await client.get("/api/stats")).headers["Cache-Control"].startswith("public, max-age=")
+    finally:
+        await response_cache.stop()
+        response_cache.ttl = ttl
+        response_cache._session_factory = None
+
+
+class FakeRedis:
+    """测试用的Redis：只会缓存用到的那几条命令"""
+
+    def __init__(self):
+        self.data = {}
+        self.commands = []
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            args = []
+            for _ in range(int(line[1:])):
+                size = int((await reader.readline())[1:])
+                args.append((await reader.readexactly(size + 2))[:-2])
+            command = args[0].decode().upper()
+            self.commands.append(command)
+            writer.write(self.reply(command, args[1:]))
+            await writer.drain()
+        writer.close()
+
+    @staticmethod
+    def bulk(value: bytes) -> bytes:
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+
+    def reply(self, command: str, args: list) -> bytes:
+        if command == "GET":
+            value = self.data.get(args[0])
+            return b"$-1\r\n" if value is None else self.bulk(value)
+        if command == "SET":
+            self.data[args[0]] = args[1]
+            return b"+OK\r\n"
+        if command == "SADD":
+            self.data.setdefault(args[0], set()).update(args[1:])
+            return b":1\r\n"
+        if command == "EXPIRE":
+            return b":1\r\n"
+        if command == "SMEMBERS":
+            members = sorted(self.data.get(args[0], ()))
+            return b"*%d\r\n" % len(members) + b"".join(self.bulk(m) for m in members)
+        if command == "DEL":
+            return b":%d\r\n" % sum(self.data.pop(key, None) is not None for key in args)
+        return b"-ERR unknown command\r\n"
+
+
+@pytest.mark.unit
+async def test_redis_backend_speaks_resp():
+    """测试Redis后端按标签存取和清除；连不上时当没命中，直接查库"""
+    fake = FakeRedis()
+    server = await asyncio.start_server(fake.handle, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    backend = RedisBackend(f"redis://127.0.0.1:{port}/0", "test:")
+    cache = ResponseCache(backend, ttl=60)
+    try:
+        body, hit = await cache.get_or_set("articles?page=1", lambda body: ["lists", "tag:ai"],
+                                           lambda s: asyncio.sleep(0, {"items": ["中文"]}))
+        assert hit == "MISS"
+        assert await cache.get_or_set("articles?page=1", lambda body: [], None) == ({"items": ["中文"]}, "HIT")
+
+        cache.invalidate(["tag:ai"])
+        await backend.drain()
+        assert await backend.get("articles?page=1") is None
+        assert b"test:t:lists" in fake.data  # 别的标签集合还在，等过期
+    finally:
+        await backend.client.close()
+        server.close()
+        await server.wait_closed()
+
+    body, hit = await cache.get_or_set("articles?page=1", lambda body: [], lambda s: asyncio.sleep(0, {"n": 1}))
+    assert body == {"n": 1} and hit == "MISS"
+    assert cache.errors == 2 and cache.last_error
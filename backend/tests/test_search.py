@@ -0,0 +1,203 @@
+"""
+全文搜索测试 - 老王说搜不到比搜得慢更让用户骂娘！
+"""
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import func, select, text
+
+from app.models import Article
+from app.search import (
+    FTS_TABLE, backfill_search_index, build_match_query, fts, highlight_pattern, make_snippet,
+    rebuild_search_index, strip_html,
+)
+from app.tokenizer import CJKTokenizer
+
+
+async def _fts_rows(db_session) -> dict:
+    result = await db_session.execute(select(fts.c.rowid, fts.c.title, fts.c.tags, fts.c.content, fts.c.body))
+    return {row.rowid: row for row in result}
+
+
+@pytest.mark.unit
+def test_tokenizer_bigrams_and_words():
+    """测试汉字切bigram、英文按词切并转小写"""
+    tokenizer = CJKTokenizer()
+    assert tokenizer.tokenize("36氪：OpenAI发布GPT-4o大模型！") == [
+        "36", "氪", "openai", "发布", "gpt", "4o", "大模", "模型",
+    ]
+    assert tokenizer.tokenize("ＡＩ 猫") == ["ai", "猫"]
+    assert tokenizer.index_text(None) == ""
+
+
+@pytest.mark.unit
+def test_tokenizer_dictionary_segmentation():
+    """测试词典正向最大匹配，剩下的切bigram"""
+    tokenizer = CJKTokenizer(["大模型", "推理", "大模"])
+    assert tokenizer.tokenize("国产大模型推理加速") == ["国产", "大模型", "推理", "加速"]
+    assert tokenizer.tokenize("模型") == ["模型"]
+
+
+@pytest.mark.unit
+def test_build_match_query():
+    """测试关键词转MATCH表达式"""
+    assert build_match_query("大模型 推理") == '"大模 模型" "推理"'
+    assert build_match_query("Python FastAPI") == '"python" "fastapi"'
+    assert build_match_query('say "hi" OR') == '"say" "hi" "or"'
+    assert build_match_query("猫") is None  # 单个汉字索引里查不到
+    assert build_match_query("猫", prefix=True, column_name="title") == 'title : ("猫" *)'
+    assert build_match_query("！！") is None
+    assert build_match_query("   ") is None
+
+
+@pytest.mark.unit
+def test_make_snippet():
+    """测试片段截取、转义和高亮"""
+    text = "前言" * 50 + "<这里讲Transformer架构>" + "后记" * 50
+    snippet = make_snippet(text, highlight_pattern("transformer"), width=40)
+    assert snippet.startswith("…") and snippet.endswith("…")
+    assert "&lt;这里讲<mark>Transformer</mark>架构&gt;" in snippet
+
+
+@pytest.mark.unit
+def test_strip_html():
+    assert strip_html("<p>大模型&amp;推理</p>\n<br/>速递") == "大模型&推理 速递"
+    assert strip_html(None) == ""
+
+
+@pytest.mark.unit
+async def test_index_follows_orm_writes(db_session, test_article, test_tag):
+    """测试文章增删改时FTS索引同步"""
+    rows = await _fts_rows(db_session)
+    assert rows[test_article.id].title == "测试 试文 文章 章标 标题"
+    assert rows[test_article.id].tags == "测试 试标 标签"
+
+    test_article.title = "改过的标题"
+    test_article.content = "<p>正文换成<b>HTML</b></p>"
+    await db_session.commit()
+    rows = await _fts_rows(db_session)
+    assert rows[test_article.id].title == "改过 过的 的标 标题"
+    assert rows[test_article.id].content == "正文 文换 换成 html"
+    assert rows[test_article.id].body == "正文换成 HTML"
+
+    await db_session.delete(test_article)
+    await db_session.commit()
+    assert await _fts_rows(db_session) == {}
+
+
+@pytest.mark.unit
+async def test_rebuild_search_index(db_session, test_article, test_articles_batch):
+    """测试全量重建和增量维护结果一致"""
+    before = await _fts_rows(db_session)
+    await db_session.execute(text(f"DELETE FROM {FTS_TABLE}"))
+    await db_session.commit()
+
+    assert await rebuild_search_index(db_session, batch_size=7) == 26
+    assert await _fts_rows(db_session) == before
+
+
+@pytest.mark.unit
+async def test_backfill_replaces_old_fts_table(db_session, test_article):
+    """测试老库的trigram索引表启动时自动换成新结构并回填"""
+    await db_session.execute(text(f"DROP TABLE {FTS_TABLE}"))
+    await db_session.execute(text(f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(title, summary, tags, content, tokenize='trigram')"))
+    await db_session.commit()
+
+    assert await backfill_search_index(db_session) == 1
+    assert (await _fts_rows(db_session))[test_article.id].body == "# 测试内容 这是测试文章的正文内容。"
+    assert await backfill_search_index(db_session) == 0
+
+
+@pytest.mark.api
+async def test_search_ranking_and_snippet(client: AsyncClient, db_session, test_articles_batch):
+    """测试标题命中排在正文命中前面，并返回高亮片段"""
+    in_body = Article(
+        title="普通文章", slug="in-body", status="published",
+        content="<p>这里的正文顺带提了一句Transformer架构。</p>",
+    )
+    in_title = Article(
+        title="Transformer架构详解", slug="in-title", status="published",
+        content="<p>注意力机制是核心。</p>",
+    )
+    draft = Article(title="Transformer草稿", slug="draft", status="draft", content="")
+    db_session.add_all([in_body, in_title, draft])
+    await db_session.commit()
+
+    response = await client.get("/api/search?q=Transformer")
+    assert response.status_code == 200
+    data = response.json()["data"]
+    assert data["engine"] == "fts5"
+    assert data["total"] == 2
+    assert [item["slug"] for item in data["items"]] == ["in-title", "in-body"]
+    assert "<mark>Transformer</mark>" in data["items"][0]["title_highlight"]
+    assert "<mark>Transformer</mark>" in data["items"][1]["snippet"]
+    assert "<p>" not in data["items"][1]["snippet"]
+
+
+@pytest.mark.api
+async def test_search_cursor_follows_relevance(client: AsyncClient, test_articles_batch):
+    """测试FTS结果按游标翻页不重不漏"""
+    seen = []
+    cursor = None
+    while True:
+        url = "/api/search?q=测试文章&page_size=10" + (f"&cursor={cursor}" if cursor else "")
+        data = (await client.get(url)).json()["data"]
+        assert data["engine"] == "fts5"
+        seen.extend(item["id"] for item in data["items"])
+        cursor = data["next_cursor"]
+        if not cursor:
+            break
+    assert len(seen) == len(set(seen)) == 25
+
+    # 换了关键词，旧游标作废
+    first = (await client.get("/api/search?q=测试文章&page_size=10")).json()["data"]
+    response = await client.get(f"/api/search?q=篇测试文章&cursor={first['next_cursor']}")
+    assert response.status_code == 400
+
+
+@pytest.mark.api
+async def test_search_two_char_keywords(client: AsyncClient, db_session, test_article):
+    """测试两个字的中文词和两个字母的英文词都走索引，单个汉字退回LIKE"""
+    db_session.add(Article(title="AI芯片周报", slug="ai-chips", status="published", content="<p>算力紧张</p>"))
+    await db_session.commit()
+
+    data = (await client.get("/api/search?q=测试")).json()["data"]
+    assert data["engine"] == "fts5"
+    assert [item["id"] for item in data["items"]] == [test_article.id]
+
+    data = (await client.get("/api/search?q=ai")).json()["data"]
+    assert data["engine"] == "fts5"
+    assert [item["slug"] for item in data["items"]] == ["ai-chips"]
+    assert data["items"][0]["title_highlight"] == "<mark>AI</mark>芯片周报"
+
+    data = (await client.get("/api/search?q=测 芯片")).json()["data"]
+    assert data["engine"] == "like"
+    assert data["total"] == 0
+
+
+@pytest.mark.api
+async def test_search_suggestions_prefix(client: AsyncClient, db_session):
+    """测试边输边搜：标题前缀匹配，按浏览量排序"""
+    db_session.add_all([
+        Article(title="大模型推理加速", slug="a", content="", status="published", views=5),
+        Article(title="国产大模型盘点", slug="b", content="", status="published", views=50),
+        Article(title="大数据平台", slug="c", content="", status="published", views=500),
+        Article(title="大模型草稿", slug="d", content="", status="draft", views=900),
+    ])
+    await db_session.commit()
+
+    items = (await client.get("/api/search/articles?q=大模")).json()["data"]["items"]
+    assert [item["slug"] for item in items] == ["b", "a"]
+    items = (await client.get("/api/search/articles?q=大")).json()["data"]["items"]
+    assert [item["slug"] for item in items] == ["c", "b", "a"]
+    items = (await client.get("/api/search/articles?q=大模型 加")).json()["data"]["items"]
+    assert [item["slug"] for item in items] == ["a"]
+
+
+@pytest.mark.api
+async def test_search_matches_tag_names(client: AsyncClient, db_session, test_article, test_tag):
+    """测试标签名也能搜到"""
+    count = (await db_session.execute(select(func.count()).select_from(fts))).scalar()
+    assert count == 1
+    data = (await client.get(f"/api/search?q={test_tag.name}")).json()["data"]
+    assert data["engine"] == "fts5"
+    assert [item["id"] for item in data["items"]] == [test_article.id]
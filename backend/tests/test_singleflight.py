@@ -0,0 +1,68 @@
+"""
+读请求合并测试 - 老王说一百个人问同一个问题，库只回答一遍！
+"""
+import asyncio
+
+import pytest
+from httpx import AsyncClient
+
+from app.singleflight import SingleFlight, single_flight
+
+from tests.conftest import assert_query_budget
+
+
+@pytest.mark.unit
+async def test_concurrent_calls_share_one_computation():
+    """测试同键只算一次、异常大家一起拿、领头的被取消换人领头、没开的路由不合并"""
+    flight = SingleFlight(["articles"])
+    calls = []
+
+    async def compute(value):
+        calls.append(value)
+        await asyncio.sleep(0.01)
+        if value == "boom":
+            raise ValueError("查库炸了")
+        return {"value": value}
+
+    results = await asyncio.gather(*(flight.do("articles", "k", lambda: compute("a")) for _ in range(10)))
+    assert calls == ["a"] and all(r is results[0] for r in results)
+
+    results = await asyncio.gather(
+        *(flight.do("articles", "boom", lambda: compute("boom")) for _ in range(3)), return_exceptions=True
+    )
+    assert calls == ["a", "boom"] and all(isinstance(r, ValueError) for r in results)
+
+    leader = asyncio.create_task(flight.do("articles", "c", lambda: compute("c1")))
+    await asyncio.sleep(0)
+    waiter = asyncio.create_task(flight.do("articles", "c", lambda: compute("c2")))
+    await asyncio.sleep(0)
+    leader.cancel()
+    assert await waiter == {"value": "c2"}
+
+    await asyncio.gather(*(flight.do("tags", "t", lambda: compute("t")) for _ in range(2)))
+    assert calls.count("t") == 2
+
+    stats = flight.stats()
+    assert stats["coalesced"] == 9 + 2 + 1 and stats["max_waiters"] == 9
+    assert stats["per_route"]["articles"] == {"leaders": 4, "coalesced": 12}
+    assert stats["in_flight"] == 0 and "tags" not in stats["per_route"]
+
+
+@pytest.mark.api
+async def test_cold_cache_stampede_hits_db_once(client: AsyncClient, test_article, query_log):
+    """测试缓存是冷的，一群同样的列表请求只有一个去查库，大家拿到一样的结果"""
+    query_log.clear()
+    responses = await asyncio.gather(*(client.get("/api/articles?page=1") for _ in range(8)))
+    assert {r.status_code for r in responses} == {200}
+    assert all(r.json() == responses[0].json() for r in responses)
+    # 只查了一遍：版本号（ETag） + 一页列表 + 分类 + 标签 + 计数
+    assert_query_budget(query_log, 5)
+
+    stats = (await client.get("/api/metrics")).json()["data"]
+    assert stats["single_flight"]["per_route"]["articles"] == {"leaders": 1, "coalesced": 7}
+    assert stats["response_cache"]["misses"] == 1
+
+    query_log.clear()
+    await asyncio.gather(*(client.get("/api/stats") for _ in range(4)))
+    assert_query_budget(query_log, 4)
+    assert single_flight.stats()["per_route"]["stats"]["coalesced"] == 3
@@ -0,0 +1,150 @@
+"""
+slug生成和分配测试 - 老王说同名资讯再多，slug也不能撞！
+"""
+from datetime import datetime
+
+import pytest
+from httpx import AsyncClient
+
+from app.config import settings
+from app.models import Article
+from app.slugs import allocate_slug_batches, allocate_slugs, article_base_slug, generate_slug, rebuild_slug_counters
+
+from tests.conftest import assert_query_budget
+
+
+@pytest.mark.unit
+def test_slug_strategies():
+    """测试各种生成策略"""
+    title = "OpenAI发布GPT-5：重庆银行也在用"
+    assert article_base_slug(title, strategy="title") == generate_slug(title) == "openai发布gpt-5重庆银行也在用"
+    assert article_base_slug(title, strategy="pinyin") == "openai-fa-bu-gpt-5-chong-qing-yin-hang-ye-zai-yong"
+
+    hashed = article_base_slug(title, strategy="hash")
+    assert hashed.startswith("openai-gpt-5-") and len(hashed) == len("openai-gpt-5-") + 8
+    assert article_base_slug(title + "！", strategy="hash") != hashed
+    assert len(article_base_slug("纯中文标题", strategy="hash")) == 8
+
+    assert article_base_slug("大模型周报", datetime(2026, 3, 1), strategy="date") == "20260301-大模型周报"
+    # 全是标点也不会生成空slug
+    assert article_base_slug("！？……", strategy="title")
+    with pytest.raises(ValueError):
+        article_base_slug(title, strategy="nope")
+
+
+@pytest.mark.unit
+def test_slug_truncated_at_word_boundary(monkeypatch):
+    """测试超长slug按连字符截断"""
+    monkeypatch.setattr(settings, "SLUG_MAX_LENGTH", 12)
+    assert article_base_slug("alpha beta gamma delta", strategy="title") == "alpha-beta"
+    assert article_base_slug("一二三四五六七八九十甲乙丙丁", strategy="title") == "一二三四五六七八九十甲乙"
+
+
+@pytest.mark.unit
+async def test_allocator_seeds_from_existing_and_counts_up(db_session, query_log):
+    """测试第一次按已有文章起算，之后一条UPDATE拿号，一次能拿多个"""
+    for slug in ("news", "news-1", "news-3", "news-x", "newsletter"):
+        db_session.add(Article(title=slug, slug=slug, content=""))
+    await db_session.commit()
+
+    assert await allocate_slugs(db_session, "news") == ["news-4"]
+    query_log.clear()
+    assert await allocate_slugs(db_session, "news", 3) == ["news-5", "news-6", "news-7"]
+    assert_query_budget(query_log, 2)  # UPDATE拿号 + IN查有没有被占
+
+    assert await allocate_slugs(db_session, "fresh", 2) == ["fresh", "fresh-1"]
+    await db_session.commit()
+
+    # 清空计数表后重新起算，不会倒退到已用的号
+    await rebuild_slug_counters(db_session)
+    assert await allocate_slugs(db_session, "news") == ["news-4"]
+
+
+@pytest.mark.unit
+async def test_allocator_batches_many_bases(db_session, query_log):
+    """测试一次给很多个基础slug拿号：计数表里有的、没有的、库里已有编号的，语句数不随基础slug个数涨"""
+    for slug in ("gpt", "gpt-2", "gpt-4", "gpt-4-1", "daily"):
+        db_session.add(Article(title=slug, slug=slug, content=""))
+    await db_session.commit()
+    assert await allocate_slugs(db_session, "daily") == ["daily-1"]
+
+    query_log.clear()
+    counts = {"gpt": 2, "gpt-4": 1, "daily": 2, **{f"new-{i}": 1 for i in range(300)}}
+    allocated = await allocate_slug_batches(db_session, counts)
+    # UPDATE + 读回 + 两块范围扫描 + INSERT + IN查有没有被占
+    assert_query_budget(query_log, 6)
+    assert allocated["gpt"] == ["gpt-5", "gpt-6"]
+    assert allocated["gpt-4"] == ["gpt-4-2"]
+    assert allocated["daily"] == ["daily-2", "daily-3"]
+    assert allocated["new-7"] == ["new-7"]
+    await db_session.commit()
+
+    assert await allocate_slugs(db_session, "gpt") == ["gpt-7"]
+    assert (await allocate_slug_batches(db_session, {"new-7": 2}))["new-7"] == ["new-7-1", "new-7-2"]
+
+
+@pytest.mark.api
+async def test_create_same_title_repeatedly(client: AsyncClient, query_log):
+    """测试同名标题反复创建，每次slug相关只有拿号和查占用两条查询"""
+    slugs = []
+    for i in range(12):
+        query_log.clear()
+        response = await client.post("/api/articles", json={"title": "AI日报", "content": "x"})
+        slugs.append(response.json()["data"]["slug"])
+        slug_sql = [sql for sql in query_log.statements if "slug_counters" in sql or "articles.slug" in sql.split("WHERE")[-1]]
+        # 第一次：UPDATE没命中 + 范围扫描起算 + INSERT + IN；之后UPDATE + IN
+        assert len(slug_sql) == (4 if i == 0 else 2)
+    assert slugs == ["ai日报"] + [f"ai日报-{n}" for n in range(1, 12)]
+
+    response = await client.post("/api/articles", json={"title": "另一篇", "slug": "ai日报-3", "content": "x"})
+    assert response.status_code == 400
+
+
+@pytest.mark.unit
+async def test_allocator_skips_taken_numbers(db_session):
+    """测试计数器后面的号被手动指定的slug、别的标题的基础slug占了，跳过去接着拿"""
+    assert await allocate_slugs(db_session, "foo", 2) == ["foo", "foo-1"]
+    for slug in ("foo-2", "foo-3", "foo-5"):
+        db_session.add(Article(title=slug, slug=slug, content=""))
+    await db_session.commit()
+
+    assert await allocate_slugs(db_session, "foo", 2) == ["foo-4", "foo-6"]
+    assert (await allocate_slug_batches(db_session, {"foo": 1, "bar": 1}))["foo"] == ["foo-7"]
+    db_session.add(Article(title="bar-1", slug="bar-1", content=""))
+    db_session.add(Article(title="bar-2", slug="bar-2", content=""))
+    await db_session.flush()
+    assert (await allocate_slug_batches(db_session, {"bar": 2}))["bar"] == ["bar-3", "bar-4"]
+
+
+@pytest.mark.api
+async def test_explicit_slug_does_not_block_generated(client: AsyncClient):
+    """测试手动建了foo-2之后，同名标题照样能建，不会一直报slug已存在"""
+    assert [
+        (await client.post("/api/articles", json={"title": "Foo", "content": f"x{i}"})).json()["data"]["slug"]
+        for i in range(2)
+    ] == ["foo", "foo-1"]
+    response = await client.post("/api/articles", json={"title": "别的", "slug": "foo-2", "content": "y"})
+    assert response.status_code == 201
+    slugs = []
+    for i in range(3):
+        response = await client.post("/api/articles", json={"title": "Foo", "content": f"z{i}"})
+        assert response.status_code == 201
+        slugs.append(response.json()["data"]["slug"])
+    assert slugs == ["foo-3", "foo-4", "foo-5"]
+
+    items = [{"title": "Foo", "content": "b1"}, {"title": "Foo", "content": "b2"}]
+    await client.post("/api/articles", json={"title": "又一篇", "slug": "foo-6", "content": "w"})
+    data = (await client.post("/api/articles/bulk", json={"items": items})).json()["data"]
+    assert [r["slug"] for r in data["items"]] == ["foo-7", "foo-8"]
+
+
+@pytest.mark.api
+async def test_create_with_pinyin_strategy(client: AsyncClient, monkeypatch):
+    """测试配置成拼音策略，单篇和批量都生效"""
+    monkeypatch.setattr(settings, "SLUG_STRATEGY", "pinyin")
+    response = await client.post("/api/articles", json={"title": "大模型周报", "content": "x"})
+    assert response.json()["data"]["slug"] == "da-mo-xing-zhou-bao"
+
+    items = [{"title": "大模型周报", "content": "x"}, {"title": "大模型周报", "content": "x"}]
+    data = (await client.post("/api/articles/bulk", json={"items": items})).json()["data"]
+    assert [r["slug"] for r in data["items"]] == ["da-mo-xing-zhou-bao-1", "da-mo-xing-zhou-bao-2"]
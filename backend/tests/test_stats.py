@@ -0,0 +1,117 @@
+"""
+统计快照测试 - 老王说首页数字可以旧几秒，但不能错！
+"""
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.models import Article
+from app.stats import StatsSnapshot, stats_snapshot
+from app.view_counter import view_counter
+
+from tests.conftest import assert_query_budget
+
+
+@pytest.mark.api
+async def test_stats_served_from_snapshot(client: AsyncClient, test_article, query_log):
+    """测试第二次请求不查库，snapshot_age跟着涨"""
+    query_log.clear()
+    first = (await client.get("/api/stats")).json()["data"]
+    # 聚合一条 + 最新文章一条 + 分类 + 标签
+    assert_query_budget(query_log, 4)
+    assert first["snapshot_age"] == 0
+    assert first["latest_articles"][0]["id"] == test_article.id
+
+    query_log.clear()
+    second = (await client.get("/api/stats")).json()["data"]
+    assert query_log.statements == []
+    assert second["snapshot_age"] >= 0
+    assert {k: v for k, v in second.items() if k != "snapshot_age"} == {
+        k: v for k, v in first.items() if k != "snapshot_age"
+    }
+    assert stats_snapshot.stats()["hits"] == 1
+
+
+@pytest.mark.api
+async def test_stats_invalidated_by_writes(client: AsyncClient, test_article):
+    """测试发文章、改状态、建分类之后马上能看到"""
+    assert (await client.get("/api/stats")).json()["data"]["article_count"] == 1
+
+    await client.post("/api/articles", json={"title": "新文章", "content": "内容", "status": "published"})
+    data = (await client.get("/api/stats")).json()["data"]
+    assert data["article_count"] == 2
+    assert data["latest_articles"][0]["title"] == "新文章"
+
+    await client.put(f"/api/articles/{test_article.id}", json={"status": "draft"})
+    assert (await client.get("/api/stats")).json()["data"]["article_count"] == 1
+
+    await client.post("/api/categories", json={"name": "统计分类"})
+    assert (await client.get("/api/stats")).json()["data"]["category_count"] == 2
+    assert stats_snapshot.stats()["invalidations"] == 3
+
+
+@pytest.mark.api
+async def test_stats_follow_view_flush(client: AsyncClient, test_db_engine, test_article, query_log):
+    """测试浏览量写回后快照直接加上增量，不重算"""
+    view_counter._session_factory = async_sessionmaker(test_db_engine, class_=AsyncSession, expire_on_commit=False)
+    try:
+        before = (await client.get("/api/stats")).json()["data"]["total_views"]
+        view_counter.record(test_article.id, 3)
+        assert (await client.get("/api/stats")).json()["data"]["total_views"] == before + 3
+
+        await view_counter.flush()
+        query_log.clear()
+        data = (await client.get("/api/stats")).json()["data"]
+        assert query_log.statements == []
+        assert data["total_views"] == before + 3
+        assert data["latest_articles"][0]["views"] == test_article.views + 3
+    finally:
+        view_counter._session_factory = None
+
+
+@pytest.mark.unit
+async def test_snapshot_ttl_and_racing_invalidation(db_session, test_article):
+    """测试过期重算；算的过程中被作废，结果不进缓存"""
+    snapshot = StatsSnapshot(ttl=0)
+    await snapshot.get(db_session)
+    await snapshot.get(db_session)
+    assert snapshot.misses == 2
+
+    snapshot = StatsSnapshot(ttl=60)
+    compute = snapshot._compute
+
+    async def compute_then_write(db):
+        data = await compute(db)
+        snapshot.invalidate()  # 模拟算的时候有文章提交了
+        return data
+
+    snapshot._compute = compute_then_write
+    assert (await snapshot.get(db_session))["article_count"] == 1
+    assert snapshot.age is None
+
+    snapshot._compute = compute
+    db_session.add(Article(title="又一篇", slug="another", content="", status="published"))
+    await db_session.commit()
+    assert (await snapshot.get(db_session))["article_count"] == 2
+    assert snapshot.age is not None
+
+
+@pytest.mark.unit
+async def test_stale_snapshot_refreshed_in_background(db_session, test_db_engine, test_article):
+    """测试快照过期后先返回旧的、后台重算；作废过的不返回旧的"""
+    snapshot = StatsSnapshot(ttl=0, stale=60)
+    await snapshot.get(db_session)
+    assert snapshot.misses == 1  # 没启动后台刷新，过期就同步重算
+    await snapshot.get(db_session)
+    assert snapshot.misses == 2 and snapshot.stale_hits == 0
+
+    snapshot.start(async_sessionmaker(test_db_engine, class_=AsyncSession, expire_on_commit=False))
+    computed_at = snapshot._computed_at
+    assert (await snapshot.get(db_session))["article_count"] == 1
+    assert snapshot.stale_hits == 1 and snapshot.misses == 2
+    await snapshot.stop()
+    assert snapshot._computed_at > computed_at  # 后台换了新的
+
+    snapshot.invalidate()
+    await snapshot.get(db_session)
+    assert snapshot.misses == 3 and snapshot.stale_hits == 1
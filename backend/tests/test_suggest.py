@@ -0,0 +1,146 @@
+"""
+搜索建议内存索引测试 - 老王说内存里的东西最容易和库对不上，必须测！
+"""
+import random
+
+import pytest
+from httpx import AsyncClient
+
+from app.models import Article, Tag
+from app.suggest import WALK_MIN_POSTINGS, SuggestionIndex, suggestion_index
+
+
+def _slugs(items) -> list:
+    return [item["slug"] for item in items]
+
+
+@pytest.fixture
+def index() -> SuggestionIndex:
+    index = SuggestionIndex()
+    index.load([
+        (1, "大模型推理加速", "a", "摘要a", 5, ["AI芯片"]),
+        (2, "国产大模型盘点", "b", None, 50, []),
+        (3, "大数据平台", "c", None, 500, ["大模型"]),
+        (4, "OpenAI发布GPT-4o", "d", None, 20, ["AI"]),
+    ])
+    return index
+
+
+@pytest.fixture
+async def live_index(db_session):
+    """从测试库建好的全局索引，用完清掉"""
+    await suggestion_index.build(db_session)
+    yield suggestion_index
+    suggestion_index.reset()
+
+
+@pytest.mark.unit
+def test_prefix_and_infix_lookup(index):
+    """测试前缀、中间匹配、标签匹配，按浏览量排序"""
+    assert _slugs(index.suggest("大")) == ["c", "b", "a"]
+    assert _slugs(index.suggest("模型")) == ["c", "b", "a"]  # c是标签命中
+    assert _slugs(index.suggest("模型 加速")) == ["a"]
+    assert _slugs(index.suggest("gpt-4")) == ["d"]
+    assert _slugs(index.suggest("ａｉ")) == ["d", "a"]
+    assert _slugs(index.suggest("大", limit=1)) == ["c"]
+    assert index.suggest("不存在") == []
+    assert index.suggest("   ") == []
+    assert index.suggest("大模")[0] == {"id": 3, "title": "大数据平台", "slug": "c", "summary": None}
+
+
+@pytest.mark.unit
+def test_incremental_updates_and_compaction(index):
+    """测试增删改和浏览量变化，垃圾多了自动压缩后结果不变"""
+    index.upsert(5, "大模型周报", "e", None, 1000, [])
+    assert _slugs(index.suggest("大模型")) == ["e", "c", "b", "a"]
+
+    index.remove(3)
+    index.upsert(1, "推理加速", "a", None, 5, [])
+    assert _slugs(index.suggest("大模型")) == ["e", "b"]
+
+    index.apply_views({2: 10000})
+    assert _slugs(index.suggest("大模型")) == ["b", "e"]
+
+    index.upsert(3, "大数据平台", "c", None, 500, ["大模型"])
+    assert _slugs(index.suggest("大模型")) == ["b", "e", "c"]
+
+    for i in range(20):
+        index.upsert(5, f"周报第{i}期", "e", None, 1000, [])
+    assert index.stats()["garbage_postings"] <= index.stats()["postings"] * 0.25
+    assert _slugs(index.suggest("周报")) == ["e"]
+    assert _slugs(index.suggest("大模型")) == ["b", "c"]
+
+
+@pytest.mark.unit
+def test_walk_path_matches_brute_force():
+    """测试常见字走按浏览量扫描的路径，结果和暴力算的一致"""
+    rng = random.Random(7)
+    chars = "大模型推理芯片算力开源数据平台"
+    rows = [
+        (i, "".join(rng.choice(chars) for _ in range(8)), f"s{i}", None, rng.randrange(1000), [])
+        for i in range(1, WALK_MIN_POSTINGS * 8)
+    ]
+    index = SuggestionIndex()
+    index.load(rows)
+    for keyword in ["大", "模型", "推理 芯片", "大模型推理", "算力开源数据"]:
+        terms = keyword.split()
+        expected = sorted(
+            (r for r in rows if all(t in r[1] for t in terms)), key=lambda r: (r[4], r[0]), reverse=True
+        )[:5]
+        assert _slugs(index.suggest(keyword)) == [r[2] for r in expected], keyword
+
+
+@pytest.mark.unit
+async def test_index_follows_orm_commits(db_session, live_index, test_article, test_tag):
+    """测试建好索引后，通过ORM提交的增删改会同步到索引"""
+    assert _slugs(live_index.suggest("文章标")) == ["test-article"]
+    assert _slugs(live_index.suggest(test_tag.name)) == ["test-article"]
+
+    draft = Article(title="草稿文章标题", slug="draft", content="", status="draft")
+    db_session.add(draft)
+    await db_session.commit()
+    assert _slugs(live_index.suggest("文章标")) == ["test-article"]
+
+    await db_session.refresh(draft, ["tags"])
+    draft.status = "published"
+    draft.tags = [Tag(name="新标签", slug="new-tag")]
+    await db_session.commit()
+    assert sorted(_slugs(live_index.suggest("文章标"))) == ["draft", "test-article"]
+    assert _slugs(live_index.suggest("新标")) == ["draft"]
+
+    test_article.title = "换了个名字"
+    await db_session.commit()
+    assert _slugs(live_index.suggest("文章标")) == ["draft"]
+    assert _slugs(live_index.suggest("名字")) == ["test-article"]
+
+    await db_session.delete(draft)
+    await db_session.commit()
+    assert live_index.suggest("文章标") == []
+    assert live_index.stats()["stale"] is False
+
+
+@pytest.mark.api
+async def test_stale_entries_reload_before_lookup(client: AsyncClient, db_session, live_index, test_article):
+    """测试提交时对象上字段没加载全、同步不了的文章记成过期，下次查询前按ID补读"""
+    db_session.expire(test_article, ["slug"])
+    test_article.title = "没加载slug的改名"
+    await db_session.commit()
+    assert live_index.stale and _slugs(live_index.suggest("改名")) == []
+
+    response = await client.get("/api/search/articles?q=改名")
+    assert _slugs(response.json()["data"]["items"]) == ["test-article"]
+    assert live_index.stats()["stale"] is False
+    assert _slugs(live_index.suggest("测试标签")) == ["test-article"]
+
+
+@pytest.mark.api
+async def test_suggestions_endpoint_skips_database(client: AsyncClient, live_index, test_article, query_log):
+    """测试索引就绪后即时搜索接口一条SQL都不发"""
+    query_log.clear()
+    response = await client.get("/api/search/articles?q=测试文")
+    assert response.status_code == 200
+    assert _slugs(response.json()["data"]["items"]) == ["test-article"]
+    assert query_log.statements == []
+
+    response = await client.get("/api/metrics")
+    assert response.json()["data"]["suggestions"]["entries"] == 1
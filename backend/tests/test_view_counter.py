@@ -0,0 +1,103 @@
+"""
+浏览量写回缓冲测试 - 老王说浏览量一个都不能丢！
+"""
+import asyncio
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from httpx import AsyncClient
+
+from app.models import Article
+from app.view_counter import ViewCounter, view_counter
+
+
+@pytest.mark.unit
+async def test_flush_batches_increments(test_db_engine, db_session, test_article):
+    """测试缓冲的浏览量一次批量写回"""
+    counter = ViewCounter(flush_interval=60, flush_threshold=1000)
+    counter._session_factory = async_sessionmaker(test_db_engine, class_=AsyncSession, expire_on_commit=False)
+    updated_at = test_article.updated_at
+
+    flushed_batches = []
+    counter.add_listener(flushed_batches.append)
+    for _ in range(3):
+        counter.record(test_article.id)
+    assert counter.pending_for(test_article.id) == 3
+
+    assert await counter.flush() == 3
+    assert counter.pending_total == 0
+    assert flushed_batches == [{test_article.id: 3}]
+
+    result = await db_session.execute(
+        select(Article.views, Article.updated_at).where(Article.id == test_article.id)
+        .execution_options(populate_existing=True)
+    )
+    views, new_updated_at = result.one()
+    assert views == 3
+    # 写回浏览量不算更新文章
+    assert new_updated_at == updated_at
+
+    stats = counter.stats()
+    assert stats["flushed_views"] == 3
+    assert stats["flushes"] == 1
+
+
+@pytest.mark.unit
+async def test_flush_failure_keeps_pending():
+    """测试写回失败时增量不丢"""
+    class BrokenSession:
+        async def __aenter__(self):
+            raise RuntimeError("database is locked")
+
+        async def __aexit__(self, *args):
+            return False
+
+    counter = ViewCounter(flush_interval=60, flush_threshold=1000)
+    counter._session_factory = BrokenSession
+    counter.record(1, 5)
+    with pytest.raises(RuntimeError):
+        await counter.flush()
+    assert counter.pending_for(1) == 5
+    assert counter.stats()["failed_flushes"] == 1
+
+
+@pytest.mark.unit
+async def test_threshold_flush_is_tracked(capsys):
+    """测试攒够阈值的提前写回只起一个任务、留着引用，失败了打日志不往外抛，stop时等它跑完"""
+    class BrokenSession:
+        async def __aenter__(self):
+            raise RuntimeError("database is locked")
+
+        async def __aexit__(self, *args):
+            return False
+
+    counter = ViewCounter(flush_interval=60, flush_threshold=3)
+    counter.start(BrokenSession)
+    for _ in range(5):
+        counter.record(1)
+    assert len(counter._flushing) == 1
+    await asyncio.gather(*counter._flushing)
+    assert not counter._flushing
+    assert counter.pending_for(1) == 5 and counter.stats()["failed_flushes"] == 1
+    assert "浏览量写回失败" in capsys.readouterr().out
+
+    counter.record(1)
+    with pytest.raises(RuntimeError):
+        await counter.stop()  # 关机时最后一次写回的错误照常抛
+    assert counter.stats()["failed_flushes"] == 3
+
+
+@pytest.mark.api
+async def test_get_article_does_not_write(client: AsyncClient, test_article, db_session):
+    """测试看详情页只记内存，不写库"""
+    for expected in (1, 2):
+        response = await client.get(f"/api/articles/{test_article.id}")
+        assert response.json()["data"]["views"] == expected
+
+    await db_session.refresh(test_article)
+    assert test_article.views == 0
+
+    response = await client.get("/api/metrics")
+    assert response.json()["data"]["view_counter"]["pending_views"] == 2
+    assert view_counter.pending_for(test_article.id) == 2
@@ -0,0 +1,166 @@
+"""
+单写者协调器测试 - 老王说一堆写请求挤一个事务，谁的错谁背！
+"""
+import asyncio
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.ingest import get_or_create_tags, tag_cache
+from app.models import Article, Category
+from app.writer import WriteCoordinator, write_coordinator
+
+
+@pytest.fixture
+def session_factory(test_db_engine):
+    return async_sessionmaker(test_db_engine, class_=AsyncSession, expire_on_commit=False)
+
+
+@pytest.mark.unit
+async def test_group_commit_isolates_failures(db_session, session_factory):
+    """测试排队的单元合进少数几个事务；出错的单元只回滚自己，异常交给自己的调用方"""
+    writer = WriteCoordinator(batch_max=8, batch_window=0.01, queue_max=100)
+    writer.start(session_factory)
+
+    def add_category(n: int, slug: str = None):
+        async def unit(db: AsyncSession) -> int:
+            category = Category(name=f"分类{n}", slug=slug or f"cat-{n}")
+            db.add(category)
+            await db.flush()
+            return category.id
+        return unit
+
+    async def broken(db: AsyncSession) -> None:
+        await get_or_create_tags(db, ["幽灵标签"])
+        db.add(Category(name="不该留下", slug="ghost"))
+        await db.flush()
+        raise ValueError("写到一半反悔了")
+
+    units = [add_category(n) for n in range(20)]
+    units[5] = broken
+    units[9] = add_category(9, slug="cat-3")  # 和第3个撞唯一约束
+    results = await asyncio.gather(*(writer.submit(unit) for unit in units), return_exceptions=True)
+    await writer.stop()
+
+    assert isinstance(results[5], ValueError)
+    assert "UNIQUE" in str(results[9])
+    ids = [r for i, r in enumerate(results) if i not in (5, 9)]
+    assert all(isinstance(r, int) for r in ids) and len(set(ids)) == 18
+
+    names = (await db_session.execute(select(Category.name))).scalars().all()
+    assert sorted(names) == sorted(f"分类{n}" for n in range(20) if n not in (5, 9))
+    # 回滚掉的单元建的标签不能进缓存
+    assert tag_cache.get("幽灵标签") is None
+
+    stats = writer.stats()
+    assert stats["units"] == 18 and stats["failed_units"] == 2
+    # 20个单元、一批最多8个：3个事务
+    assert stats["batches"] == 3 and stats["max_batch"] <= 8
+    assert stats["queue_depth"] == 0 and not stats["running"]
+
+
+@pytest.mark.api
+async def test_write_endpoints_go_through_coordinator(client: AsyncClient, db_session, session_factory):
+    """测试协调器在跑时，并发的创建、更新、删除都经它提交，结果和错误各回各家"""
+    write_coordinator.start(session_factory)
+    try:
+        responses = await asyncio.gather(*(
+            client.post("/api/articles", json={"title": f"并发{i}", "content": "<p>x</p>", "tags": ["AI"]})
+            for i in range(12)
+        ))
+        assert [r.status_code for r in responses] == [201] * 12
+        ids = [r.json()["data"]["id"] for r in responses]
+
+        responses = await asyncio.gather(
+            client.put(f"/api/articles/{ids[0]}", json={"title": "改过的"}),
+            client.delete(f"/api/articles/{ids[1]}"),
+            client.delete("/api/articles/99999"),
+            client.post("/api/articles", json={"title": "坏分类", "content": "x", "category_id": 999}),
+        )
+        assert [r.status_code for r in responses] == [200, 200, 404, 400]
+        assert responses[0].json()["data"]["title"] == "改过的"
+
+        stats = (await client.get("/api/metrics")).json()["data"]["writer"]
+        assert stats["running"] and stats["units"] == 14 and stats["failed_units"] == 2
+        assert stats["batches"] < stats["units"]
+    finally:
+        await write_coordinator.stop()
+        write_coordinator.reset()
+
+    assert (await db_session.execute(select(func.count()).select_from(Article))).scalar() == 11
+
+
+@pytest.mark.api
+async def test_bulk_create_goes_through_coordinator(client: AsyncClient, db_session, session_factory):
+    """测试批量创建一块一个写入单元，和单篇创建一起排队，不另外占写连接"""
+    write_coordinator.start(session_factory)
+    try:
+        items = [{"title": f"批量{i}", "content": f"<p>{i}</p>"} for i in range(5)]
+        responses = await asyncio.gather(
+            client.post("/api/articles/bulk", json={"items": items, "chunk_size": 2}),
+            client.post("/api/articles", json={"title": "单篇", "content": "x"}),
+        )
+        assert [r.status_code for r in responses] == [200, 201]
+        assert responses[0].json()["data"]["created"] == 5
+        assert write_coordinator.stats()["units"] == 4  # 3块 + 1篇
+    finally:
+        await write_coordinator.stop()
+        write_coordinator.reset()
+
+    assert (await db_session.execute(select(func.count()).select_from(Article))).scalar() == 6
+
+
+@pytest.mark.api
+async def test_batch_purges_cache_after_real_commit(client: AsyncClient, db_session, session_factory, monkeypatch):
+    """测试同一批里前面的单元已经写完、整批还没提交时来的读，不会在提交后留下旧的缓存"""
+    monkeypatch.setattr(write_coordinator, "batch_window", 0.01)
+    written, release = asyncio.Event(), asyncio.Event()
+
+    async def create(db: AsyncSession) -> None:
+        db.add(Article(title="批里的", slug="in-batch", content="", status="published"))
+        await db.flush()
+
+    async def hold(db: AsyncSession) -> None:
+        written.set()
+        await release.wait()
+
+    write_coordinator.start(session_factory)
+    try:
+        pending = [asyncio.ensure_future(write_coordinator.submit(unit)) for unit in (create, hold)]
+        await written.wait()  # create的SAVEPOINT已经释放，整批还没提交
+        assert (await client.get("/api/articles")).json()["total"] == 0
+        await db_session.commit()  # 读事务收尾，不然写者提交时拿不到锁
+        release.set()
+        await asyncio.gather(*pending)
+    finally:
+        release.set()
+        await write_coordinator.stop()
+        write_coordinator.reset()
+
+    assert (await client.get("/api/articles")).json()["total"] == 1
+
+
+@pytest.mark.unit
+async def test_failed_commit_publishes_nothing(db_session, test_db_engine):
+    """测试整批提交失败（拆开重来也失败）时，各单元解析出的标签不进缓存"""
+
+    class CommitFails(AsyncSession):
+        async def commit(self) -> None:
+            raise RuntimeError("磁盘满了")
+
+    writer = WriteCoordinator(batch_max=8, batch_window=0.01, queue_max=100)
+    writer.start(async_sessionmaker(test_db_engine, class_=CommitFails, expire_on_commit=False))
+
+    def tag_unit(name: str):
+        async def unit(db: AsyncSession) -> None:
+            await get_or_create_tags(db, [name])
+        return unit
+
+    results = await asyncio.gather(*(writer.submit(tag_unit(n)) for n in ("甲", "乙")), return_exceptions=True)
+    await writer.stop()
+
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert writer.stats()["split_batches"] == 1
+    assert tag_cache.get("甲") is None and tag_cache.get("乙") is None